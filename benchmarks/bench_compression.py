@@ -0,0 +1,101 @@
+"""Measure the bytes and CPU time per synced squeak with and without
+compressed message batches.
+
+Squeak messages are packed in chunks of `GETDATA_CHUNK_BYTES`, as the
+getdata sender does. Each chunk is sent either as plain messages or as a
+`zbatch` message for every available codec. The receive side decodes
+the chunks back into squeaks.
+
+Usage: python -m benchmarks.bench_compression [n_squeaks]
+"""
+import sys
+import time
+
+from squeak.core.signing import CSigningKey
+from squeak.messages import msg_squeak
+from squeak.params import SelectParams
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node import compression
+from squeakclient.squeaknode.node.compression import CODEC_ZLIB
+from squeakclient.squeaknode.node.compression import CODEC_ZSTD
+from squeakclient.squeaknode.node.compression import compress_batch
+from squeakclient.squeaknode.node.compression import ZBATCH_COMMAND
+from squeakclient.squeaknode.node.peer import MessageDecoder
+from squeakclient.squeaknode.node.peer import Peer
+from squeakclient.squeaknode.node.squeak_sender import GETDATA_CHUNK_BYTES
+
+
+N_SQUEAKS = 2000
+
+
+class BenchBlockchain(Blockchain):
+
+    def get_block_count(self) -> int:
+        return 1
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
+
+
+def make_chunks(n_squeaks):
+    squeak_maker = SqueakMaker(CSigningKey.generate(), BenchBlockchain())
+    chunks = [[]]
+    chunk_bytes = 0
+    for i in range(n_squeaks):
+        squeak = squeak_maker.make_squeak('squeak number {} with some text'.format(i))
+        data = msg_squeak(squeak=squeak).to_bytes()
+        if chunk_bytes >= GETDATA_CHUNK_BYTES:
+            chunks.append([])
+            chunk_bytes = 0
+        chunks[-1].append(data)
+        chunk_bytes += len(data)
+    return chunks
+
+
+def send(chunks, codec):
+    if codec is None:
+        return [b''.join(chunk) for chunk in chunks]
+    return [compress_batch(chunk, codec) for chunk in chunks]
+
+
+def receive(wire_chunks):
+    peer = Peer(None, ('127.0.0.1', 0))
+    decoder = MessageDecoder(expect_handshake=False)
+    n_squeaks = 0
+    for data in wire_chunks:
+        for frame in decoder.process_recv_data(data):
+            frames = peer.unpack_batch(frame) if frame.command == ZBATCH_COMMAND else [frame]
+            for inner_frame in frames:
+                inner_frame.deserialize()
+                n_squeaks += 1
+    return n_squeaks
+
+
+def bench_codec(chunks, codec):
+    start = time.process_time()
+    wire_chunks = send(chunks, codec)
+    send_time = time.process_time() - start
+    start = time.process_time()
+    n_squeaks = receive(wire_chunks)
+    recv_time = time.process_time() - start
+    wire_bytes = sum(len(data) for data in wire_chunks)
+    return wire_bytes / n_squeaks, send_time / n_squeaks, recv_time / n_squeaks
+
+
+def main():
+    SelectParams('regtest')
+    n_squeaks = int(sys.argv[1]) if len(sys.argv) > 1 else N_SQUEAKS
+    chunks = make_chunks(n_squeaks)
+    codecs = [('none', None), ('zlib', CODEC_ZLIB)]
+    if compression.zstandard is not None:
+        codecs.append(('zstd', CODEC_ZSTD))
+    for name, codec in codecs:
+        bytes_per_squeak, send_time, recv_time = bench_codec(chunks, codec)
+        print('{:>5}: {:>8.1f} bytes/squeak, send {:>6.1f} us/squeak, receive {:>6.1f} us/squeak'.format(
+            name, bytes_per_squeak, send_time * 1e6, recv_time * 1e6))
+
+
+if __name__ == '__main__':
+    main()
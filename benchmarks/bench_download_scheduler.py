@@ -0,0 +1,52 @@
+"""Measure the time the download scheduler takes to sync squeaks that
+were all announced by one peer.
+
+Every requested squeak is received right away, so the time is spent in
+scheduling alone. Before the scheduler kept a queue of waiting squeaks
+per peer, each event scanned every waiting squeak, and the sync took
+time quadratic in the number of squeaks.
+
+Usage: python -m benchmarks.bench_download_scheduler
+"""
+import threading
+import time
+
+from squeakclient.squeaknode.node.download_scheduler import DownloadScheduler
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
+
+
+N_SQUEAKS = [5000, 20000, 100000]
+
+
+class BenchPeer(object):
+
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.requested = []
+
+    def send_msg(self, msg):
+        self.requested.extend(inv.hash for inv in msg.inv)
+
+
+def sync(n_squeaks):
+    scheduler = DownloadScheduler(TimerWheel())
+    peer = BenchPeer()
+    squeak_hashes = [i.to_bytes(32, 'little') for i in range(n_squeaks)]
+    scheduler.add_announcements(peer, squeak_hashes)
+    n_received = 0
+    while n_received < len(peer.requested):
+        scheduler.squeak_received(peer, peer.requested[n_received], 100, True)
+        n_received += 1
+    return n_received
+
+
+def main():
+    for n_squeaks in N_SQUEAKS:
+        start = time.perf_counter()
+        n_received = sync(n_squeaks)
+        elapsed = time.perf_counter() - start
+        print('{:>7} squeaks: {:>8.3f} s ({} received)'.format(n_squeaks, elapsed, n_received))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure the time to find the missing hashes of an inv message in a store
+with a million squeaks.
+
+Compares copying every stored hash into a set, as `handle_inv` used to
+do, with `SqueakStore.filter_missing`. The store is filled with
+placeholder values, since only the hashes are looked up.
+
+Usage: python -m benchmarks.bench_inv_lookup [n_squeaks]
+"""
+import os
+import sys
+import time
+
+from squeakclient.squeaknode.node.stores.memory.squeak_store import MemorySqueakStore
+
+
+N_SQUEAKS = 10 ** 6
+INV_LEN = 1000
+N_INVS = 20
+
+
+def make_store(n_squeaks):
+    store = MemorySqueakStore()
+    for i in range(n_squeaks):
+        store.squeak_headers[i.to_bytes(32, 'little')] = b''
+    return store
+
+
+def make_inv_hashes(n_squeaks):
+    """Half of the hashes are in the store, the other half are new."""
+    saved = [i.to_bytes(32, 'little') for i in range(0, n_squeaks, n_squeaks // INV_LEN * 2)]
+    new = [os.urandom(32) for _ in range(INV_LEN - len(saved))]
+    return saved + new
+
+
+def copy_hashes(store, inv_hashes):
+    saved_hashes = set(store.get_hashes())
+    return set(inv_hashes) - saved_hashes
+
+
+def filter_missing(store, inv_hashes):
+    return store.filter_missing(inv_hashes)
+
+
+def bench_lookup(lookup_fn, store, inv_hashes):
+    start = time.perf_counter()
+    for _ in range(N_INVS):
+        missing = lookup_fn(store, inv_hashes)
+    elapsed = time.perf_counter() - start
+    return elapsed / N_INVS, len(missing)
+
+
+def main():
+    n_squeaks = int(sys.argv[1]) if len(sys.argv) > 1 else N_SQUEAKS
+    store = make_store(n_squeaks)
+    inv_hashes = make_inv_hashes(n_squeaks)
+    for name, lookup_fn in [
+            ('copy hashes', copy_hashes),
+            ('filter_missing', filter_missing),
+    ]:
+        per_inv, n_missing = bench_lookup(lookup_fn, store, inv_hashes)
+        print('{:>15}: {:>10.3f} ms/inv ({} of {} missing)'.format(
+            name, per_inv * 1000, n_missing, len(inv_hashes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Measure the time to answer getsqueaks locators from the memory squeak
+store, with stores of 10^5 to 10^6 squeaks and locators of 1 to 1000
+followed addresses.
+
+Compares a scan of every stored squeak against every interest, as
+`get_squeaks_by_locator` used to do, with the author index, as used by
+`get_squeak_hashes_by_locator`. The store is filled with the index
+entries of placeholder squeaks that only have the fields used by the
+lookup, and an empty header for each. Scans that would test more than
+`MAX_SCAN_CHECKS` squeak and interest pairs are skipped.
+
+Usage: python -m benchmarks.bench_locator
+"""
+import os
+import random
+import time
+
+from squeak.core import CSqueakHeader
+from squeak.net import CInterested
+from squeak.net import CSqueakLocator
+
+from squeakclient.squeaknode.node.stores.memory.squeak_store import EMPTY_HASH
+from squeakclient.squeaknode.node.stores.memory.squeak_store import MemorySqueakStore
+
+
+STORE_SIZES = [10 ** 5, 10 ** 6]
+N_FOLLOWS = [1, 10, 100, 1000]
+N_AUTHORS = 10000
+MAX_BLOCK_HEIGHT = 100000
+MAX_SCAN_CHECKS = 10 ** 7
+
+
+class BenchSqueak(object):
+
+    def __init__(self, address, block_height):
+        self.address = address
+        self.nBlockHeight = block_height
+        self.hashReplySqk = EMPTY_HASH
+        self.hash = os.urandom(32)
+
+    def GetHash(self):
+        return self.hash
+
+    def GetAddress(self):
+        return self.address
+
+
+def make_squeaks(n_squeaks, addresses):
+    return [
+        BenchSqueak(random.choice(addresses), random.randrange(MAX_BLOCK_HEIGHT))
+        for _ in range(n_squeaks)
+    ]
+
+
+def make_store(squeaks):
+    store = MemorySqueakStore()
+    header_data = CSqueakHeader().serialize()
+    for squeak in squeaks:
+        store.squeak_headers[squeak.GetHash()] = header_data
+    store._build_indexes(
+        (squeak.GetHash(), squeak.GetAddress(), squeak.nBlockHeight, squeak.hashReplySqk)
+        for squeak in squeaks
+    )
+    return store
+
+
+def make_locator(addresses, n_follows):
+    return CSqueakLocator(vInterested=[
+        CInterested(
+            address=address,
+            nMinBlockHeight=MAX_BLOCK_HEIGHT // 2,
+        )
+        for address in random.sample(addresses, n_follows)
+    ])
+
+
+def scan_locator(store, squeaks, locator):
+    saved_squeaks = [(squeak.GetHash(), squeak) for squeak in squeaks]
+    seen_hashes = set()
+    for interested in locator.vInterested:
+        squeaks = [(hash, squeak) for hash, squeak
+                   in saved_squeaks
+                   if hash not in seen_hashes and
+                   store._squeak_in_interested(squeak, interested)]
+        squeaks.sort(key=lambda item: item[1].nBlockHeight)
+        for hash, squeak in squeaks:
+            seen_hashes.add(hash)
+            yield squeak
+
+
+def index_locator(store, squeaks, locator):
+    return store.get_squeak_hashes_by_locator(locator)
+
+
+def bench_lookup(lookup_fn, store, squeaks, locator):
+    start = time.perf_counter()
+    n_found = sum(1 for _ in lookup_fn(store, squeaks, locator))
+    return time.perf_counter() - start, n_found
+
+
+def main():
+    addresses = [os.urandom(25) for _ in range(N_AUTHORS)]
+    for n_squeaks in STORE_SIZES:
+        squeaks = make_squeaks(n_squeaks, addresses)
+        store = make_store(squeaks)
+        for n_follows in N_FOLLOWS:
+            locator = make_locator(addresses, n_follows)
+            index_time, n_found = bench_lookup(index_locator, store, squeaks, locator)
+            if n_squeaks * n_follows <= MAX_SCAN_CHECKS:
+                scan_time, _ = bench_lookup(scan_locator, store, squeaks, locator)
+                scan_result = '{:>10.3f} ms'.format(scan_time * 1000)
+            else:
+                scan_result = '{:>13}'.format('skipped')
+            print('{:>8} squeaks, {:>4} follows: scan {}, index {:>8.3f} ms ({} found)'.format(
+                n_squeaks, n_follows, scan_result, index_time * 1000, n_found))
+
+
+if __name__ == '__main__':
+    main()
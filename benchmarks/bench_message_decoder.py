@@ -0,0 +1,57 @@
+"""Measure the throughput of MessageDecoder for messages of different sizes.
+
+Usage: python -m benchmarks.bench_message_decoder
+"""
+import time
+
+from squeak.messages import msg_inv
+from squeak.net import CInv
+
+from squeakclient.squeaknode.node.peer import MAX_MESSAGE_LEN
+from squeakclient.squeaknode.node.peer import MessageDecoder
+from squeakclient.squeaknode.node.peer import MSG_HEADER_LEN
+from squeakclient.squeaknode.node.peer import SOCKET_READ_LEN
+
+
+INV_LEN = 36
+MESSAGE_SIZES = [
+    ('1 KB', 1024),
+    ('64 KB', 64 * 1024),
+    ('1 MB', MAX_MESSAGE_LEN),
+]
+TOTAL_BYTES = 32 * MAX_MESSAGE_LEN
+
+
+def make_msg_data(size):
+    """Make a serialized inv message that is at most `size` bytes long."""
+    n_invs = (size - MSG_HEADER_LEN - 3) // INV_LEN
+    invs = [CInv(type=1, hash=i.to_bytes(32, 'little'))
+            for i in range(n_invs)]
+    return msg_inv(inv=invs).to_bytes()
+
+
+def bench_decoder(msg_data, n_msgs):
+    decoder = MessageDecoder(expect_handshake=False)
+    stream = msg_data * n_msgs
+    n_decoded = 0
+    start = time.perf_counter()
+    for i in range(0, len(stream), SOCKET_READ_LEN):
+        for frame in decoder.process_recv_data(stream[i:i+SOCKET_READ_LEN]):
+            frame.deserialize()
+            n_decoded += 1
+    elapsed = time.perf_counter() - start
+    assert n_decoded == n_msgs
+    return len(stream) / elapsed
+
+
+def main():
+    for name, size in MESSAGE_SIZES:
+        msg_data = make_msg_data(size)
+        n_msgs = max(1, TOTAL_BYTES // len(msg_data))
+        rate = bench_decoder(msg_data, n_msgs)
+        print('{:>6}: {:>8.2f} MB/s ({} messages of {} bytes)'.format(
+            name, rate / 1e6, n_msgs, len(msg_data)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Measure how long new squeaks take to propagate along a line of nodes
+connected over loopback.
+
+Squeaks are made on the first node, and every other node only learns
+about them through the inv relay of its neighbour. Reports the latency
+until each node along the line has saved all of the squeaks.
+
+Usage: python -m benchmarks.bench_relay_propagation [n_nodes] [n_squeaks]
+"""
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from squeak.core.signing import CSigningKey
+from squeak.params import SelectParams
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.clientsqueaknode import ClientSqueakNode
+from squeakclient.squeaknode.node.peer_handler import PeerHandler
+from squeakclient.squeaknode.node.stores.memory.storage import MemoryStorage
+
+
+BASE_PORT = 19500
+N_NODES = 5
+N_SQUEAKS = 20
+POLL_INTERVAL = 0.01
+TIMEOUT = 120
+
+
+class BenchBlockchain(Blockchain):
+
+    def get_block_count(self) -> int:
+        return 1
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
+
+
+def start_nodes(n_nodes, data_dir):
+    nodes = []
+    for i in range(n_nodes):
+        node = ClientSqueakNode(
+            MemoryStorage(),
+            BenchBlockchain(),
+            None,
+            peer_transport='asyncio',
+            port=BASE_PORT + i,
+        )
+        node.address_manager.peers_file = Path(data_dir) / 'peers{}.json'.format(i)
+        node.start(PeerHandler(node))
+        nodes.append(node)
+    time.sleep(0.5)
+    for i in range(1, n_nodes):
+        nodes[i].network_manager.connect_peer(('127.0.0.1', BASE_PORT + i - 1))
+    wait_for(lambda: all(len(node.get_peers()) == (1 if i in (0, n_nodes - 1) else 2)
+                         for i, node in enumerate(nodes)))
+    return nodes
+
+
+def wait_for(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        if time.time() > deadline:
+            raise Exception('Timed out')
+        time.sleep(POLL_INTERVAL)
+
+
+def bench_propagation(nodes, n_squeaks):
+    squeak_maker = SqueakMaker(CSigningKey.generate(), BenchBlockchain())
+    squeaks = [squeak_maker.make_squeak('squeak {}'.format(i)) for i in range(n_squeaks)]
+    start = time.perf_counter()
+    for squeak in squeaks:
+        nodes[0].add_squeak(squeak)
+    latencies = []
+    for node in nodes[1:]:
+        wait_for(lambda: all(node.squeaks_access.get_squeak(squeak.GetHash())
+                             for squeak in squeaks))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    n_nodes = int(sys.argv[1]) if len(sys.argv) > 1 else N_NODES
+    n_squeaks = int(sys.argv[2]) if len(sys.argv) > 2 else N_SQUEAKS
+    SelectParams('regtest')
+    with tempfile.TemporaryDirectory() as data_dir:
+        nodes = start_nodes(n_nodes, data_dir)
+        try:
+            latencies = bench_propagation(nodes, n_squeaks)
+        finally:
+            for node in nodes:
+                node.stop()
+    for hop, latency in enumerate(latencies, 1):
+        print('hop {:>3}: {:>8.3f} s'.format(hop, latency))
+    print('average per hop: {:.3f} s'.format(latencies[-1] / len(latencies)))
+    # The peer threads of the nodes do not stop on their own.
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Compare receiving messages over a loopback socket with fixed size
+`recv` calls and with `MessageReceiver`, which reads into a reusable
+buffer with an adaptive read size.
+
+Reports the number of receive syscalls and read buffer allocations per
+message.
+
+Usage: python -m benchmarks.bench_socket_receive
+"""
+import socket
+import threading
+import time
+
+from squeakclient.squeaknode.node.peer import MAX_MESSAGE_LEN
+from squeakclient.squeaknode.node.peer import MessageDecoder
+from squeakclient.squeaknode.node.peer import MessageQueue
+from squeakclient.squeaknode.node.peer import MessageReceiver
+from squeakclient.squeaknode.node.peer import SOCKET_READ_LEN
+
+from benchmarks.bench_message_decoder import make_msg_data
+
+
+MESSAGE_SIZES = [
+    ('1 KB', 1024),
+    ('64 KB', 64 * 1024),
+    ('1 MB', MAX_MESSAGE_LEN),
+]
+TOTAL_BYTES = 16 * MAX_MESSAGE_LEN
+UNBOUNDED = 2 * TOTAL_BYTES
+
+
+class CountingSocket(object):
+    """Wraps a socket and counts the receive calls and read buffers."""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.n_reads = 0
+        self.n_allocs = 0
+        self.last_read_buffer = None
+        self.last_read_len = 0
+
+    def recv(self, bufsize):
+        self.n_reads += 1
+        self.n_allocs += 1
+        return self.sock.recv(bufsize)
+
+    def recv_into(self, buffer, nbytes=0):
+        self.n_reads += 1
+        if buffer.obj is not self.last_read_buffer or len(buffer.obj) != self.last_read_len:
+            self.n_allocs += 1
+            self.last_read_buffer = buffer.obj
+            self.last_read_len = len(buffer.obj)
+        return self.sock.recv_into(buffer, nbytes)
+
+
+def make_socket_pair():
+    listen_socket = socket.socket()
+    listen_socket.bind(('127.0.0.1', 0))
+    listen_socket.listen()
+    send_socket = socket.create_connection(listen_socket.getsockname())
+    recv_socket, _ = listen_socket.accept()
+    listen_socket.close()
+    return send_socket, recv_socket
+
+
+def send_stream(sock, data):
+    sock.sendall(data)
+    sock.close()
+
+
+def make_msg_queue():
+    return MessageQueue(max_msgs=UNBOUNDED, max_bytes=UNBOUNDED)
+
+
+def recv_fixed(sock):
+    msg_queue = make_msg_queue()
+    decoder = MessageDecoder(expect_handshake=False)
+    while True:
+        recv_data = sock.recv(SOCKET_READ_LEN)
+        if not recv_data:
+            return msg_queue.queue_len
+        for msg in decoder.process_recv_data(recv_data):
+            msg_queue.put(msg, msg.size)
+
+
+def recv_adaptive(sock):
+    msg_queue = make_msg_queue()
+    receiver = MessageReceiver(sock, msg_queue, threading.Event())
+    receiver.decoder = MessageDecoder(expect_handshake=False)
+    receiver.recv_msgs()
+    return msg_queue.queue_len
+
+
+def bench_receive(recv_fn, msg_data, n_msgs):
+    send_socket, recv_socket = make_socket_pair()
+    counting_socket = CountingSocket(recv_socket)
+    sender = threading.Thread(
+        target=send_stream,
+        args=(send_socket, msg_data * n_msgs),
+    )
+    start = time.perf_counter()
+    sender.start()
+    n_received = recv_fn(counting_socket)
+    elapsed = time.perf_counter() - start
+    sender.join()
+    recv_socket.close()
+    assert n_received == n_msgs
+    return (
+        counting_socket.n_reads / n_msgs,
+        counting_socket.n_allocs / n_msgs,
+        len(msg_data) * n_msgs / elapsed,
+    )
+
+
+def main():
+    for name, size in MESSAGE_SIZES:
+        msg_data = make_msg_data(size)
+        n_msgs = max(1, TOTAL_BYTES // len(msg_data))
+        for recv_name, recv_fn in [
+                ('recv', recv_fixed),
+                ('recv_into', recv_adaptive),
+        ]:
+            reads, allocs, rate = bench_receive(recv_fn, msg_data, n_msgs)
+            print('{:>6} {:>9}: {:>9.2f} syscalls/msg {:>9.2f} allocs/msg {:>8.2f} MB/s'.format(
+                name, recv_name, reads, allocs, rate / 1e6))
+
+
+if __name__ == '__main__':
+    main()
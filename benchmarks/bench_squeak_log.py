@@ -0,0 +1,94 @@
+"""Measure the write, read and startup throughput of the squeak log.
+
+Appends squeaks to a log in a temporary directory, reads them back in
+random order, and then times opening the log from its checkpoint and by
+replaying every record.
+
+Usage: python -m benchmarks.bench_squeak_log [n_squeaks]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from squeak.core.signing import CSigningKey
+from squeak.params import SelectParams
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.stores.log.squeak_log import CHECKPOINT_FILE
+from squeakclient.squeaknode.node.stores.log.squeak_store import LogSqueakStore
+
+
+N_SQUEAKS = 10000
+
+
+class BenchBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 0
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
+
+
+def make_squeaks(n_squeaks):
+    blockchain = BenchBlockchain()
+    squeak_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+    squeaks = []
+    for i in range(n_squeaks):
+        blockchain.block_height = i
+        squeaks.append(squeak_maker.make_squeak('squeak {}'.format(i)))
+    return squeaks
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def write_squeaks(store, squeaks):
+    for squeak in squeaks:
+        store.add_squeak(squeak)
+
+
+def read_squeaks(store, squeak_hashes):
+    for squeak_hash in squeak_hashes:
+        store.get_squeak(squeak_hash)
+
+
+def main():
+    SelectParams('regtest')
+    n_squeaks = int(sys.argv[1]) if len(sys.argv) > 1 else N_SQUEAKS
+    squeaks = make_squeaks(n_squeaks)
+    squeak_hashes = [squeak.GetHash() for squeak in squeaks]
+    random.shuffle(squeak_hashes)
+    with tempfile.TemporaryDirectory() as data_dir:
+        log_dir = Path(data_dir)
+        store = LogSqueakStore(log_dir)
+        write_time, _ = timed(write_squeaks, store, squeaks)
+        read_time, _ = timed(read_squeaks, store, squeak_hashes)
+        store.close()
+        log_bytes = sum(path.stat().st_size for path in log_dir.glob('segment-*.log'))
+
+        checkpoint_time, store = timed(LogSqueakStore, log_dir)
+        store.close()
+        os.remove(log_dir / CHECKPOINT_FILE)
+        replay_time, store = timed(LogSqueakStore, log_dir)
+        store.close()
+
+    print('write:   {:>9.0f} squeaks/s ({:.1f} MB/s)'.format(
+        n_squeaks / write_time, log_bytes / write_time / 1048576))
+    print('read:    {:>9.0f} squeaks/s (random order)'.format(n_squeaks / read_time))
+    print('startup: {:>9.3f} s from checkpoint, {:.3f} s replaying the log'.format(
+        checkpoint_time, replay_time))
+
+
+if __name__ == '__main__':
+    main()
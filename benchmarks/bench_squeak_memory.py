@@ -0,0 +1,99 @@
+"""Measure the memory used per stored squeak.
+
+Compares a dict of deserialized squeaks, as the memory store used to
+keep, with the memory store that keeps the serialized headers and
+contents apart, and with the log store, which only keeps the indexes
+in memory. Every squeak is deserialized from its serialized bytes before
+it is stored, as it is when it is received from a peer. Memory is
+measured with tracemalloc, so the mmap reads of the log store are not
+counted.
+
+Usage: python -m benchmarks.bench_squeak_memory [n_squeaks]
+"""
+import sys
+import tempfile
+import tracemalloc
+
+from squeak.core import CSqueak
+from squeak.core.signing import CSigningKey
+from squeak.params import SelectParams
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.stores.log.squeak_store import LogSqueakStore
+from squeakclient.squeaknode.node.stores.memory.squeak_store import MemorySqueakStore
+
+
+N_SQUEAKS = 2000
+N_AUTHORS = 10
+
+
+class BenchBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 0
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
+
+
+def make_squeak_datas(n_squeaks):
+    blockchain = BenchBlockchain()
+    squeak_makers = [SqueakMaker(CSigningKey.generate(), blockchain)
+                     for _ in range(N_AUTHORS)]
+    datas = []
+    for i in range(n_squeaks):
+        blockchain.block_height = i
+        squeak = squeak_makers[i % N_AUTHORS].make_squeak('squeak {}'.format(i))
+        datas.append(squeak.serialize())
+    return datas
+
+
+def fill_squeak_dict(squeak_datas):
+    squeaks = {}
+    for data in squeak_datas:
+        squeak = CSqueak.deserialize(data)
+        squeaks[squeak.GetHash()] = squeak
+    return squeaks
+
+
+def fill_store(store, squeak_datas):
+    for data in squeak_datas:
+        store.add_squeak(CSqueak.deserialize(data))
+    return store
+
+
+def traced_size(fn, *args):
+    """Get the memory still allocated after calling `fn`, while its
+    result is kept.
+    """
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    result = fn(*args)
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return end - start
+
+
+def main():
+    SelectParams('regtest')
+    n_squeaks = int(sys.argv[1]) if len(sys.argv) > 1 else N_SQUEAKS
+    squeak_datas = make_squeak_datas(n_squeaks)
+    print('serialized squeak: {} bytes'.format(len(squeak_datas[0])))
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_store = LogSqueakStore(log_dir)
+        for name, size in [
+                ('squeak objects', traced_size(fill_squeak_dict, squeak_datas)),
+                ('memory store', traced_size(fill_store, MemorySqueakStore(), squeak_datas)),
+                ('log store', traced_size(fill_store, log_store, squeak_datas)),
+        ]:
+            print('{:>15}: {:>6.0f} bytes/squeak'.format(name, size / n_squeaks))
+        log_store.close()
+
+
+if __name__ == '__main__':
+    main()
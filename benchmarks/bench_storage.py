@@ -0,0 +1,101 @@
+"""Compare the insert and locator query throughput of the memory and
+SQLite squeak stores.
+
+Squeaks are made by `N_AUTHORS` authors over a range of block heights.
+Each locator asks for the squeaks of one author above a block height.
+
+Usage: python -m benchmarks.bench_storage [n_squeaks]
+"""
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from squeak.core.signing import CSigningKey
+from squeak.net import CInterested
+from squeak.net import CSqueakLocator
+from squeak.params import SelectParams
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.stores.memory.storage import MemoryStorage
+from squeakclient.squeaknode.node.stores.sqlite.storage import SqliteStorage
+
+
+N_SQUEAKS = 10000
+N_AUTHORS = 50
+MAX_BLOCK_HEIGHT = 1000
+N_LOCATORS = 200
+
+
+class BenchBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 0
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
+
+
+def make_squeaks(n_squeaks):
+    blockchain = BenchBlockchain()
+    squeak_makers = [SqueakMaker(CSigningKey.generate(), blockchain)
+                     for _ in range(N_AUTHORS)]
+    squeaks = []
+    for i in range(n_squeaks):
+        blockchain.block_height = random.randrange(MAX_BLOCK_HEIGHT)
+        squeak_maker = random.choice(squeak_makers)
+        squeaks.append(squeak_maker.make_squeak('squeak {}'.format(i)))
+    return squeaks
+
+
+def make_locators(squeaks):
+    addresses = list({squeak.GetAddress() for squeak in squeaks})
+    return [
+        CSqueakLocator(vInterested=[
+            CInterested(
+                address=random.choice(addresses),
+                nMinBlockHeight=random.randrange(MAX_BLOCK_HEIGHT),
+            ),
+        ])
+        for _ in range(N_LOCATORS)
+    ]
+
+
+def bench_store(store, squeaks, locators):
+    start = time.perf_counter()
+    for squeak in squeaks:
+        store.add_squeak(squeak)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_found = 0
+    for locator in locators:
+        n_found += sum(1 for _ in store.get_squeak_headers_by_locator(locator))
+    locator_time = time.perf_counter() - start
+    return len(squeaks) / insert_time, len(locators) / locator_time, n_found
+
+
+def main():
+    SelectParams('regtest')
+    n_squeaks = int(sys.argv[1]) if len(sys.argv) > 1 else N_SQUEAKS
+    squeaks = make_squeaks(n_squeaks)
+    locators = make_locators(squeaks)
+    with tempfile.TemporaryDirectory() as data_dir:
+        sqlite_storage = SqliteStorage(Path(data_dir) / 'squeaknode.db')
+        for name, storage in [
+                ('memory', MemoryStorage()),
+                ('sqlite', sqlite_storage),
+        ]:
+            inserts, queries, n_found = bench_store(storage.get_squeak_store(), squeaks, locators)
+            print('{:>7}: {:>9.0f} inserts/s, {:>8.1f} locators/s ({} squeaks found)'.format(
+                name, inserts, queries, n_found))
+        sqlite_storage.close()
+
+
+if __name__ == '__main__':
+    main()
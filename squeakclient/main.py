@@ -11,12 +11,18 @@ from squeakclient.squeaknode.core.stores.storage import Storage
 from squeakclient.squeaknode.node.clientsqueaknode import ClientSqueakNode
 from squeakclient.squeaknode.node.rpc_blockchain import RPCBlockchain
 from squeakclient.squeaknode.node.rpc_lightning_client import RPCLightningClient
+from squeakclient.squeaknode.node.stores.log.storage import LogStorage
 from squeakclient.squeaknode.node.stores.memory.storage import MemoryStorage
+from squeakclient.squeaknode.node.stores.sqlite.storage import SqliteStorage
 from squeakclient.squeaknode.rpc.route_guide_server import RouteGuideServicer
 from squeakclient.squeaknode.node.peer_handler import PeerHandler
 
 
-def load_storage() -> Storage:
+def load_storage(storage_type) -> Storage:
+    if storage_type == 'sqllite':
+        return SqliteStorage()
+    if storage_type == 'log':
+        return LogStorage()
     return MemoryStorage()
 
 
@@ -37,8 +43,8 @@ def load_lightning_client(rpc_host, rpc_port, network) -> LightningClient:
     )
 
 
-def _start_node(storage, blockchain, lightning_client):
-    node = ClientSqueakNode(storage, blockchain, lightning_client)
+def _start_node(storage, blockchain, lightning_client, peer_transport, compression):
+    node = ClientSqueakNode(storage, blockchain, lightning_client, peer_transport, compression=compression)
     peer_handler = PeerHandler(node)
     thread = threading.Thread(
         target=node.start,
@@ -98,9 +104,23 @@ def parse_args():
         dest='storage_type',
         type=str,
         default='memory',
-        choices=['memory', 'sqllite'],
+        choices=['memory', 'sqllite', 'log'],
         help='Type of storage to use for the node',
     )
+    parser.add_argument(
+        '--peer-transport',
+        dest='peer_transport',
+        type=str,
+        default='thread',
+        choices=['thread', 'asyncio'],
+        help='Use a thread per peer, or a single asyncio event loop for all peers',
+    )
+    parser.add_argument(
+        '--disable-compression',
+        dest='compression',
+        action='store_false',
+        help='Do not offer compressed message batches to peers',
+    )
     parser.add_argument(
         '--btcd.rpchost',
         dest='btcd_rpchost',
@@ -163,7 +183,7 @@ def main():
     print('network:', args.network, flush=True)
     SelectParams(args.network)
 
-    storage = load_storage()
+    storage = load_storage(args.storage_type)
     blockchain = load_blockchain(
         args.btcd_rpchost,
         args.btcd_rpcport,
@@ -176,7 +196,13 @@ def main():
         args.network,
     )
 
-    node, thread = _start_node(storage, blockchain, lightning_client)
+    node, thread = _start_node(
+        storage,
+        blockchain,
+        lightning_client,
+        args.peer_transport,
+        args.compression,
+    )
 
     # start rpc server
     route_guide_server, route_guide_server_thread = _start_route_guide_rpc_server(node)
@@ -31,4 +31,5 @@ class SqueakMaker(object):
             block_height,
             block_hash,
             timestamp,
+            reply_to=reply_to,
         )
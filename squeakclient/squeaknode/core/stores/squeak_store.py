@@ -1,10 +1,14 @@
 from abc import ABC
 from abc import abstractmethod
+from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Tuple
 
 from squeak.core import CSqueak
 from squeak.core import CSqueakHeader
 from squeak.core import HASH_LENGTH
+from squeak.core.signing import CSqueakAddress
 from squeak.net import CInterested
 from squeak.net import CSqueakLocator
 
@@ -34,6 +38,20 @@ class SqueakStore(ABC):
     def get_squeak(self, squeak_hash: bytes) -> CSqueak:
         pass
 
+    @abstractmethod
+    def get_squeaks_by_hashes(self, squeak_hashes: List[bytes]) -> Dict[bytes, CSqueak]:
+        """Get the squeaks with the given hashes that are in the store."""
+        pass
+
+    @abstractmethod
+    def has_squeak(self, squeak_hash: bytes) -> bool:
+        pass
+
+    @abstractmethod
+    def filter_missing(self, squeak_hashes: List[bytes]) -> List[bytes]:
+        """Get the hashes of the given squeaks that are not in the store."""
+        pass
+
     @abstractmethod
     def add_squeak(self, squeak: CSqueak) -> None:
         pass
@@ -43,11 +61,37 @@ class SqueakStore(ABC):
         pass
 
     @abstractmethod
-    def get_squeak_headers_created_by(self, created_by: bytes) -> List[CSqueakHeader]:
+    def get_squeak_headers_created_by(
+            self,
+            created_by: CSqueakAddress,
+            min_block_height: int = -1,
+            limit: int = None,
+    ) -> List[CSqueakHeader]:
+        """Get the headers of the squeaks made by an author, ordered by
+        block height, starting at `min_block_height`.
+
+        At most `limit` headers are returned, except that the page is
+        extended to include every squeak at its last block height. The
+        next page starts at the last block height plus one.
+        """
+        pass
+
+    @abstractmethod
+    def get_squeak_hashes_by_locator(self, locator: CSqueakLocator) -> Iterator[Tuple[int, bytes]]:
+        """Generate `(block height, hash)` of the squeaks that match the
+        locator, in the same order as `get_squeak_headers_by_locator`,
+        without loading the headers.
+        """
         pass
 
     @abstractmethod
-    def get_squeaks_by_locator(self, locator: CSqueakLocator) -> List[CSqueak]:
+    def get_squeak_headers_by_locator(self, locator: CSqueakLocator) -> Iterator[CSqueakHeader]:
+        """Generate the headers of the squeaks that match the locator.
+
+        The headers are generated for each interest of the locator in
+        turn, ordered by block height, and every squeak is only generated
+        once. The squeak contents are not loaded.
+        """
         pass
 
     def _squeak_in_locator(self, squeak: CSqueak, locator: CSqueakLocator) -> bool:
@@ -94,9 +94,14 @@ class SqueaksAccess(object):
         return self.storage.get_squeak_store().get_squeak(squeak_hash)
 
     def add_squeak(self, squeak):
+        """Save the squeak, and return True if it was not saved before."""
         with self.squeaks_lock:
-            self.storage.get_squeak_store().add_squeak(squeak)
+            squeak_store = self.storage.get_squeak_store()
+            if squeak_store.has_squeak(squeak.GetHash()):
+                return False
+            squeak_store.add_squeak(squeak)
             self.on_squeaks_changed()
+            return True
 
     def on_squeaks_changed(self):
         if self.squeaks_changed_callback:
@@ -106,9 +111,32 @@ class SqueaksAccess(object):
     def listen_squeaks_changed(self, callback):
         self.squeaks_changed_callback = callback
 
-    def get_squeaks_by_locator(self, locator):
-        with self.squeaks_lock:
-            return self.storage.get_squeak_store().get_squeaks_by_locator(locator)
+    def get_squeak_hashes_by_locator(self, locator):
+        """Generate `(block height, hash)` of the squeaks that match the
+        locator.
+        """
+        return self.storage.get_squeak_store().get_squeak_hashes_by_locator(locator)
+
+    def get_squeak_headers_by_locator(self, locator):
+        """Generate the headers of the squeaks that match the locator."""
+        return self.storage.get_squeak_store().get_squeak_headers_by_locator(locator)
+
+    def get_squeak_headers_created_by(self, created_by, min_block_height=-1, limit=None):
+        """Get a page of the headers of the squeaks made by an author."""
+        return self.storage.get_squeak_store().get_squeak_headers_created_by(
+            created_by,
+            min_block_height,
+            limit,
+        )
 
     def get_squeak_hashes(self):
         return self.storage.get_squeak_store().get_hashes()
+
+    def get_squeaks_by_hashes(self, squeak_hashes):
+        return self.storage.get_squeak_store().get_squeaks_by_hashes(squeak_hashes)
+
+    def has_squeak(self, squeak_hash):
+        return self.storage.get_squeak_store().has_squeak(squeak_hash)
+
+    def filter_missing_squeaks(self, squeak_hashes):
+        return self.storage.get_squeak_store().filter_missing(squeak_hashes)
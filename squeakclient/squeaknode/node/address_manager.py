@@ -0,0 +1,256 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from pathlib import Path
+
+from squeakclient.squeaknode.core.data.data_dir import create_data_dir
+from squeakclient.squeaknode.core.data.data_dir import DATA_DIR
+
+
+NEW_BUCKET_COUNT = 64
+TRIED_BUCKET_COUNT = 16
+BUCKET_SIZE = 32
+MAX_ADDRESSES_PER_SOURCE = 64
+SELECT_TRIES = 50
+PEERS_FILE = Path(DATA_DIR) / 'peers.json'
+
+
+logger = logging.getLogger(__name__)
+
+
+class AddressInfo(object):
+    """What is known about a peer address."""
+
+    def __init__(self, address, source, last_seen=0, last_attempt=0, last_success=0, attempts=0):
+        self.address = address
+        self.source = source
+        self.last_seen = last_seen
+        self.last_attempt = last_attempt
+        self.last_success = last_success
+        self.attempts = attempts
+
+    def to_dict(self):
+        ip, port = self.address
+        return {
+            'ip': ip,
+            'port': port,
+            'source': self.source,
+            'last_seen': self.last_seen,
+            'last_attempt': self.last_attempt,
+            'last_success': self.last_success,
+            'attempts': self.attempts,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(
+            (d['ip'], d['port']),
+            d['source'],
+            d['last_seen'],
+            d['last_attempt'],
+            d['last_success'],
+            d['attempts'],
+        )
+
+
+class AddressManager(object):
+    """Keeps a table of peer addresses to make outbound connections to.
+
+    Like the address manager in Bitcoin Core, addresses that were only
+    advertised are kept in "new" buckets, and addresses that we have
+    successfully connected to are moved to "tried" buckets. The bucket of
+    an address is chosen by a keyed hash of its network group, and of the
+    group of the peer that advertised it, so a single source cannot fill
+    the table. Each source is also limited to `MAX_ADDRESSES_PER_SOURCE`
+    addresses in the new table.
+    """
+
+    def __init__(self, peers_file=PEERS_FILE):
+        self.peers_file = peers_file
+        self._key = os.urandom(32)
+        self._new = [{} for _ in range(NEW_BUCKET_COUNT)]
+        self._tried = [{} for _ in range(TRIED_BUCKET_COUNT)]
+        self._buckets = {}
+        self._source_counts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    @property
+    def num_new(self):
+        return sum(len(bucket) for bucket in self._new)
+
+    @property
+    def num_tried(self):
+        return sum(len(bucket) for bucket in self._tried)
+
+    def add_addresses(self, addresses, source):
+        """Add addresses that were advertised by the given source ip.
+
+        Returns the number of new addresses added to the table.
+        """
+        now = int(time.time())
+        with self._lock:
+            return sum(
+                self._add(AddressInfo(address, source, last_seen=now))
+                for address in addresses
+            )
+
+    def _add(self, info):
+        bucket = self._buckets.get(info.address)
+        if bucket is not None:
+            bucket[info.address].last_seen = max(bucket[info.address].last_seen, info.last_seen)
+            return False
+        source_group = network_group(info.source)
+        if self._source_counts.get(source_group, 0) >= MAX_ADDRESSES_PER_SOURCE:
+            return False
+        bucket = self._new[self._new_bucket_index(info.address, info.source)]
+        if len(bucket) >= BUCKET_SIZE:
+            self._remove(self._oldest(bucket))
+        self._put(bucket, info)
+        return True
+
+    def mark_attempt(self, address):
+        """Record an attempt to connect to the address."""
+        with self._lock:
+            bucket = self._buckets.get(address)
+            if bucket is None:
+                return
+            info = bucket[address]
+            info.attempts += 1
+            info.last_attempt = int(time.time())
+
+    def mark_good(self, address):
+        """Record a successful connection, and move the address to the
+        tried table.
+        """
+        now = int(time.time())
+        with self._lock:
+            bucket = self._buckets.get(address)
+            if bucket is None:
+                info = AddressInfo(address, address[0], last_seen=now)
+            else:
+                info = bucket[address]
+                self._remove(info)
+            info.last_success = now
+            info.last_seen = now
+            info.attempts = 0
+            tried_bucket = self._tried[self._tried_bucket_index(address)]
+            if len(tried_bucket) >= BUCKET_SIZE:
+                # Move the oldest tried address back to the new table.
+                evicted = self._oldest(tried_bucket)
+                self._remove(evicted)
+                self._add(evicted)
+            self._put(tried_bucket, info)
+
+    def select(self, n, exclude=()):
+        """Select up to `n` random addresses to connect to, drawing from
+        the tried and the new table with equal chance.
+        """
+        exclude = set(exclude)
+        selected = set()
+        with self._lock:
+            tables = [
+                [bucket for bucket in table if bucket]
+                for table in (self._tried, self._new)
+            ]
+            tables = [table for table in tables if table]
+            if not tables:
+                return []
+            for _ in range(n * SELECT_TRIES):
+                if len(selected) >= n:
+                    break
+                bucket = random.choice(random.choice(tables))
+                address = random.choice(list(bucket))
+                if address not in exclude:
+                    selected.add(address)
+        return list(selected)
+
+    def get_addresses(self):
+        with self._lock:
+            return list(self._buckets)
+
+    def _put(self, bucket, info):
+        bucket[info.address] = info
+        self._buckets[info.address] = bucket
+        if self._is_new_bucket(bucket):
+            source_group = network_group(info.source)
+            self._source_counts[source_group] = self._source_counts.get(source_group, 0) + 1
+
+    def _remove(self, info):
+        bucket = self._buckets.pop(info.address)
+        del bucket[info.address]
+        if self._is_new_bucket(bucket):
+            source_group = network_group(info.source)
+            self._source_counts[source_group] -= 1
+            if not self._source_counts[source_group]:
+                del self._source_counts[source_group]
+
+    def _is_new_bucket(self, bucket):
+        return any(bucket is new_bucket for new_bucket in self._new)
+
+    def _oldest(self, bucket):
+        return min(bucket.values(), key=lambda info: info.last_seen)
+
+    def _hash(self, *parts):
+        h = hashlib.sha256(self._key)
+        for part in parts:
+            h.update(part.encode('utf-8'))
+            h.update(b'\x00')
+        return int.from_bytes(h.digest()[:8], 'little')
+
+    def _new_bucket_index(self, address, source):
+        return self._hash(network_group(address[0]), network_group(source)) % NEW_BUCKET_COUNT
+
+    def _tried_bucket_index(self, address):
+        ip, port = address
+        return self._hash(ip, str(port)) % TRIED_BUCKET_COUNT
+
+    def save(self):
+        """Save the address table to the peers file."""
+        with self._lock:
+            data = {
+                'key': self._key.hex(),
+                'new': [info.to_dict() for bucket in self._new for info in bucket.values()],
+                'tried': [info.to_dict() for bucket in self._tried for info in bucket.values()],
+            }
+        create_data_dir()
+        tmp_file = Path(str(self.peers_file) + '.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_file, self.peers_file)
+
+    def load(self):
+        """Load the address table from the peers file, if it exists."""
+        try:
+            with open(self.peers_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logger.exception('Failed to load peers file {}'.format(self.peers_file))
+            return
+        with self._lock:
+            self._key = bytes.fromhex(data['key'])
+            for d in data['new']:
+                self._add(AddressInfo.from_dict(d))
+            for d in data['tried']:
+                info = AddressInfo.from_dict(d)
+                tried_bucket = self._tried[self._tried_bucket_index(info.address)]
+                if info.address not in self._buckets and len(tried_bucket) < BUCKET_SIZE:
+                    self._put(tried_bucket, info)
+        logger.info('Loaded {} peer addresses'.format(len(self)))
+
+
+def network_group(ip):
+    """Get the network group of an ip address, the /16 for IPv4 and the
+    /32 for IPv6.
+    """
+    if ':' in ip:
+        return ':'.join(ip.split(':')[:2])
+    return '.'.join(ip.split('.')[:2])
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import squeak.params
+
+from squeakclient.squeaknode.node.dialer import CONNECT_TIMEOUT
+from squeakclient.squeaknode.node.dialer import DialTracker
+from squeakclient.squeaknode.node.dialer import MAX_CONCURRENT_DIALS
+from squeakclient.squeaknode.node.connection import Connection
+from squeakclient.squeaknode.node.peer import MAX_RECV_QUEUE_BYTES
+from squeakclient.squeaknode.node.peer import MAX_SEND_QUEUE_BYTES
+from squeakclient.squeaknode.node.peer import MessageDecoder
+from squeakclient.squeaknode.node.peer import MessageSender
+from squeakclient.squeaknode.node.peer import Peer
+from squeakclient.squeaknode.node.peer import SendQueueFullError
+from squeakclient.squeaknode.node.peer_message_handler import PeerMessageHandler
+
+
+MAX_HANDLER_THREADS = 16
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncPeerServer(object):
+    """Maintains connections to other peers in the network.
+
+    All peer connections are driven by protocols on a single asyncio event
+    loop, instead of using separate threads for every peer. Only framing
+    is done on the loop. Received messages are handled on a pool of
+    `MAX_HANDLER_THREADS` threads, so a slow storage read does not stall
+    the other peers.
+    """
+
+    def __init__(self, connection_manager, port=None):
+        self.ip = socket.gethostbyname('localhost')
+        self.port = port or squeak.params.params.DEFAULT_PORT
+        self.connection_manager = connection_manager
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.dial_tracker = DialTracker()
+        self.dial_semaphore = None
+        self.handler_executor = ThreadPoolExecutor(max_workers=MAX_HANDLER_THREADS)
+
+    def start(self, peer_handler):
+        self.peer_handler = peer_handler
+
+        # Start event loop thread
+        threading.Thread(target=self.run_loop).start()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.handler_executor.shutdown(wait=False)
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.dial_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DIALS)
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(
+                lambda: self.make_protocol(outgoing=False),
+                port=self.port,
+            )
+        )
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+
+    def make_protocol(self, outgoing):
+        return PeerProtocol(self.peer_handler.node, self.loop, self.handler_executor, outgoing)
+
+    async def make_connection(self, ip, port):
+        address = (ip, port)
+        async with self.dial_semaphore:
+            logger.debug('Making connection to {}'.format(address))
+            start_time = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    self.loop.create_connection(
+                        lambda: self.make_protocol(outgoing=True),
+                        ip,
+                        port,
+                    ),
+                    CONNECT_TIMEOUT,
+                )
+            except Exception:
+                self.dial_tracker.finish_dial(address, False, time.perf_counter() - start_time)
+                return
+            self.dial_tracker.finish_dial(address, True, time.perf_counter() - start_time)
+
+    def connect_address(self, address):
+        """Connect to new address."""
+        logger.debug('Connecting to peer with address {}'.format(address))
+        if self.connection_manager.has_connection(address):
+            return
+        if not self.dial_tracker.start_dial(address):
+            return
+        ip, port = address
+        asyncio.run_coroutine_threadsafe(
+            self.make_connection(ip, port),
+            self.loop,
+        )
+
+    def get_dial_stats(self):
+        return self.dial_tracker.get_stats()
+
+
+class PeerProtocol(asyncio.BufferedProtocol):
+    """Frames the data of a single peer on the event loop, and handles its
+    messages in order on the handler pool.
+
+    At most one handler thread works on the messages of a peer at a time.
+    Reading from the transport is paused while more than
+    `MAX_RECV_QUEUE_BYTES` of messages are waiting to be handled, or
+    while the peer is over its receive rate limit.
+    """
+
+    def __init__(self, node, loop, handler_executor, outgoing):
+        self.node = node
+        self.loop = loop
+        self.handler_executor = handler_executor
+        self.outgoing = outgoing
+        self.decoder = MessageDecoder()
+        self.read_buffer = None
+        self.transport = None
+        self.peer = None
+        self.msg_sender = None
+        self.connection = None
+        self.peer_message_handler = None
+        self._frames = deque()
+        self._frames_bytes = 0
+        self._frames_lock = threading.Lock()
+        self._handling = False
+        self._rate_delayed = False
+        self._reading_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        ip, port = transport.get_extra_info('peername')[:2]
+        address = (ip, port)
+        logger.debug('Setting up protocol for peer address {} ...'.format(address))
+        peer_socket = TransportSocket(transport, self.loop)
+        bandwidth = self.node.bandwidth_manager.new_peer_bandwidth()
+        self.msg_sender = TransportMessageSender(transport, self.loop, bandwidth)
+        self.peer = Peer(peer_socket, address, self.outgoing, self.msg_sender, bandwidth)
+        self.connection = Connection(self.peer, self.node)
+        self.peer_message_handler = PeerMessageHandler(self.peer, self.node)
+        try:
+            self.connection.open()
+        except Exception:
+            logger.exception('Failed to add peer {}'.format(self.peer))
+            self.connection = None
+            transport.close()
+            return
+        try:
+            self.connection.start_handshake()
+        except Exception:
+            logger.exception('Failed to start handshake with peer {}'.format(self.peer))
+            self.peer.stop()
+
+    def delay_reading(self, delay):
+        """Stop reading from the transport for `delay` seconds."""
+        self._rate_delayed = True
+        self.loop.call_later(delay, self._end_delay)
+        self._update_reading()
+
+    def _end_delay(self):
+        self._rate_delayed = False
+        self._update_reading()
+
+    def _update_reading(self):
+        """Pause or resume reading from the transport. Only called on the
+        loop thread.
+        """
+        if self.transport.is_closing():
+            return
+        pause = self._rate_delayed or self._frames_bytes > MAX_RECV_QUEUE_BYTES
+        if pause and not self._reading_paused:
+            self.transport.pause_reading()
+            self._reading_paused = True
+        elif not pause and self._reading_paused:
+            self.transport.resume_reading()
+            self._reading_paused = False
+
+    def get_buffer(self, sizehint):
+        read_len = self.decoder.next_read_size()
+        self.read_buffer = self.decoder.get_read_buffer(read_len)
+        return self.read_buffer
+
+    def buffer_updated(self, nbytes):
+        self.read_buffer.release()
+        delay = 0
+        try:
+            for frame in self.decoder.buffer_updated(nbytes):
+                delay = max(delay, self.peer.frame_received(frame))
+                self._queue_frame(frame)
+        except Exception:
+            logger.exception('Error decoding data from peer {}'.format(self.peer))
+            self.peer.stop()
+            return
+        if delay:
+            self.delay_reading(delay)
+        else:
+            self._update_reading()
+
+    def _queue_frame(self, frame):
+        with self._frames_lock:
+            self._frames.append(frame)
+            self._frames_bytes += frame.size
+            if self._handling:
+                return
+            self._handling = True
+        self.loop.run_in_executor(self.handler_executor, self._handle_frames)
+
+    def _handle_frames(self):
+        """Handle the waiting frames in order, on a handler thread."""
+        while True:
+            with self._frames_lock:
+                if not self._frames or self.peer.stopped.is_set():
+                    self._frames.clear()
+                    self._frames_bytes = 0
+                    self._handling = False
+                    break
+                frame = self._frames.popleft()
+                was_over_limit = self._frames_bytes > MAX_RECV_QUEUE_BYTES
+                self._frames_bytes -= frame.size
+                resume = was_over_limit and self._frames_bytes <= MAX_RECV_QUEUE_BYTES
+            if resume:
+                self.loop.call_soon_threadsafe(self._update_reading)
+            try:
+                self.handle_msg(frame)
+            except Exception:
+                logger.exception('Error handling message from peer {}'.format(self.peer))
+                self.peer.stop()
+
+    def handle_msg(self, frame):
+        logger.debug('Received msg {} from {}'.format(frame, self.peer))
+        if self.peer.is_handshake_complete:
+            self.peer_message_handler.handle_peer_message(frame)
+        else:
+            self.connection.handle_handshake_msg(frame)
+
+    def resume_writing(self):
+        self.msg_sender.resume_writing()
+
+    def connection_lost(self, exc):
+        if self.peer is None:
+            return
+        self.peer.stop()
+        if self.connection:
+            self.connection.close()
+        logger.debug('Stopped protocol for peer address {}.'.format(self.peer.address))
+
+
+def call_in_loop(loop, callback, *args):
+    """Run the callback now if called from the loop thread, or schedule it
+    on the loop otherwise.
+    """
+    try:
+        in_loop = asyncio.get_running_loop() is loop
+    except RuntimeError:
+        in_loop = False
+    if in_loop:
+        callback(*args)
+    else:
+        loop.call_soon_threadsafe(callback, *args)
+
+
+class TransportSocket(object):
+    """Adapts an asyncio transport to the socket methods used by `Peer`.
+
+    The methods may be called from any thread, the transport is only
+    touched from the event loop thread.
+    """
+
+    def __init__(self, transport, loop):
+        self.transport = transport
+        self.loop = loop
+
+    def shutdown(self, how):
+        pass
+
+    def close(self):
+        call_in_loop(self.loop, self.transport.close)
+
+
+class TransportMessageSender(MessageSender):
+    """Writes the queued messages of a peer to an asyncio transport.
+
+    Messages are flushed in a callback scheduled on the loop, so all of
+    the messages queued while handling the same data are handed to the
+    transport together with a single `writelines` call. If the peer is
+    over its send rate limit, the write is delayed, and no other batch is
+    flushed until it has been written.
+    """
+
+    def __init__(self, transport, loop, bandwidth=None):
+        super().__init__(None, None, bandwidth)
+        self.transport = transport
+        self.loop = loop
+        self._flush_scheduled = False
+
+    @property
+    def queued_bytes(self):
+        return self._queued_bytes + self.transport.get_write_buffer_size()
+
+    def queue_data(self, data):
+        with self._queue_changed:
+            if self.queued_bytes + len(data) > MAX_SEND_QUEUE_BYTES:
+                raise SendQueueFullError()
+            self._queue.append(data)
+            self._queued_bytes += len(data)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.loop.call_soon_threadsafe(self._flush)
+
+    def stop(self):
+        with self._queue_changed:
+            self._drained_callbacks = []
+
+    def resume_writing(self):
+        self._run_drained_callbacks()
+
+    def _flush(self):
+        with self._queue_changed:
+            batch = list(self._queue)
+            self._queue.clear()
+        delay = self.bandwidth.send_delay(sum(len(data) for data in batch))
+        if delay:
+            self.loop.call_later(delay, self._write, batch)
+        else:
+            self._write(batch)
+
+    def _write(self, batch):
+        if not self.transport.is_closing():
+            self.transport.writelines(batch)
+        with self._queue_changed:
+            self._queued_bytes -= sum(len(data) for data in batch)
+            flush_scheduled = self._flush_scheduled = bool(self._queue)
+        if flush_scheduled:
+            self.loop.call_soon(self._flush)
+        self._run_drained_callbacks()
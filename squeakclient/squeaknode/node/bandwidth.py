@@ -0,0 +1,186 @@
+import threading
+import time
+
+
+PEER_RECV_BYTES_PER_SEC = 1048576
+PEER_SEND_BYTES_PER_SEC = 1048576
+GLOBAL_RECV_BYTES_PER_SEC = 8 * 1048576
+GLOBAL_SEND_BYTES_PER_SEC = 8 * 1048576
+BURST_SECONDS = 2
+
+# Messages per second and burst size for the commands that are expensive
+# to answer.
+COMMAND_RATE_LIMITS = {
+    b'getsqueaks': (1, 10),
+    b'getdata': (20, 100),
+    b'getaddr': (0.1, 2),
+}
+
+
+class TokenBucket(object):
+    """A token bucket that refills at `rate` tokens per second, up to
+    `capacity` tokens.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_time) * self.rate)
+        self._last_time = now
+
+    def consume(self, n=1):
+        """Take `n` tokens if they are available, and return True if they
+        were taken.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens < n:
+                return False
+            self._tokens -= n
+            return True
+
+    def reserve(self, n):
+        """Take `n` tokens, going into debt if there are not enough, and
+        return the number of seconds to wait until the debt is paid.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= n
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class CommandTraffic(object):
+    """Message and byte counts for one command."""
+
+    def __init__(self, msgs_sent=0, bytes_sent=0, msgs_recv=0, bytes_recv=0, msgs_dropped=0):
+        self.msgs_sent = msgs_sent
+        self.bytes_sent = bytes_sent
+        self.msgs_recv = msgs_recv
+        self.bytes_recv = bytes_recv
+        self.msgs_dropped = msgs_dropped
+
+    def copy(self):
+        return CommandTraffic(
+            self.msgs_sent,
+            self.bytes_sent,
+            self.msgs_recv,
+            self.bytes_recv,
+            self.msgs_dropped,
+        )
+
+
+class TrafficStats(object):
+    """Counts the messages and bytes sent and received for each command.
+
+    Every count is also added to the `parent` stats, if there are any.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self._commands = {}
+        self._lock = threading.Lock()
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+
+    def _get(self, command):
+        traffic = self._commands.get(command)
+        if traffic is None:
+            traffic = self._commands[command] = CommandTraffic()
+        return traffic
+
+    def record_sent(self, command, nbytes):
+        with self._lock:
+            traffic = self._get(command)
+            traffic.msgs_sent += 1
+            traffic.bytes_sent += nbytes
+            self.bytes_sent += nbytes
+        if self.parent:
+            self.parent.record_sent(command, nbytes)
+
+    def record_recv(self, command, nbytes):
+        with self._lock:
+            traffic = self._get(command)
+            traffic.msgs_recv += 1
+            traffic.bytes_recv += nbytes
+            self.bytes_recv += nbytes
+        if self.parent:
+            self.parent.record_recv(command, nbytes)
+
+    def record_dropped(self, command):
+        with self._lock:
+            self._get(command).msgs_dropped += 1
+        if self.parent:
+            self.parent.record_dropped(command)
+
+    def get_stats(self):
+        """Get a snapshot of the counts for every command."""
+        with self._lock:
+            return {
+                command: traffic.copy()
+                for command, traffic in self._commands.items()
+            }
+
+
+class BandwidthManager(object):
+    """Holds the node-wide byte rate limits and traffic counts."""
+
+    def __init__(self):
+        self.recv_bucket = TokenBucket(GLOBAL_RECV_BYTES_PER_SEC, GLOBAL_RECV_BYTES_PER_SEC * BURST_SECONDS)
+        self.send_bucket = TokenBucket(GLOBAL_SEND_BYTES_PER_SEC, GLOBAL_SEND_BYTES_PER_SEC * BURST_SECONDS)
+        self.traffic = TrafficStats()
+
+    def new_peer_bandwidth(self):
+        return PeerBandwidth(self)
+
+
+class PeerBandwidth(object):
+    """Rate limits and traffic counts of a single peer.
+
+    Received and sent bytes are limited both for the peer and for the
+    whole node. Going over a byte limit delays further reads or writes
+    until the bucket has refilled. Messages with an expensive command are
+    dropped if the peer sends them faster than `COMMAND_RATE_LIMITS`.
+    """
+
+    def __init__(self, manager=None):
+        self.manager = manager
+        self.recv_bucket = TokenBucket(PEER_RECV_BYTES_PER_SEC, PEER_RECV_BYTES_PER_SEC * BURST_SECONDS)
+        self.send_bucket = TokenBucket(PEER_SEND_BYTES_PER_SEC, PEER_SEND_BYTES_PER_SEC * BURST_SECONDS)
+        self.command_buckets = {
+            command: TokenBucket(rate, capacity)
+            for command, (rate, capacity) in COMMAND_RATE_LIMITS.items()
+        }
+        self.traffic = TrafficStats(manager.traffic if manager else None)
+
+    def recv_delay(self, command, nbytes):
+        """Record received bytes, and return the seconds to wait before
+        reading more.
+        """
+        self.traffic.record_recv(command, nbytes)
+        delay = self.recv_bucket.reserve(nbytes)
+        if self.manager:
+            delay = max(delay, self.manager.recv_bucket.reserve(nbytes))
+        return delay
+
+    def send_delay(self, nbytes):
+        """Return the seconds to wait before writing `nbytes` bytes."""
+        delay = self.send_bucket.reserve(nbytes)
+        if self.manager:
+            delay = max(delay, self.manager.send_bucket.reserve(nbytes))
+        return delay
+
+    def allow_command(self, command):
+        """Return True if a message with the command should be handled."""
+        bucket = self.command_buckets.get(command)
+        if bucket is None or bucket.consume():
+            return True
+        self.traffic.record_dropped(command)
+        return False
@@ -7,9 +7,18 @@ from squeakclient.squeaknode.core.stores.storage import Storage
 from squeakclient.squeaknode.node.access import FollowsAccess
 from squeakclient.squeaknode.node.access import SigningKeyAccess
 from squeakclient.squeaknode.node.access import SqueaksAccess
+from squeakclient.squeaknode.node.address_manager import AddressManager
+from squeakclient.squeaknode.node.async_peer_server import AsyncPeerServer
+from squeakclient.squeaknode.node.bandwidth import BandwidthManager
 from squeakclient.squeaknode.node.peer_server import PeerServer
 from squeakclient.squeaknode.node.connection_manager import ConnectionManager
+from squeakclient.squeaknode.node.download_scheduler import DownloadScheduler
+from squeakclient.squeaknode.node.inventory_relay import InventoryRelay
+from squeakclient.squeaknode.node.keepalive import Keepalive
+from squeakclient.squeaknode.node.message_stats import MessageStats
 from squeakclient.squeaknode.node.network_manager import NetworkManager
+from squeakclient.squeaknode.node.squeak_sender import SqueakFrameCache
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
 
 
 logger = logging.getLogger(__name__)
@@ -19,20 +28,45 @@ class ClientSqueakNode(object):
     """Network node that handles client commands.
     """
 
-    def __init__(self, storage: Storage, blockchain: Blockchain, lightning_client: LightningClient) -> None:
+    def __init__(
+            self,
+            storage: Storage,
+            blockchain: Blockchain,
+            lightning_client: LightningClient,
+            peer_transport: str = 'thread',
+            port: int = None,
+            compression: bool = True,
+    ) -> None:
         self.storage = storage
         self.blockchain = blockchain
         self.lightning_client = lightning_client
         self.connection_manager = ConnectionManager()
-        self.peer_server = PeerServer(self.connection_manager)
-        self.network_manager = NetworkManager(self.connection_manager, self.peer_server)
+        if peer_transport == 'asyncio':
+            self.peer_server = AsyncPeerServer(self.connection_manager, port)
+        else:
+            self.peer_server = PeerServer(self.connection_manager, port)
+        self.address_manager = AddressManager()
+        self.network_manager = NetworkManager(self.connection_manager, self.peer_server, self.address_manager)
         self.signing_key_access = SigningKeyAccess(self.storage)
         self.follows_access = FollowsAccess(self.storage)
         self.squeaks_access = SqueaksAccess(self.storage)
+        self.message_stats = MessageStats()
+        self.timer_wheel = TimerWheel()
+        self.keepalive = Keepalive(self.timer_wheel)
+        self.inventory_relay = InventoryRelay(self.timer_wheel)
+        self.download_scheduler = DownloadScheduler(self.timer_wheel)
+        self.squeak_frame_cache = SqueakFrameCache()
+        self.bandwidth_manager = BandwidthManager()
+        self.compression = compression
 
     def start(self, peer_handler):
         # Start network node
-        self.peer_server.start(peer_handler)
+        self.timer_wheel.start()
+        self.network_manager.start(peer_handler)
+
+    def stop(self):
+        self.network_manager.stop()
+        self.timer_wheel.stop()
 
     @property
     def address(self):
@@ -65,8 +99,15 @@ class ClientSqueakNode(object):
             self.add_squeak(squeak)
             return squeak
 
-    def add_squeak(self, squeak):
-        self.squeaks_access.add_squeak(squeak)
+    def add_squeak(self, squeak, source_peer=None):
+        """Save the squeak, and announce it to the other peers if it is new.
+
+        Returns True if the squeak is new.
+        """
+        if not self.squeaks_access.add_squeak(squeak):
+            return False
+        self.inventory_relay.relay_squeak(squeak.GetHash(), source_peer)
+        return True
 
     def listen_squeaks_changed(self, callback):
         self.squeaks_access.listen_squeaks_changed(callback)
@@ -93,6 +134,18 @@ class ClientSqueakNode(object):
         # TODO
         pass
 
+    def get_dial_stats(self):
+        return self.peer_server.get_dial_stats()
+
+    def get_message_stats(self):
+        return self.message_stats.get_stats()
+
+    def get_download_stats(self):
+        return self.download_scheduler.get_stats()
+
+    def get_traffic_stats(self):
+        return self.bandwidth_manager.traffic.get_stats()
+
     def get_wallet_balance(self):
         return self.lightning_client.get_wallet_balance()
 
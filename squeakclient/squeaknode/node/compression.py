@@ -0,0 +1,110 @@
+import hashlib
+import struct
+import zlib
+
+import squeak.params
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+ZBATCH_COMMAND = b'zbatch'
+MAX_ZBATCH_DATA_LEN = 524288
+MIN_COMPRESS_LEN = 1024
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Service bits advertised in the version message by nodes that accept
+# `zbatch` messages. Every such node accepts zlib, and also zstd if it
+# sets the second bit.
+NODE_ZBATCH = 1 << 10
+NODE_ZBATCH_ZSTD = 1 << 11
+
+CODEC_ZLIB = 0
+CODEC_ZSTD = 1
+
+
+class CompressionError(Exception):
+    pass
+
+
+def local_services():
+    """Get the compression service bits of this node."""
+    services = NODE_ZBATCH
+    if zstandard is not None:
+        services |= NODE_ZBATCH_ZSTD
+    return services
+
+
+def negotiate_codec(local_services, remote_services):
+    """Get the codec to use with a peer, or None if one side does not
+    accept compressed batches.
+    """
+    if not (local_services & remote_services & NODE_ZBATCH):
+        return None
+    if local_services & remote_services & NODE_ZBATCH_ZSTD:
+        return CODEC_ZSTD
+    return CODEC_ZLIB
+
+
+def compress_batch(msgs_data, codec):
+    """Pack serialized messages into a single serialized `zbatch` message.
+
+    The payload is the codec id followed by the compressed concatenation
+    of the messages, headers included.
+    """
+    data = b''.join(msgs_data)
+    if codec == CODEC_ZSTD:
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    else:
+        compressed = zlib.compress(data, ZLIB_LEVEL)
+    payload = bytes([codec]) + compressed
+    checksum = hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4]
+    return b''.join([
+        squeak.params.params.MESSAGE_START,
+        ZBATCH_COMMAND.ljust(12, b'\x00'),
+        struct.pack(b'<I', len(payload)),
+        checksum,
+        payload,
+    ])
+
+
+def decompress_batch(payload):
+    """Get the serialized messages packed in a `zbatch` payload.
+
+    Raises `CompressionError` if the payload does not decompress to at
+    most `MAX_ZBATCH_DATA_LEN` bytes.
+    """
+    if not payload:
+        raise CompressionError('Empty zbatch payload')
+    codec = payload[0]
+    if codec == CODEC_ZLIB:
+        data = _decompress_zlib(payload[1:])
+    elif codec == CODEC_ZSTD and zstandard is not None:
+        data = _decompress_zstd(payload[1:])
+    else:
+        raise CompressionError('Unsupported zbatch codec {}'.format(codec))
+    if len(data) > MAX_ZBATCH_DATA_LEN:
+        raise CompressionError('Decompressed zbatch payload too large')
+    return data
+
+
+def _decompress_zlib(compressed):
+    decompressor = zlib.decompressobj()
+    try:
+        data = decompressor.decompress(compressed, MAX_ZBATCH_DATA_LEN + 1)
+    except zlib.error as e:
+        raise CompressionError('Invalid zbatch payload: {}'.format(e))
+    if not decompressor.eof and len(data) <= MAX_ZBATCH_DATA_LEN:
+        raise CompressionError('Truncated zbatch payload')
+    return data
+
+
+def _decompress_zstd(compressed):
+    try:
+        with zstandard.ZstdDecompressor().stream_reader(compressed) as reader:
+            return reader.read(MAX_ZBATCH_DATA_LEN + 1)
+    except zstandard.ZstdError as e:
+        raise CompressionError('Invalid zbatch payload: {}'.format(e))
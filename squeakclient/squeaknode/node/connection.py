@@ -1,5 +1,8 @@
 import logging
+import time
 
+from squeakclient.squeaknode.node.compression import local_services
+from squeakclient.squeaknode.node.compression import negotiate_codec
 from squeakclient.squeaknode.util import generate_nonce
 
 from squeak.messages import msg_version
@@ -15,40 +18,97 @@ HANDSHAKE_VERSION = 70002
 
 class Connection():
     """Commands for interacting with remote peer.
+
+    The handshake is driven by the messages received from the peer, so the
+    same connection can be used by a thread that blocks on the peer socket
+    or by an event loop that is handed each message as it is decoded. The
+    peer is stopped if the handshake is not complete within
+    `HANDSHAKE_TIMEOUT` seconds.
     """
 
     def __init__(self, peer, node):
         super().__init__()
         self.peer = peer
         self.node = node
+        self._expected_handshake_command = None
+        self._handshake_start_time = None
+        self._handshake_timer = None
+        self._local_nonce = None
 
     def handshake(self):
+        """Complete the handshake with the peer.
+
+        This method blocks until the handshake is complete.
+        """
+        self.start_handshake()
+        while not self.peer.is_handshake_complete:
+            frame = self.peer.recv_msg()
+            if frame is None:
+                raise Exception('Peer disconnected during handshake.')
+            self.handle_handshake_msg(frame)
+
+    def start_handshake(self):
+        """Send the local version if the connection is outgoing."""
+        self._handshake_start_time = time.monotonic()
+        self._handshake_timer = self.node.timer_wheel.schedule(HANDSHAKE_TIMEOUT, self._handshake_timeout)
+        if self.peer.outgoing:
+            self._send_version()
+            self._expected_handshake_command = msg_verack.command
+        else:
+            self._expected_handshake_command = msg_version.command
+
+    def handle_handshake_msg(self, frame):
+        """Handle a message frame received before the handshake is complete."""
+        if frame.command != self._expected_handshake_command:
+            raise Exception('Wrong message type for handshake: {}'.format(frame.command))
+        msg = frame.deserialize()
+
+        if isinstance(msg, msg_verack):
+            if self.peer.outgoing:
+                self._expected_handshake_command = msg_version.command
+            else:
+                self._complete_handshake()
+
+        if isinstance(msg, msg_version):
+            if self.node.connection_manager.is_local_nonce(msg.nNonce):
+                raise Exception('Remote nonce is duplicate of local nonce.')
+            self.peer.remote_version = msg
+            verack = msg_verack()
+            self.peer.send_msg(verack)
+            if self.peer.outgoing:
+                self._complete_handshake()
+            else:
+                self._send_version()
+                self._expected_handshake_command = msg_verack.command
+
+    def _send_version(self):
+        local_version = self.version_pkt()
+        self._local_nonce = local_version.nNonce
+        self.node.connection_manager.add_local_nonce(self._local_nonce)
+        self.peer.local_version = local_version
+        self.peer.send_msg(local_version)
+
+    def _handshake_timeout(self):
+        if self.peer.is_handshake_complete:
+            return
+        logger.info('Closing peer because of handshake timeout {}'.format(self.peer))
+        self.peer.stop()
+
+    def _complete_handshake(self):
+        self._expected_handshake_command = None
+        self._handshake_timer.cancel()
+        self.peer.set_handshake_time(time.monotonic() - self._handshake_start_time)
+        self.peer.compression_codec = negotiate_codec(
+            self.peer.local_version.nServices,
+            self.peer.remote_version.nServices,
+        )
+        self.node.connection_manager.add_peer(self.peer)
+        self.peer.handshake_complete.set()
         if self.peer.outgoing:
-            local_version = self.version_pkt()
-            self.peer.local_version = local_version
-            self.peer.send_msg(local_version)
-            verack = self.peer.recv_msg()
-            if not isinstance(verack, msg_verack):
-                raise Exception('Wrong message type for verack response.')
-
-        remote_version = self.peer.recv_msg()
-        if not isinstance(remote_version, msg_version):
-            raise Exception('Wrong message type for version message.')
-        if self._is_duplicate_nonce(remote_version.nNonce):
-            raise Exception('Remote nonce is duplicate of local nonce.')
-        self.peer.remote_version = remote_version
-        verack = msg_verack()
-        self.peer.send_msg(verack)
-
-        if not self.peer.outgoing:
-            local_version = self.version_pkt()
-            self.peer.local_version = local_version
-            self.peer.send_msg(local_version)
-            verack = self.peer.recv_msg()
-            if not isinstance(verack, msg_verack):
-                raise Exception('Wrong message type for verack response.')
-
-        return
+            self.node.address_manager.mark_good(self.peer.address)
+        self.node.keepalive.add_peer(self.peer)
+        self.node.inventory_relay.add_peer(self.peer)
+        logger.debug('Handshake complete with peer {}'.format(self.peer))
 
     def version_pkt(self):
         """Get the version message for this peer."""
@@ -61,25 +121,39 @@ class Connection():
         msg.addrFrom.ip = local_ip
         msg.addrFrom.port = local_port
         msg.nNonce = generate_nonce()
+        if self.node.compression:
+            msg.nServices |= local_services()
         return msg
 
-    def __enter__(self):
-        logger.debug('Starting handshake connection with peer ... {}'.format(self.peer))
-        self.node.connection_manager.add_peer(self.peer)
-        self.handshake()
+    def open(self):
+        """Add the peer to the connection manager as a pending peer."""
+        self.node.connection_manager.add_pending_peer(self.peer)
         logger.debug('Peer connection added... {}'.format(self.peer))
-        return self
 
-    def __exit__(self, *exc):
+    def close(self):
+        """Remove the peer from the connection manager."""
+        if self._handshake_timer:
+            self._handshake_timer.cancel()
+        if self._local_nonce is not None:
+            self.node.connection_manager.remove_local_nonce(self._local_nonce)
         self.node.connection_manager.remove_peer(self.peer)
+        self.node.keepalive.remove_peer(self.peer)
+        self.node.inventory_relay.remove_peer(self.peer)
+        self.node.download_scheduler.remove_peer(self.peer)
         logger.debug('Peer connection removed... {}'.format(self.peer))
 
-    def _is_duplicate_nonce(self, nonce):
-        for peer in self.node.connection_manager.peers:
-            if peer.local_version:
-                if nonce == peer.local_version.nNonce:
-                    return True
-        return False
+    def __enter__(self):
+        logger.debug('Starting handshake connection with peer ... {}'.format(self.peer))
+        self.open()
+        try:
+            self.handshake()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 
 # class PeerListener:
@@ -12,10 +12,16 @@ logger = logging.getLogger(__name__)
 
 class ConnectionManager(object):
     """Maintains connections to other peers in the network.
+
+    A peer is only added to the connected peers once its handshake is
+    complete. Until then it is a pending peer, which keeps its address
+    from being connected twice, but does not count as a connection.
     """
 
     def __init__(self):
         self._peers = {}
+        self._pending_peers = {}
+        self._local_nonces = set()
         self.peers_lock = threading.Lock()
         self.peers_changed_callback = None
 
@@ -23,9 +29,15 @@ class ConnectionManager(object):
     def peers(self):
         return list(self._peers.values())
 
+    @property
+    def pending_peers(self):
+        return list(self._pending_peers.values())
+
     def has_connection(self, address):
-        """Return True if the address is already connected."""
-        return address in self._peers
+        """Return True if the address is already connected, or is doing
+        the handshake.
+        """
+        return address in self._peers or address in self._pending_peers
 
     def on_peers_changed(self):
         logger.info('Current number of peers {}'.format(len(self.peers)))
@@ -36,28 +48,58 @@ class ConnectionManager(object):
     def listen_peers_changed(self, callback):
         self.peers_changed_callback = callback
 
-    def add_peer(self, peer):
-        """Add a peer.
+    def add_pending_peer(self, peer):
+        """Add a peer that has not completed the handshake.
         """
         with self.peers_lock:
             if self.has_connection(peer.address):
+                logger.debug('Failed to add pending peer {}'.format(peer))
+                raise DuplicatePeerError()
+            self._pending_peers[peer.address] = peer
+            logger.debug('Added pending peer {}'.format(peer))
+
+    def add_peer(self, peer):
+        """Add a peer that has completed the handshake.
+        """
+        with self.peers_lock:
+            pending_peer = self._pending_peers.get(peer.address)
+            if peer.address in self._peers or pending_peer not in (None, peer):
                 logger.debug('Failed to add peer {}'.format(peer))
                 raise DuplicatePeerError()
+            self._pending_peers.pop(peer.address, None)
             self._peers[peer.address] = peer
             logger.debug('Added peer {}'.format(peer))
             self.on_peers_changed()
 
     def remove_peer(self, peer):
-        """Add a peer.
+        """Remove a connected or pending peer.
         """
         with self.peers_lock:
-            if not self.has_connection(peer.address):
-                logger.debug('Failed to remove peer {}'.format(peer))
-                raise MissingPeerError()
-            else:
+            if self._peers.get(peer.address) is peer:
                 del self._peers[peer.address]
                 logger.debug('Removed peer {}'.format(peer))
                 self.on_peers_changed()
+            elif self._pending_peers.get(peer.address) is peer:
+                del self._pending_peers[peer.address]
+                logger.debug('Removed pending peer {}'.format(peer))
+            else:
+                logger.debug('Failed to remove peer {}'.format(peer))
+                raise MissingPeerError()
+
+    def add_local_nonce(self, nonce):
+        """Record the nonce of a version message sent to a peer."""
+        with self.peers_lock:
+            self._local_nonces.add(nonce)
+
+    def remove_local_nonce(self, nonce):
+        with self.peers_lock:
+            self._local_nonces.discard(nonce)
+
+    def is_local_nonce(self, nonce):
+        """Return True if the nonce was sent in one of our own version
+        messages, which means that the connection is to ourselves.
+        """
+        return nonce in self._local_nonces
 
     def get_peer(self, address):
         """Get a peer info by address.
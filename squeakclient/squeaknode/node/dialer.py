@@ -0,0 +1,174 @@
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+MAX_CONCURRENT_DIALS = 8
+CONNECT_TIMEOUT = 10
+MIN_RETRY_DELAY = 30
+MAX_RETRY_DELAY = 3600
+
+
+logger = logging.getLogger(__name__)
+
+
+class DialStats(object):
+    """Counts of outbound connection attempts and their latency, and of
+    the addresses being dialed or backed off from.
+    """
+
+    def __init__(
+            self,
+            attempts=0,
+            successes=0,
+            failures=0,
+            total_latency=0.0,
+            in_flight=0,
+            backing_off=0,
+    ):
+        self.attempts = attempts
+        self.successes = successes
+        self.failures = failures
+        self.total_latency = total_latency
+        self.in_flight = in_flight
+        self.backing_off = backing_off
+
+    @property
+    def average_latency(self):
+        """Average time in seconds to establish a successful connection."""
+        if not self.successes:
+            return 0.0
+        return self.total_latency / self.successes
+
+
+class DialTracker(object):
+    """Keeps track of the outbound connection attempts to each address.
+
+    An address is not dialed again while a dial to it is in flight, or
+    before its backoff delay has passed after a failed dial. The delay
+    doubles with every consecutive failure.
+    """
+
+    def __init__(self):
+        self._in_flight = set()
+        self._failures = {}
+        self._next_attempt_time = {}
+        self._stats = DialStats()
+        self._lock = threading.Lock()
+
+    def start_dial(self, address):
+        """Return True if the address should be dialed now, and mark the
+        dial as in flight.
+        """
+        with self._lock:
+            if address in self._in_flight:
+                logger.debug('Already dialing address {}'.format(address))
+                return False
+            next_attempt_time = self._next_attempt_time.get(address, 0)
+            if time.time() < next_attempt_time:
+                logger.debug('Backing off from address {}'.format(address))
+                return False
+            self._in_flight.add(address)
+            self._stats.attempts += 1
+            return True
+
+    def finish_dial(self, address, success, latency):
+        """Record the result of a dial that was started with `start_dial`."""
+        with self._lock:
+            self._in_flight.discard(address)
+            if success:
+                self._stats.successes += 1
+                self._stats.total_latency += latency
+                self._failures.pop(address, None)
+                self._next_attempt_time.pop(address, None)
+            else:
+                self._stats.failures += 1
+                failures = self._failures.get(address, 0) + 1
+                self._failures[address] = failures
+                self._next_attempt_time[address] = time.time() + retry_delay(failures)
+        logger.info('Dial to {} {} after {:.3f}s'.format(
+            address,
+            'succeeded' if success else 'failed',
+            latency,
+        ))
+
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            return DialStats(
+                self._stats.attempts,
+                self._stats.successes,
+                self._stats.failures,
+                self._stats.total_latency,
+                len(self._in_flight),
+                sum(1 for next_attempt_time in self._next_attempt_time.values()
+                    if next_attempt_time > now),
+            )
+
+
+class Dialer(object):
+    """Makes outbound connections from a bounded pool of threads.
+
+    Dials are skipped while every thread of the pool is busy, instead of
+    being queued behind the running ones.
+    """
+
+    def __init__(self, max_dials=MAX_CONCURRENT_DIALS, timeout=CONNECT_TIMEOUT):
+        self.max_dials = max_dials
+        self.timeout = timeout
+        self.tracker = DialTracker()
+        self.executor = ThreadPoolExecutor(max_workers=max_dials)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def dial(self, address, on_connected):
+        """Connect to the address in the pool, and call `on_connected` with
+        the socket and the address if the connection succeeds.
+
+        Returns False if the dial was skipped.
+        """
+        with self._lock:
+            if self._pending >= self.max_dials:
+                logger.debug('Too many dials pending, skipping address {}'.format(address))
+                return False
+            if not self.tracker.start_dial(address):
+                return False
+            self._pending += 1
+        self.executor.submit(self._dial, address, on_connected)
+        return True
+
+    def _dial(self, address, on_connected):
+        try:
+            self._connect(address, on_connected)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _connect(self, address, on_connected):
+        logger.debug('Making connection to {}'.format(address))
+        start_time = time.perf_counter()
+        try:
+            peer_socket = socket.create_connection(address, timeout=self.timeout)
+            peer_socket.settimeout(None)
+        except Exception:
+            self.tracker.finish_dial(address, False, time.perf_counter() - start_time)
+            return
+        self.tracker.finish_dial(address, True, time.perf_counter() - start_time)
+        on_connected(peer_socket, address)
+
+    def get_stats(self):
+        return self.tracker.get_stats()
+
+    def stop(self):
+        self.executor.shutdown(wait=False)
+
+
+def retry_delay(failures):
+    """Get the delay in seconds before dialing an address again after the
+    given number of consecutive failures.
+    """
+    delay = min(MIN_RETRY_DELAY * 2 ** min(failures - 1, 16), MAX_RETRY_DELAY)
+    return delay * random.uniform(0.5, 1.0)
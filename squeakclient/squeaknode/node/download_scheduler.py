@@ -0,0 +1,214 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from squeak.messages import msg_getdata
+from squeak.net import CInv
+
+
+MAX_PEER_IN_FLIGHT = 100
+MIN_PEER_IN_FLIGHT = MAX_PEER_IN_FLIGHT // 2
+GETDATA_TIMEOUT = 30
+MSG_SQUEAK = 1
+
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadStats(object):
+    """Counts of the squeaks requested from peers and the bytes received."""
+
+    def __init__(
+            self,
+            requested=0,
+            received=0,
+            duplicates=0,
+            timeouts=0,
+            bytes_downloaded=0,
+            bytes_useful=0,
+    ):
+        self.requested = requested
+        self.received = received
+        self.duplicates = duplicates
+        self.timeouts = timeouts
+        self.bytes_downloaded = bytes_downloaded
+        self.bytes_useful = bytes_useful
+
+    def copy(self):
+        return DownloadStats(
+            self.requested,
+            self.received,
+            self.duplicates,
+            self.timeouts,
+            self.bytes_downloaded,
+            self.bytes_useful,
+        )
+
+
+class DownloadScheduler(object):
+    """Decides which peer to download each missing squeak from.
+
+    Every announced squeak that is missing is requested from only one of
+    the peers that announced it, and each peer has at most
+    `MAX_PEER_IN_FLIGHT` requests outstanding. A peer is only sent more
+    requests once it has `MIN_PEER_IN_FLIGHT` or fewer outstanding, so
+    requests go out in batches instead of one getdata per received
+    squeak. If the peer answers with
+    `notfound`, does not answer within `GETDATA_TIMEOUT`, or disconnects,
+    the squeak is requested from the next peer that announced it.
+
+    Each peer has a queue of the waiting squeaks that it announced, and
+    only the queues of peers with free request slots are read, so an
+    event costs time in the number of peers and requests sent, not in
+    the number of waiting squeaks. Queue entries of squeaks that are no
+    longer waiting are dropped when they are reached. The squeaks
+    announced by each peer are also kept, so removing a peer only visits
+    its own announcements.
+    """
+
+    def __init__(self, timer_wheel):
+        self.timer_wheel = timer_wheel
+        self._announcers = {}
+        self._peer_announced = {}
+        self._waiting = set()
+        self._peer_queues = {}
+        self._in_flight = {}
+        self._peer_in_flight = {}
+        self._stats = DownloadStats()
+        self._lock = threading.Lock()
+
+    def add_announcements(self, peer, squeak_hashes):
+        """Record that the peer has the given missing squeaks, and request
+        the ones that are not requested yet.
+        """
+        with self._lock:
+            for squeak_hash in squeak_hashes:
+                announcers = self._announcers.get(squeak_hash)
+                if announcers is None:
+                    announcers = self._announcers[squeak_hash] = []
+                    self._waiting.add(squeak_hash)
+                if peer not in announcers:
+                    announcers.append(peer)
+                    self._peer_announced.setdefault(peer, set()).add(squeak_hash)
+                    if squeak_hash in self._waiting:
+                        self._enqueue(peer, squeak_hash)
+            requests = self._assign_requests()
+        self._send_requests(requests)
+
+    def squeak_received(self, peer, squeak_hash, size, is_new):
+        """Record a received squeak of `size` bytes, and request more
+        squeaks from the peer.
+        """
+        with self._lock:
+            self._stats.received += 1
+            self._stats.bytes_downloaded += size
+            if is_new:
+                self._stats.bytes_useful += size
+            else:
+                self._stats.duplicates += 1
+            if squeak_hash in self._in_flight:
+                self._finish_request(squeak_hash)
+            for announcer in self._announcers.pop(squeak_hash, ()):
+                self._peer_announced[announcer].discard(squeak_hash)
+            self._waiting.discard(squeak_hash)
+            requests = self._assign_requests()
+        self._send_requests(requests)
+
+    def not_found(self, peer, squeak_hashes):
+        """Request the squeaks that the peer did not have from other peers."""
+        with self._lock:
+            for squeak_hash in squeak_hashes:
+                self._forget_announcer(peer, squeak_hash)
+            requests = self._assign_requests()
+        self._send_requests(requests)
+
+    def remove_peer(self, peer):
+        """Request the squeaks in flight from a disconnected peer from
+        other peers.
+        """
+        with self._lock:
+            self._peer_in_flight.pop(peer, None)
+            self._peer_queues.pop(peer, None)
+            for squeak_hash in list(self._peer_announced.get(peer, ())):
+                self._forget_announcer(peer, squeak_hash)
+            self._peer_announced.pop(peer, None)
+            requests = self._assign_requests()
+        self._send_requests(requests)
+
+    def get_stats(self):
+        with self._lock:
+            return self._stats.copy()
+
+    def _request_timeout(self, peer, squeak_hash):
+        with self._lock:
+            in_flight = self._in_flight.get(squeak_hash)
+            if not in_flight or in_flight[0] is not peer:
+                return
+            logger.debug('Request for squeak timed out from peer {}'.format(peer))
+            self._stats.timeouts += 1
+            self._forget_announcer(peer, squeak_hash)
+            requests = self._assign_requests()
+        self._send_requests(requests)
+
+    def _forget_announcer(self, peer, squeak_hash):
+        in_flight = self._in_flight.get(squeak_hash)
+        was_requested = in_flight and in_flight[0] is peer
+        if was_requested:
+            self._finish_request(squeak_hash)
+        announcers = self._announcers.get(squeak_hash)
+        if announcers and peer in announcers:
+            announcers.remove(peer)
+            self._peer_announced[peer].discard(squeak_hash)
+            if not announcers:
+                del self._announcers[squeak_hash]
+                self._waiting.discard(squeak_hash)
+                return
+        if was_requested and announcers:
+            self._waiting.add(squeak_hash)
+            for announcer in announcers:
+                self._enqueue(announcer, squeak_hash)
+
+    def _enqueue(self, peer, squeak_hash):
+        queue = self._peer_queues.get(peer)
+        if queue is None:
+            queue = self._peer_queues[peer] = OrderedDict()
+        queue[squeak_hash] = None
+
+    def _finish_request(self, squeak_hash):
+        peer, timer = self._in_flight.pop(squeak_hash)
+        timer.cancel()
+        peer_in_flight = self._peer_in_flight.get(peer)
+        if peer_in_flight is not None:
+            peer_in_flight.discard(squeak_hash)
+
+    def _assign_requests(self):
+        """Assign the waiting squeaks to peers with free request slots.
+
+        Returns a dict of the squeak hashes to request from each peer.
+        """
+        requests = {}
+        for peer, queue in list(self._peer_queues.items()):
+            if peer.stopped.is_set():
+                continue
+            peer_in_flight = self._peer_in_flight.setdefault(peer, set())
+            if len(peer_in_flight) > MIN_PEER_IN_FLIGHT:
+                continue
+            while queue and len(peer_in_flight) < MAX_PEER_IN_FLIGHT:
+                squeak_hash, _ = queue.popitem(last=False)
+                if squeak_hash not in self._waiting or peer not in self._announcers[squeak_hash]:
+                    continue
+                peer_in_flight.add(squeak_hash)
+                timer = self.timer_wheel.schedule(GETDATA_TIMEOUT, self._request_timeout, peer, squeak_hash)
+                self._in_flight[squeak_hash] = (peer, timer)
+                self._waiting.discard(squeak_hash)
+                requests.setdefault(peer, []).append(squeak_hash)
+                self._stats.requested += 1
+            if not queue:
+                del self._peer_queues[peer]
+        return requests
+
+    def _send_requests(self, requests):
+        for peer, squeak_hashes in requests.items():
+            invs = [CInv(type=MSG_SQUEAK, hash=squeak_hash)
+                    for squeak_hash in squeak_hashes]
+            peer.send_msg(msg_getdata(inv=invs))
@@ -0,0 +1,79 @@
+import logging
+import random
+import threading
+
+from squeak.messages import msg_inv
+from squeak.net import CInv
+
+
+INV_TRICKLE_INTERVAL = 2
+MAX_INV_ENTRIES = 1000
+MSG_SQUEAK = 1
+
+
+logger = logging.getLogger(__name__)
+
+
+class InventoryRelay(object):
+    """Announces new squeaks to the connected peers.
+
+    The hashes of new squeaks are queued for every peer, and each peer is
+    sent the queued hashes in `inv` messages of at most `MAX_INV_ENTRIES`
+    entries when its trickle timer fires. The timer delay is random with
+    an average of `INV_TRICKLE_INTERVAL` seconds, so a batch of new
+    squeaks goes out in a few messages, and the order in which peers learn
+    about a squeak does not reveal where it came from.
+    """
+
+    def __init__(self, timer_wheel):
+        self.timer_wheel = timer_wheel
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def add_peer(self, peer):
+        with self._lock:
+            self._pending[peer] = {}
+        self._schedule(peer)
+
+    def remove_peer(self, peer):
+        with self._lock:
+            self._pending.pop(peer, None)
+            timer = self._timers.pop(peer, None)
+        if timer:
+            timer.cancel()
+
+    def relay_squeak(self, squeak_hash, source_peer=None):
+        """Queue the hash of a new squeak to be announced to every peer
+        except the one that sent it.
+        """
+        with self._lock:
+            for peer, pending in self._pending.items():
+                if peer is not source_peer:
+                    pending[squeak_hash] = None
+
+    def _schedule(self, peer):
+        delay = random.expovariate(1 / INV_TRICKLE_INTERVAL)
+        timer = self.timer_wheel.schedule(delay, self.trickle, peer)
+        with self._lock:
+            if peer in self._pending:
+                self._timers[peer] = timer
+            else:
+                timer.cancel()
+
+    def trickle(self, peer):
+        """Send the queued hashes to the peer, and schedule the next trickle."""
+        with self._lock:
+            pending = self._pending.get(peer)
+            if pending is None:
+                return
+            hashes = peer.known_inventory.filter_new(pending)
+            pending.clear()
+        for i in range(0, len(hashes), MAX_INV_ENTRIES):
+            invs = [CInv(type=MSG_SQUEAK, hash=squeak_hash)
+                    for squeak_hash in hashes[i:i + MAX_INV_ENTRIES]]
+            peer.send_msg(msg_inv(inv=invs))
+        if hashes:
+            logger.debug('Relayed {} squeak hashes to {}'.format(len(hashes), peer))
+        if not peer.stopped.is_set():
+            self._schedule(peer)
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+from squeak.messages import msg_ping
+
+from squeakclient.squeaknode.node.peer import LAST_MESSAGE_TIMEOUT
+from squeakclient.squeaknode.node.peer import PING_INTERVAL
+from squeakclient.squeaknode.node.peer import PING_TIMEOUT
+from squeakclient.squeaknode.util import generate_nonce
+
+
+logger = logging.getLogger(__name__)
+
+
+class Keepalive(object):
+    """Pings the connected peers and evicts the ones that stopped
+    responding.
+
+    Every peer has a single timer on the node-wide timer wheel. When it
+    fires, the peer is evicted if a ping has been waiting longer than
+    `PING_TIMEOUT` for its pong, or if nothing has been received from the
+    peer in `LAST_MESSAGE_TIMEOUT`. Otherwise a ping is sent every
+    `PING_INTERVAL`.
+
+    Peers are added and removed by the connection threads while the
+    timers fire on the timer wheel thread, so the timers are guarded by
+    a lock, and a removed peer is never scheduled again.
+    """
+
+    def __init__(self, timer_wheel):
+        self.timer_wheel = timer_wheel
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def add_peer(self, peer):
+        with self._lock:
+            self._timers[peer] = self.timer_wheel.schedule(PING_INTERVAL, self.check_peer, peer)
+
+    def remove_peer(self, peer):
+        with self._lock:
+            timer = self._timers.pop(peer, None)
+        if timer:
+            timer.cancel()
+
+    def _schedule(self, peer, delay):
+        with self._lock:
+            if peer in self._timers:
+                self._timers[peer] = self.timer_wheel.schedule(delay, self.check_peer, peer)
+
+    def check_peer(self, peer):
+        if peer.stopped.is_set():
+            self.remove_peer(peer)
+            return
+        now = time.time()
+        if peer.ping_pending:
+            if now - peer.last_sent_ping_time >= PING_TIMEOUT:
+                logger.info('Ping timeout, disconnecting peer {}'.format(peer))
+                self._evict(peer)
+                return
+            self._schedule(peer, peer.last_sent_ping_time + PING_TIMEOUT - now)
+            return
+        last_msg_time = peer.last_msg_revc_time or peer.connect_time
+        if now - last_msg_time >= LAST_MESSAGE_TIMEOUT:
+            logger.info('No messages received, disconnecting peer {}'.format(peer))
+            self._evict(peer)
+            return
+        last_ping_time = peer.last_sent_ping_time or 0
+        if now - last_ping_time >= PING_INTERVAL:
+            self.send_ping(peer)
+            self._schedule(peer, PING_TIMEOUT)
+        else:
+            self._schedule(peer, last_ping_time + PING_INTERVAL - now)
+
+    def send_ping(self, peer):
+        nonce = generate_nonce()
+        ping = msg_ping()
+        ping.nonce = nonce
+        peer.set_last_sent_ping(nonce)
+        peer.send_msg(ping)
+
+    def _evict(self, peer):
+        self.remove_peer(peer)
+        peer.stop()
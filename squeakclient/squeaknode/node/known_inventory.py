@@ -0,0 +1,59 @@
+import threading
+from collections import OrderedDict
+
+
+MAX_KNOWN_INVENTORY = 10000
+
+
+class KnownInventory(object):
+    """The squeak hashes that a peer is known to have, or to have
+    announced to us.
+
+    Only the `max_size` most recently seen hashes are kept, so a hash
+    that was forgotten may be announced or requested again, but never
+    more than once per `max_size` new hashes.
+    """
+
+    def __init__(self, max_size=MAX_KNOWN_INVENTORY):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates_saved = 0
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def __contains__(self, squeak_hash):
+        with self._lock:
+            return squeak_hash in self._hashes
+
+    def add(self, squeak_hash):
+        self.add_all([squeak_hash])
+
+    def add_all(self, squeak_hashes):
+        with self._lock:
+            for squeak_hash in squeak_hashes:
+                self._add(squeak_hash)
+
+    def filter_new(self, squeak_hashes):
+        """Get the hashes that are not known yet, and add them.
+
+        The hashes that are already known are counted in
+        `duplicates_saved`.
+        """
+        new_hashes = []
+        with self._lock:
+            for squeak_hash in squeak_hashes:
+                if squeak_hash in self._hashes:
+                    self._hashes.move_to_end(squeak_hash)
+                    self.duplicates_saved += 1
+                else:
+                    self._add(squeak_hash)
+                    new_hashes.append(squeak_hash)
+        return new_hashes
+
+    def _add(self, squeak_hash):
+        self._hashes[squeak_hash] = None
+        self._hashes.move_to_end(squeak_hash)
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
@@ -0,0 +1,44 @@
+import threading
+from typing import Dict
+
+
+class CommandStats(object):
+    """The number of messages handled for a command, and the total time
+    spent handling them.
+    """
+
+    def __init__(self, count: int = 0, total_time: float = 0.0) -> None:
+        self.count = count
+        self.total_time = total_time
+
+    @property
+    def average_time(self) -> float:
+        if not self.count:
+            return 0.0
+        return self.total_time / self.count
+
+
+class MessageStats(object):
+    """Keeps track of the messages handled by the node for each command.
+    """
+
+    def __init__(self) -> None:
+        self._stats: Dict[bytes, CommandStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def record(self, command: bytes, elapsed: float) -> None:
+        """Record one handled message and the seconds spent handling it."""
+        with self._stats_lock:
+            stats = self._stats.get(command)
+            if stats is None:
+                stats = self._stats[command] = CommandStats()
+            stats.count += 1
+            stats.total_time += elapsed
+
+    def get_stats(self) -> Dict[bytes, CommandStats]:
+        """Get a snapshot of the stats for every command."""
+        with self._stats_lock:
+            return {
+                command: CommandStats(stats.count, stats.total_time)
+                for command, stats in self._stats.items()
+            }
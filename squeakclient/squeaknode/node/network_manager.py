@@ -1,8 +1,14 @@
 import socket
 import logging
+import threading
 
 import squeak.params
 
+from squeakclient.squeaknode.node.connection_manager import MAX_PEERS
+from squeakclient.squeaknode.node.connection_manager import MIN_PEERS
+from squeakclient.squeaknode.node.connection_manager import UPDATE_THREAD_SLEEP_TIME
+from squeakclient.squeaknode.node.seed_resolver import SeedResolver
+
 
 logger = logging.getLogger(__name__)
 
@@ -11,10 +17,13 @@ class NetworkManager(object):
     """Used to manage the peer networking.
     """
 
-    def __init__(self, connection_manager, peer_server):
+    def __init__(self, connection_manager, peer_server, address_manager, seed_resolver=None):
         self.connection_manager = connection_manager
         self.peer_server = peer_server
+        self.address_manager = address_manager
+        self.seed_resolver = seed_resolver or SeedResolver()
         self.peer_blacklist = set()
+        self.stopped = threading.Event()
 
     def get_peers(self):
         """Get all currently connected peers."""
@@ -43,18 +52,52 @@ class NetworkManager(object):
     def connect_seed_peers(self):
         """Find more peers.
         """
-        for address in get_seed_peer_addresses():
+        for address in get_seed_peer_addresses(self.seed_resolver):
+            self.address_manager.add_addresses([address], source=address[0])
             self.connect_peer(address)
 
-    def __enter__(self):
+    def start(self, peer_handler):
         logger.debug('Starting network manager')
-        self.peer_server.start()
-        return self
+        self.address_manager.load()
+        self.peer_server.start(peer_handler)
+        threading.Thread(target=self.maintain_connections).start()
 
-    def __exit__(self, *exc):
+    def stop(self):
+        self.stopped.set()
         self.peer_server.stop()
+        self.address_manager.save()
         logger.debug('Stopped network manager.')
 
+    def maintain_connections(self):
+        """Keep the number of outbound connections between `MIN_PEERS` and
+        `MAX_PEERS`, and save the address table.
+        """
+        while not self.stopped.wait(UPDATE_THREAD_SLEEP_TIME):
+            try:
+                self.update_connections()
+                self.address_manager.save()
+            except Exception:
+                logger.exception('Error in maintain_connections')
+
+    def update_connections(self):
+        peers = self.get_peers()
+        outgoing_peers = [peer for peer in peers if peer.outgoing]
+        if len(outgoing_peers) < MIN_PEERS:
+            connected = [peer.address for peer in peers]
+            addresses = self.address_manager.select(
+                MIN_PEERS - len(outgoing_peers),
+                exclude=connected,
+            )
+            if not addresses and not outgoing_peers:
+                self.connect_seed_peers()
+            for address in addresses:
+                self.address_manager.mark_attempt(address)
+                self.connect_peer(address)
+        elif len(outgoing_peers) > MAX_PEERS:
+            outgoing_peers.sort(key=lambda peer: peer.connect_time)
+            for peer in outgoing_peers[MAX_PEERS:]:
+                self.disconnect_peer(peer.address)
+
 
 def resolve_hostname(hostname):
     """Get the ip address from hostname."""
@@ -66,9 +109,8 @@ def resolve_hostname(hostname):
     return (ip, port)
 
 
-def get_seed_peer_addresses():
+def get_seed_peer_addresses(seed_resolver):
     """Get addresses of seed peers"""
-    for _, seed_host in squeak.params.params.DNS_SEEDS:
-        address = resolve_hostname(seed_host)
-        if address:
-            yield address
+    seed_hosts = [seed_host for _, seed_host in squeak.params.params.DNS_SEEDS]
+    port = squeak.params.params.DEFAULT_PORT
+    return [(ip, port) for ip in seed_resolver.get_ips(seed_hosts)]
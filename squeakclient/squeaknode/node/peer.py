@@ -1,21 +1,47 @@
+import hashlib
 import threading
-import queue
 import logging
+from collections import deque
+import socket
+import struct
 import time
 from io import BytesIO
 
-from bitcoin.core.serialize import SerializationTruncationError
 from bitcoin.net import CAddress
-from squeak.messages import MsgSerializable
+import squeak.params
+from squeak.messages import messagemap
+
+from squeakclient.squeaknode.node.bandwidth import PeerBandwidth
+from squeakclient.squeaknode.node.compression import compress_batch
+from squeakclient.squeaknode.node.compression import decompress_batch
+from squeakclient.squeaknode.node.compression import MAX_ZBATCH_DATA_LEN
+from squeakclient.squeaknode.node.compression import MIN_COMPRESS_LEN
+from squeakclient.squeaknode.node.compression import ZBATCH_COMMAND
+from squeakclient.squeaknode.node.known_inventory import KnownInventory
 
 
 MAX_MESSAGE_LEN = 1048576
+MAX_HANDSHAKE_MESSAGE_LEN = 1024
+MSG_HEADER_LEN = 4 + 12 + 4 + 4
 SOCKET_READ_LEN = 1024
+MAX_SOCKET_READ_LEN = 262144
+MAX_IDLE_BUFFER_LEN = 65536
+MAX_SEND_QUEUE_BYTES = 4 * MAX_MESSAGE_LEN
+SEND_QUEUE_LOW_WATER = 262144
+MAX_SEND_BATCH_LEN = 64
+MAX_RECV_QUEUE_MSGS = 1000
+MAX_RECV_QUEUE_BYTES = 4 * MAX_MESSAGE_LEN
 LAST_MESSAGE_TIMEOUT = 600
 PING_TIMEOUT = 10
 PING_INTERVAL = 60
 
 
+HANDSHAKE_COMMANDS = frozenset([
+    b'version',
+    b'verack',
+])
+
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,10 +49,9 @@ class Peer(object):
     """Maintains the internal state of a peer connection.
     """
 
-    def __init__(self, peer_socket, address, outgoing=False):
+    def __init__(self, peer_socket, address, outgoing=False, msg_sender=None, bandwidth=None):
         time_now = int(time.time())
         self._peer_socket = peer_socket
-        self._peer_socket_lock = threading.Lock()
         self._address = address
         self._outgoing = outgoing
         self._connect_time = time_now
@@ -36,12 +61,18 @@ class Peer(object):
         self._last_sent_ping_nonce = None
         self._last_sent_ping_time = None
         self._last_recv_ping_time = None
-        self._recv_msg_queue = queue.Queue()
+        self._ping_time = None
+        self._handshake_time = None
+        self._recv_msg_queue = MessageQueue()
+        self.known_inventory = KnownInventory()
+        self.compression_codec = None
 
         self.handshake_complete = threading.Event()
         self.ping_started = threading.Event()
         self.ping_complete = threading.Event()
         self.stopped = threading.Event()
+        self.bandwidth = bandwidth or PeerBandwidth()
+        self._msg_sender = msg_sender or MessageSender(peer_socket, self.stopped, self.bandwidth, self.stop)
 
     @property
     def nVersion(self):
@@ -99,6 +130,10 @@ class Peer(object):
     def last_msg_revc_time(self):
         return self._last_msg_revc_time
 
+    def set_last_msg_revc_time(self, timestamp=None):
+        timestamp = timestamp or time.time()
+        self._last_msg_revc_time = timestamp
+
     @property
     def last_sent_ping_time(self):
         return self._last_sent_ping_time
@@ -106,7 +141,37 @@ class Peer(object):
     def set_last_sent_ping(self, nonce, timestamp=None):
         timestamp = timestamp or time.time()
         self._last_sent_ping_nonce = nonce
-        self._last_sent_ping_time = time.time()
+        self._last_sent_ping_time = timestamp
+
+    @property
+    def ping_pending(self):
+        """True if a ping has been sent and its pong has not been received."""
+        return self._last_sent_ping_nonce is not None
+
+    @property
+    def ping_time(self):
+        """Round-trip time in seconds of the last answered ping."""
+        return self._ping_time
+
+    def set_pong_response(self, nonce, timestamp=None):
+        """Record the pong for the last sent ping, and update the ping time.
+
+        Pongs that do not match the nonce of the last ping are ignored.
+        """
+        timestamp = timestamp or time.time()
+        if nonce != self._last_sent_ping_nonce:
+            logger.debug('Ignoring pong with unexpected nonce from {}'.format(self))
+            return
+        self._last_sent_ping_nonce = None
+        self._ping_time = timestamp - self._last_sent_ping_time
+
+    @property
+    def handshake_time(self):
+        """Seconds from the start to the completion of the handshake."""
+        return self._handshake_time
+
+    def set_handshake_time(self, handshake_time):
+        self._handshake_time = handshake_time
 
     @property
     def last_recv_ping_time(self):
@@ -116,29 +181,150 @@ class Peer(object):
         timestamp = timestamp or time.time()
         self._last_recv_ping_time = timestamp
 
+    @property
+    def bytes_sent(self):
+        return self.bandwidth.traffic.bytes_sent
+
+    @property
+    def bytes_recv(self):
+        return self.bandwidth.traffic.bytes_recv
+
+    @property
+    def send_queue_len(self):
+        """Number of messages waiting to be written to the socket."""
+        return self._msg_sender.queue_len
+
+    @property
+    def send_queue_bytes(self):
+        """Number of bytes waiting to be written to the socket."""
+        return self._msg_sender.queued_bytes
+
+    @property
+    def recv_queue_len(self):
+        """Number of received messages waiting to be handled."""
+        return self._recv_msg_queue.queue_len
+
+    @property
+    def recv_queue_bytes(self):
+        """Number of bytes of received messages waiting to be handled."""
+        return self._recv_msg_queue.queued_bytes
+
+    @property
+    def recv_queue_high_water_msgs(self):
+        """Largest number of received messages that were waiting at once."""
+        return self._recv_msg_queue.high_water_msgs
+
+    @property
+    def recv_queue_high_water_bytes(self):
+        """Largest number of bytes of received messages that were waiting at once."""
+        return self._recv_msg_queue.high_water_bytes
+
     def recv_msg(self):
-        """Read data from the peer socket, and yield messages as they are decoded.
+        """Read data from the peer socket, and return the next message frame.
 
-        This method blocks when the socket has no data to read.
+        This method blocks when the socket has no data to read, or when the
+        peer is over its receive rate limit. Returns None after the peer
+        has been stopped.
         """
+        if self.stopped.is_set():
+            return None
         msg = self._recv_msg_queue.get()
         logger.debug('Received msg {} from {}'.format(msg, self))
+        if msg is not None:
+            delay = self.frame_received(msg)
+            if delay:
+                self.stopped.wait(delay)
         return msg
 
+    def frame_received(self, frame):
+        """Record a received frame, and return the seconds to wait before
+        handling more frames from the peer.
+        """
+        return self.bandwidth.recv_delay(frame.command, frame.size)
+
     def stop(self):
         logger.info("Stopping peer: {}".format(self))
         self.stopped.set()
+        self._recv_msg_queue.close()
+        self._msg_sender.stop()
+        self.close()
 
     def close(self):
         logger.info("closing peer socket: {}".format(self._peer_socket))
         if self._peer_socket:
+            try:
+                self._peer_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self._peer_socket.close()
 
     def send_msg(self, msg):
+        """Queue a message to be written to the peer socket.
+
+        This method does not block. The peer is stopped if it does not
+        read its messages fast enough to keep the send queue below
+        `MAX_SEND_QUEUE_BYTES`.
+        """
         logger.debug('Sending msg {} to {}'.format(msg, self))
-        data = msg.to_bytes()
-        with self._peer_socket_lock:
-            self._peer_socket.send(data)
+        self.send_msg_data(msg.to_bytes())
+
+    def send_msg_data(self, data):
+        """Queue an already serialized message to be written to the peer
+        socket.
+        """
+        command = bytes(data[4:16]).split(b"\x00", 1)[0]
+        try:
+            self._msg_sender.queue_data(data)
+        except SendQueueFullError:
+            logger.warning('Send queue full, disconnecting peer {}'.format(self))
+            self.stop()
+            return
+        self.bandwidth.traffic.record_sent(command, len(data))
+
+    def send_msgs_data(self, msgs_data):
+        """Queue a batch of serialized messages to be written to the peer
+        socket.
+
+        If compression was negotiated with the peer, the messages are sent
+        in `zbatch` messages of at most `MAX_ZBATCH_DATA_LEN` bytes before
+        compression. Batches smaller than `MIN_COMPRESS_LEN` are sent as
+        they are.
+        """
+        if self.compression_codec is None or sum(len(data) for data in msgs_data) < MIN_COMPRESS_LEN:
+            for data in msgs_data:
+                self.send_msg_data(data)
+            return
+        batch = []
+        batch_len = 0
+        for data in msgs_data:
+            if batch and batch_len + len(data) > MAX_ZBATCH_DATA_LEN:
+                self.send_msg_data(compress_batch(batch, self.compression_codec))
+                batch = []
+                batch_len = 0
+            batch.append(data)
+            batch_len += len(data)
+        if batch:
+            self.send_msg_data(compress_batch(batch, self.compression_codec))
+
+    def unpack_batch(self, frame):
+        """Get the message frames packed in a received `zbatch` frame."""
+        decoder = MessageDecoder(expect_handshake=False)
+        frames = list(decoder.process_recv_data(decompress_batch(frame.payload)))
+        if decoder.buffered_len:
+            raise Exception('Incomplete message in zbatch')
+        for inner_frame in frames:
+            if inner_frame.command == ZBATCH_COMMAND:
+                raise Exception('Nested zbatch message')
+        return frames
+
+    def call_when_send_queue_drained(self, callback):
+        """Call `callback` once the send queue is below
+        `SEND_QUEUE_LOW_WATER` bytes.
+
+        Returns False, and does not call `callback`, if the send queue is
+        already below it. The callback is never called if the peer stops.
+        """
+        return self._msg_sender.call_when_drained(callback)
 
     def __enter__(self):
         logger.debug('Setting up peer {} ...'.format(self))
@@ -147,44 +333,258 @@ class Peer(object):
             target=msg_receiver.recv_msgs,
             args=(),
         ).start()
+        threading.Thread(
+            target=self._msg_sender.send_msgs,
+            args=(),
+        ).start()
         return self
 
     def __exit__(self, *exc):
-        self.stop.set()
+        self.stop()
         logger.debug('Stopped peer {} ...'.format(self))
 
     def __repr__(self):
         return "Peer(%s)" % (self.address_string)
 
 
+class MessageFrame(object):
+    """A received message that has been framed and checksummed, but not
+    deserialized yet.
+    """
+
+    def __init__(self, command, payload):
+        self.command = command
+        self.payload = payload
+        self._msg = None
+
+    @property
+    def size(self):
+        return MSG_HEADER_LEN + len(self.payload)
+
+    def deserialize(self):
+        """Deserialize the message from the payload."""
+        if self._msg is None:
+            msg_cls = messagemap[self.command]
+            self._msg = msg_cls.msg_deser(BytesIO(self.payload))
+        return self._msg
+
+    def __repr__(self):
+        return "MessageFrame(command=%s, size=%d)" % (self.command, self.size)
+
+
 class MessageDecoder:
     """Handles the incoming binary data from a peer and buffers and decodes.
+
+    Received data is written into a reusable buffer, either copied in by
+    `process_recv_data` or read directly into it through
+    `get_read_buffer` and `buffer_updated`.
+
+    Only the header of each message is parsed by the decoder. Frames that
+    are too large, or that break the handshake, are rejected as soon as
+    their header is read, before the payload is buffered. Frames with
+    unknown commands are skipped. The payload of every other frame,
+    including compressed `zbatch` frames, is checksummed and returned in
+    a `MessageFrame`, to be deserialized only if the message is handled.
     """
 
-    def __init__(self):
-        self.recv_data_buffer = BytesIO()
+    def __init__(self, expect_handshake=True):
+        self._buffer = bytearray()
+        self._start = 0
+        self._end = 0
+        self._pending_msg_len = None
+        self._last_msg_len = 0
+        self._handshake_commands = set(HANDSHAKE_COMMANDS) if expect_handshake else set()
+
+    @property
+    def last_msg_len(self):
+        """Size in bytes of the last decoded message."""
+        return self._last_msg_len
+
+    @property
+    def buffered_len(self):
+        """Number of received bytes that have not been decoded yet."""
+        return self._end - self._start
+
+    def next_read_size(self):
+        """Number of bytes to request from the socket in the next read.
+
+        Grows up to the size of the rest of a partially received message,
+        so a large payload does not need one read per `SOCKET_READ_LEN`.
+        """
+        if self._pending_msg_len is None:
+            return SOCKET_READ_LEN
+        remaining = self._pending_msg_len - self.buffered_len
+        return min(max(remaining, SOCKET_READ_LEN), MAX_SOCKET_READ_LEN)
+
+    def get_read_buffer(self, size):
+        """Get a writable view of at least `size` free bytes at the end of
+        the buffer.
+
+        The view must be released before the next call to the decoder.
+        """
+        self._compact()
+        free = len(self._buffer) - self._end
+        if free < size:
+            self._buffer.extend(bytes(size - free))
+        return memoryview(self._buffer)[self._end:]
+
+    def buffer_updated(self, nbytes):
+        """Decode the frames completed by `nbytes` new bytes written to
+        the read buffer.
+        """
+        self._end += nbytes
+        while self.buffered_len >= MSG_HEADER_LEN:
+            frame = self._decode_next()
+            if frame is False:
+                break
+            if frame is not None:
+                yield frame
 
     def process_recv_data(self, recv_data):
-        data = self.read_data_buffer() + recv_data
-        try:
-            while data:
-                self.set_data_buffer(data)
-                msg = MsgSerializable.stream_deserialize(self.recv_data_buffer)
-                if msg is None:
-                    raise Exception('Invalid data')
+        with self.get_read_buffer(len(recv_data)) as read_buffer:
+            read_buffer[:len(recv_data)] = recv_data
+        yield from self.buffer_updated(len(recv_data))
+
+    def _check_header(self, command, msglen):
+        if msglen > MAX_MESSAGE_LEN - MSG_HEADER_LEN:
+            raise Exception('Message size too large')
+        if self._handshake_commands:
+            if command not in self._handshake_commands:
+                raise Exception('Received non-handshake message from un-handshaked peer.')
+            if msglen > MAX_HANDSHAKE_MESSAGE_LEN:
+                raise Exception('Handshake message size too large')
+
+    def _decode_next(self):
+        """Decode the next frame from the buffer.
+
+        Returns False if the buffer does not contain a complete frame yet,
+        and None if the frame was skipped.
+        """
+        payload_start = self._start + MSG_HEADER_LEN
+        with memoryview(self._buffer) as view:
+            with view[self._start:payload_start] as header:
+                command, msglen, checksum = parse_msg_header(header)
+            self._check_header(command, msglen)
+            end = payload_start + msglen
+            if self._end < end:
+                self._pending_msg_len = MSG_HEADER_LEN + msglen
+                return False
+            with view[payload_start:end] as payload:
+                if command in messagemap or command == ZBATCH_COMMAND:
+                    check_msg_checksum(payload, checksum)
+                    frame = MessageFrame(command, bytes(payload))
                 else:
-                    yield msg
-                    data = self.read_data_buffer()
-        except SerializationTruncationError:
-            self.set_data_buffer(data)
+                    logger.debug('Skipping msg with unknown command {}'.format(command))
+                    frame = None
+        self._start = end
+        self._pending_msg_len = None
+        self._last_msg_len = MSG_HEADER_LEN + msglen
+        self._handshake_commands.discard(command)
+        return frame
+
+    def _compact(self):
+        """Drop the bytes of the decoded messages from the buffer.
+
+        The remaining bytes are only moved once the consumed prefix makes
+        up at least half of the buffered data, so the cost of compaction
+        stays linear in the number of bytes received. A large buffer is
+        released once it is empty and the peer has switched back to
+        sending small messages.
+        """
+        if self._start == self._end:
+            if len(self._buffer) > MAX_IDLE_BUFFER_LEN and self._last_msg_len <= MAX_IDLE_BUFFER_LEN:
+                self._buffer = bytearray()
+            self._start = self._end = 0
+        elif self._start and self._start * 2 >= self._end:
+            n = self._end - self._start
+            self._buffer[:n] = self._buffer[self._start:self._end]
+            self._start, self._end = 0, n
+
+
+def parse_msg_header(header):
+    """Parse the command, payload length and checksum from a message header."""
+    if header[:4] != squeak.params.params.MESSAGE_START:
+        raise Exception('Invalid message start')
+    command = bytes(header[4:16]).split(b"\x00", 1)[0]
+    msglen = struct.unpack(b"<I", header[16:20])[0]
+    checksum = bytes(header[20:24])
+    return command, msglen, checksum
+
+
+def check_msg_checksum(payload, checksum):
+    """Check the checksum from the message header against the payload."""
+    h = hashlib.sha256(hashlib.sha256(payload).digest()).digest()
+    if checksum != h[:4]:
+        raise Exception('Invalid message checksum')
+
+
+class MessageQueue:
+    """A queue of received messages, bounded by both the number of
+    messages and their total size in bytes.
+
+    `put` blocks while the queue is full, so a receiver thread stops
+    reading from the socket and TCP flow control slows down the sender.
+    """
 
-    def read_data_buffer(self):
-        return self.recv_data_buffer.read()
+    def __init__(self, max_msgs=MAX_RECV_QUEUE_MSGS, max_bytes=MAX_RECV_QUEUE_BYTES):
+        self.max_msgs = max_msgs
+        self.max_bytes = max_bytes
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._closed = False
+        self._queue_changed = threading.Condition()
+        self.high_water_msgs = 0
+        self.high_water_bytes = 0
 
-    def set_data_buffer(self, data):
-        if len(data) > MAX_MESSAGE_LEN:
-            raise Exception('Message size too large')
-        self.recv_data_buffer = BytesIO(data)
+    @property
+    def queue_len(self):
+        return len(self._queue)
+
+    @property
+    def queued_bytes(self):
+        return self._queued_bytes
+
+    def _is_full(self, size):
+        if not self._queue:
+            return False
+        return len(self._queue) >= self.max_msgs or \
+            self._queued_bytes + size > self.max_bytes
+
+    def put(self, msg, size):
+        """Add a message, waiting until there is room for it in the queue.
+
+        The message is dropped if the queue is closed.
+        """
+        with self._queue_changed:
+            while self._is_full(size) and not self._closed:
+                self._queue_changed.wait()
+            if self._closed:
+                return
+            self._queue.append((msg, size))
+            self._queued_bytes += size
+            self.high_water_msgs = max(self.high_water_msgs, len(self._queue))
+            self.high_water_bytes = max(self.high_water_bytes, self._queued_bytes)
+            self._queue_changed.notify_all()
+
+    def get(self):
+        """Remove and return the next message, waiting until one is available.
+
+        Returns None after the queue is closed.
+        """
+        with self._queue_changed:
+            while not self._queue and not self._closed:
+                self._queue_changed.wait()
+            if self._closed:
+                return None
+            msg, size = self._queue.popleft()
+            self._queued_bytes -= size
+            self._queue_changed.notify_all()
+            return msg
+
+    def close(self):
+        with self._queue_changed:
+            self._closed = True
+            self._queue_changed.notify_all()
 
 
 class MessageReceiver:
@@ -199,12 +599,14 @@ class MessageReceiver:
 
     def _recv_msgs(self):
         while True:
-            recv_data = self.socket.recv(SOCKET_READ_LEN)
-            if not recv_data:
+            read_len = self.decoder.next_read_size()
+            with self.decoder.get_read_buffer(read_len) as read_buffer:
+                nbytes = self.socket.recv_into(read_buffer, read_len)
+            if not nbytes:
                 raise Exception('Peer disconnected')
 
-            for msg in self.decoder.process_recv_data(recv_data):
-                self.queue.put(msg)
+            for frame in self.decoder.buffer_updated(nbytes):
+                self.queue.put(frame, frame.size)
                 if self.stopped_event.is_set():
                     return
 
@@ -213,3 +615,112 @@ class MessageReceiver:
             self._recv_msgs()
         except Exception:
             self.stopped_event.set()
+            self.queue.close()
+
+
+class MessageSender:
+    """Writes the queued messages of a peer to the socket.
+
+    Messages are queued without blocking the caller. The writer thread
+    takes all of the messages that are waiting in the queue and writes
+    them to the socket together with a single `sendmsg` call. If writing
+    fails, `on_error` is called to stop the peer.
+    """
+
+    def __init__(self, socket, stopped_event, bandwidth=None, on_error=None):
+        self.socket = socket
+        self.stopped_event = stopped_event
+        self.bandwidth = bandwidth or PeerBandwidth()
+        self.on_error = on_error
+        self._queue = deque()
+        self._queued_bytes = 0
+        self._queue_changed = threading.Condition()
+        self._drained_callbacks = []
+
+    @property
+    def queue_len(self):
+        return len(self._queue)
+
+    @property
+    def queued_bytes(self):
+        return self._queued_bytes
+
+    def queue_data(self, data):
+        with self._queue_changed:
+            if self._queued_bytes + len(data) > MAX_SEND_QUEUE_BYTES:
+                raise SendQueueFullError()
+            self._queue.append(data)
+            self._queued_bytes += len(data)
+            self._queue_changed.notify()
+
+    def stop(self):
+        with self._queue_changed:
+            self._drained_callbacks = []
+            self._queue_changed.notify_all()
+
+    def call_when_drained(self, callback):
+        with self._queue_changed:
+            if self.queued_bytes <= SEND_QUEUE_LOW_WATER:
+                return False
+            self._drained_callbacks.append(callback)
+            return True
+
+    def _run_drained_callbacks(self):
+        with self._queue_changed:
+            if not self._drained_callbacks or self.queued_bytes > SEND_QUEUE_LOW_WATER:
+                return
+            callbacks = self._drained_callbacks
+            self._drained_callbacks = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception('Error in send queue drained callback')
+
+    def _take_batch(self):
+        """Wait for queued messages and take up to `MAX_SEND_BATCH_LEN` of them.
+
+        Returns None after the peer is stopped.
+        """
+        with self._queue_changed:
+            while not self._queue and not self.stopped_event.is_set():
+                self._queue_changed.wait()
+            if self.stopped_event.is_set():
+                return None
+            n = min(len(self._queue), MAX_SEND_BATCH_LEN)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _send_batch(self, batch):
+        views = deque(memoryview(data) for data in batch)
+        while views:
+            sent = self.socket.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views.popleft())
+            if sent:
+                views[0] = views[0][sent:]
+        with self._queue_changed:
+            self._queued_bytes -= sum(len(data) for data in batch)
+
+    def _send_msgs(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            delay = self.bandwidth.send_delay(sum(len(data) for data in batch))
+            if delay and self.stopped_event.wait(delay):
+                return
+            self._send_batch(batch)
+            self._run_drained_callbacks()
+
+    def send_msgs(self):
+        try:
+            self._send_msgs()
+        except Exception:
+            logger.debug('Failed to send messages', exc_info=True)
+            self.stopped_event.set()
+            if self.on_error:
+                self.on_error()
+
+
+class SendQueueFullError(Exception):
+    pass
@@ -2,6 +2,7 @@ import logging
 
 from squeakclient.squeaknode.node.connection import Connection
 from squeakclient.squeaknode.node.peer import Peer
+from squeakclient.squeaknode.node.peer_message_handler import PeerMessageHandler
 
 
 logger = logging.getLogger(__name__)
@@ -21,9 +22,11 @@ class PeerHandler():
         This method blocks until the peer connection has stopped.
         """
         logger.debug('Setting up controller for peer address {} ...'.format(address))
-        with Peer(peer_socket, address, outgoing) as p:
+        bandwidth = self.node.bandwidth_manager.new_peer_bandwidth()
+        with Peer(peer_socket, address, outgoing, bandwidth=bandwidth) as p:
             with Connection(p, self.node):
-                p.stopped.wait()
+                peer_message_handler = PeerMessageHandler(p, self.node)
+                peer_message_handler.handle_msgs()
         logger.debug('Stopped controller for peer address {}.'.format(address))
 
 
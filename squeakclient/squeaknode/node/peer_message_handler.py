@@ -1,16 +1,19 @@
 import logging
+import time
 
 from squeak.messages import msg_addr
-from squeak.messages import msg_getdata
 from squeak.messages import msg_inv
-from squeak.messages import msg_notfound
 from squeak.messages import msg_pong
-from squeak.messages import msg_squeak
 from squeak.net import CInv
+from squeak.net import CSqueakLocator
 
-from squeak.messages import msg_ping
+from squeakclient.squeaknode.node.compression import ZBATCH_COMMAND
+from squeakclient.squeaknode.node.inventory_relay import MAX_INV_ENTRIES
+from squeakclient.squeaknode.node.peer import HANDSHAKE_COMMANDS
+from squeakclient.squeaknode.node.squeak_sender import SqueakSender
 
-from squeakclient.squeaknode.util import generate_nonce
+
+MAX_GETSQUEAKS_RESULTS = 5000
 
 
 logger = logging.getLogger(__name__)
@@ -23,56 +26,80 @@ class PeerMessageHandler:
     def __init__(self, peer, node):
         self.peer = peer
         self.node = node
-
-    def initiate_ping(self):
-        """Send a ping message and expect a pong response."""
-        nonce = generate_nonce()
-        ping = msg_ping()
-        ping.nonce = nonce
-        self.peer.send_msg(ping)
-        self.peer.set_last_sent_ping(nonce)
+        self.frame = None
+        self.handlers = {
+            b'version': self.handle_version,
+            b'verack': self.handle_verack,
+            b'ping': self.handle_ping,
+            b'pong': self.handle_pong,
+            b'addr': self.handle_addr,
+            b'getaddr': self.handle_getaddr,
+            b'inv': self.handle_inv,
+            b'getsqueaks': self.handle_getsqueaks,
+            b'squeak': self.handle_squeak,
+            b'getdata': self.handle_getdata,
+            b'notfound': self.handle_notfound,
+            b'getoffer': self.handle_getoffer,
+            b'offer': self.handle_offer,
+            b'getinvoice': self.handle_getinvoice,
+            b'invoice': self.handle_invoice,
+            b'getfulfill': self.handle_getfulfill,
+            b'fulfill': self.handle_fulfill,
+        }
 
     def handle_msgs(self):
         """Handles messages from the peer if there are any available.
 
-        This method blocks when the peer has not sent any messages.
+        This method blocks when the peer has not sent any messages, and
+        returns when the peer is stopped.
         """
         while True:
-            msg = self.peer.recv_msg()
-            self.handle_peer_message(msg)
+            frame = self.peer.recv_msg()
+            if frame is None:
+                return
+            self.handle_peer_message(frame)
 
-    def handle_peer_message(self, msg):
-        """Handle messages from a peer with completed handshake."""
+    def handle_peer_message(self, frame):
+        """Handle a message frame from a peer with completed handshake.
+
+        The message is only deserialized if there is a handler for its
+        command.
+        """
 
         # Only allow version and verack messages before handshake is complete.
-        if not self.peer.is_handshake_complete and msg.command not in [
-                b'version',
-                b'verack',
-        ]:
+        if not self.peer.is_handshake_complete and frame.command not in HANDSHAKE_COMMANDS:
             raise Exception('Received non-handshake message from un-handshaked peer.')
 
-        if msg.command == b'version':
-            self.handle_version(msg)
-        if msg.command == b'verack':
-            self.handle_verack(msg)
-        if msg.command == b'ping':
-            self.handle_ping(msg)
-        if msg.command == b'pong':
-            self.handle_pong(msg)
-        if msg.command == b'addr':
-            self.handle_addr(msg)
-        if msg.command == b'getaddr':
-            self.handle_getaddr(msg)
-        if msg.command == b'inv':
-            self.handle_inv(msg)
-        if msg.command == b'getsqueaks':
-            self.handle_getsqueaks(msg)
-        if msg.command == b'squeak':
-            self.handle_squeak(msg)
-        if msg.command == b'getdata':
-            self.handle_getdata(msg)
-        if msg.command == b'notfound':
-            self.handle_notfound(msg)
+        self.peer.set_last_msg_revc_time()
+        if frame.command == ZBATCH_COMMAND:
+            self.handle_zbatch(frame)
+            return
+        handler = self.handlers.get(frame.command)
+        if handler is None:
+            logger.debug('Ignoring msg with unknown command {}'.format(frame.command))
+            return
+        if not self.peer.bandwidth.allow_command(frame.command):
+            logger.info('Dropping {} msg over rate limit from {}'.format(frame.command, self.peer))
+            return
+        start_time = time.perf_counter()
+        self.frame = frame
+        msg = frame.deserialize()
+        handler(msg)
+        elapsed = time.perf_counter() - start_time
+        self.node.message_stats.record(frame.command, elapsed)
+
+    def handle_zbatch(self, frame):
+        """Handle each of the messages packed in a compressed batch."""
+        if self.peer.compression_codec is None:
+            raise Exception('Received zbatch msg without negotiated compression.')
+        for inner_frame in self.peer.unpack_batch(frame):
+            self.handle_peer_message(inner_frame)
+
+    def handle_version(self, msg):
+        logger.debug('Ignoring duplicate version msg from {}'.format(self.peer))
+
+    def handle_verack(self, msg):
+        logger.debug('Ignoring duplicate verack msg from {}'.format(self.peer))
 
     def handle_ping(self, msg):
         nonce = msg.nonce
@@ -85,8 +112,8 @@ class PeerMessageHandler:
         self.peer.set_pong_response(msg.nonce)
 
     def handle_addr(self, msg):
-        for addr in msg.addrs:
-            self.peer_server.connect_address((addr.ip, addr.port))
+        addresses = [(addr.ip, addr.port) for addr in msg.addrs]
+        self.node.address_manager.add_addresses(addresses, source=self.peer.address[0])
 
     def handle_getaddr(self, msg):
         peers = self.node.get_peers()
@@ -97,46 +124,85 @@ class PeerMessageHandler:
 
     def handle_inv(self, msg):
         invs = msg.inv
-        saved_hashes = set(self.squeaks_access.get_squeak_hashes())
-        received_hashes = set([inv.hash
-                               for inv in invs
-                               if inv.type == 1])
-        new_hashes = received_hashes - saved_hashes
-
-        new_invs = [CInv(type=1, hash=hash)
-                    for hash in new_hashes]
-        getdata_msg = msg_getdata(inv=new_invs)
-        self.peer.send_msg(getdata_msg)
+        received_hashes = self.peer.known_inventory.filter_new([
+            inv.hash
+            for inv in invs
+            if inv.type == 1
+        ])
+        new_hashes = self.node.squeaks_access.filter_missing_squeaks(received_hashes)
+        if new_hashes:
+            self.node.download_scheduler.add_announcements(self.peer, new_hashes)
 
     def handle_getdata(self, msg):
         invs = msg.inv
-        not_found = []
-        for inv in invs:
-            if inv.type == 1:
-                squeak = self.squeaks_access.get_squeak(inv.hash)
-                if squeak:
-                    squeak_msg = msg_squeak(squeak=squeak)
-                    self.peer.send_msg(squeak_msg)
-                else:
-                    not_found.append(inv)
-        notfound_msg = msg_notfound(inv=not_found)
-        self.peer.send_msg(notfound_msg)
+        squeak_hashes = [inv.hash for inv in invs if inv.type == 1]
+        self.peer.known_inventory.add_all(squeak_hashes)
+        squeak_sender = SqueakSender(
+            self.peer,
+            self.node.squeaks_access,
+            self.node.squeak_frame_cache,
+            squeak_hashes,
+        )
+        squeak_sender.send()
 
     def handle_notfound(self, msg):
-        pass
+        invs = msg.inv
+        squeak_hashes = [inv.hash for inv in invs if inv.type == 1]
+        self.node.download_scheduler.not_found(self.peer, squeak_hashes)
 
     def handle_getsqueaks(self, msg):
-        locator = msg.locator
-        squeaks = self.squeaks_access.get_squeaks_by_locator(locator)
-        invs = [CInv(type=1, hash=squeak.GetHash())
-                for squeak in squeaks]
+        """Send the hashes of the squeaks that match the locator in inv
+        messages of at most `MAX_INV_ENTRIES` entries.
+
+        The interests of the locator are answered in turn, each in block
+        height order. Once about `MAX_GETSQUEAKS_RESULTS` hashes are
+        sent, the results end with all of the squeaks at the block
+        height of the last one in the current interest, and the later
+        interests are not answered. A peer that receives
+        `MAX_GETSQUEAKS_RESULTS` hashes or more can get the rest by
+        asking again, with `nMinBlockHeight` of the last interest that
+        it received squeaks for set past the highest block height it
+        received for that interest, followed by the interests after it.
+        """
+        squeak_hashes = []
+        seen_hashes = set()
+        n_results = 0
+        for interested in msg.locator.vInterested:
+            if n_results >= MAX_GETSQUEAKS_RESULTS:
+                break
+            results = self.node.squeaks_access.get_squeak_hashes_by_locator(
+                CSqueakLocator(vInterested=[interested]),
+            )
+            last_block_height = None
+            for block_height, squeak_hash in results:
+                if n_results >= MAX_GETSQUEAKS_RESULTS and block_height != last_block_height:
+                    break
+                last_block_height = block_height
+                if squeak_hash in seen_hashes:
+                    continue
+                seen_hashes.add(squeak_hash)
+                squeak_hashes.append(squeak_hash)
+                n_results += 1
+                if len(squeak_hashes) >= MAX_INV_ENTRIES:
+                    self._send_inv(squeak_hashes)
+                    squeak_hashes = []
+        if squeak_hashes or not n_results:
+            self._send_inv(squeak_hashes)
+
+    def _send_inv(self, squeak_hashes):
+        self.peer.known_inventory.add_all(squeak_hashes)
+        invs = [CInv(type=1, hash=squeak_hash)
+                for squeak_hash in squeak_hashes]
         inv_msg = msg_inv(inv=invs)
         self.peer.send_msg(inv_msg)
 
     def handle_squeak(self, msg):
         # TODO: If squeak is interesting, respond with getoffer msg.
         squeak = msg.squeak
-        self.squeaks_access.add_squeak(squeak)
+        squeak_hash = squeak.GetHash()
+        self.peer.known_inventory.add(squeak_hash)
+        is_new = self.node.add_squeak(squeak, source_peer=self.peer)
+        self.node.download_scheduler.squeak_received(self.peer, squeak_hash, self.frame.size, is_new)
 
     def handle_getoffer(self, msg):
         # Respond with offer msg.
@@ -4,11 +4,7 @@ import threading
 
 import squeak.params
 
-
-MIN_PEERS = 5
-MAX_PEERS = 10
-UPDATE_THREAD_SLEEP_TIME = 10
-
+from squeakclient.squeaknode.node.dialer import Dialer
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +17,7 @@ class PeerServer(object):
         self.ip = socket.gethostbyname('localhost')
         self.port = port or squeak.params.params.DEFAULT_PORT
         self.connection_manager = connection_manager
+        self.dialer = Dialer()
 
     def start(self, peer_handler):
         self.peer_handler = peer_handler
@@ -31,7 +28,7 @@ class PeerServer(object):
     def stop(self):
         # TODO: stop accepting connections thread.
         # TODO: stop every peer in connection manager.
-        pass
+        self.dialer.stop()
 
     def accept_connections(self):
         listen_socket = socket.socket()
@@ -42,16 +39,8 @@ class PeerServer(object):
             peer_socket.setblocking(True)
             self.handle_connection(peer_socket, address, outgoing=False)
 
-    def make_connection(self, ip, port):
-        address = (ip, port)
-        logger.debug('Making connection to {}'.format(address))
-        try:
-            peer_socket = socket.socket()
-            peer_socket.connect(address)
-            peer_socket.setblocking(True)
-            self.handle_connection(peer_socket, address, outgoing=True)
-        except Exception:
-            pass
+    def handle_outgoing_connection(self, peer_socket, address):
+        self.handle_connection(peer_socket, address, outgoing=True)
 
     def handle_connection(self, peer_socket, address, outgoing):
         threading.Thread(
@@ -64,8 +53,7 @@ class PeerServer(object):
         logger.debug('Connecting to peer with address {}'.format(address))
         if self.connection_manager.has_connection(address):
             return
-        ip, port = address
-        threading.Thread(
-            target=self.make_connection,
-            args=(ip, port),
-        ).start()
+        self.dialer.dial(address, self.handle_outgoing_connection)
+
+    def get_dial_stats(self):
+        return self.dialer.get_stats()
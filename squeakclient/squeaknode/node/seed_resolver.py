@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from pathlib import Path
+
+from squeakclient.squeaknode.core.data.data_dir import create_data_dir
+from squeakclient.squeaknode.core.data.data_dir import DATA_DIR
+
+
+SEED_RESOLVE_TIMEOUT = 5
+SEED_CACHE_TTL = 3600
+MAX_CONCURRENT_RESOLVES = 8
+SEED_CACHE_FILE = Path(DATA_DIR) / 'seeds.json'
+
+
+logger = logging.getLogger(__name__)
+
+
+class SeedResolver(object):
+    """Resolves the hostnames of the DNS seeds.
+
+    All of the seeds are resolved concurrently, and the seeds that did not
+    resolve before the timeout are skipped. The results are cached on disk
+    for `ttl` seconds. If a seed cannot be resolved, its last cached
+    result is used even if it has expired.
+    """
+
+    def __init__(
+            self,
+            resolve=None,
+            cache_file=SEED_CACHE_FILE,
+            ttl=SEED_CACHE_TTL,
+            timeout=SEED_RESOLVE_TIMEOUT,
+            max_resolves=MAX_CONCURRENT_RESOLVES,
+    ):
+        self.resolve = resolve or resolve_addresses
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.timeout = timeout
+        self.max_resolves = max_resolves
+        self._cache = None
+        self._lock = threading.Lock()
+
+    def get_ips(self, hosts):
+        """Get the ip addresses of all of the given hosts."""
+        now = time.time()
+        cache = self._load_cache()
+        ips = {}
+        stale_hosts = []
+        with self._lock:
+            for host in hosts:
+                entry = cache.get(host)
+                if entry and entry['expires'] > now:
+                    ips[host] = entry['ips']
+                else:
+                    stale_hosts.append(host)
+        if stale_hosts:
+            resolved = self._resolve_all(stale_hosts)
+            with self._lock:
+                for host, host_ips in resolved.items():
+                    cache[host] = {'ips': host_ips, 'expires': now + self.ttl}
+                for host in stale_hosts:
+                    if host in resolved:
+                        ips[host] = resolved[host]
+                    elif host in cache:
+                        logger.info('Using expired addresses for seed {}'.format(host))
+                        ips[host] = cache[host]['ips']
+            self._save_cache()
+        return [ip for host in hosts for ip in ips.get(host, [])]
+
+    def _resolve_all(self, hosts):
+        executor = ThreadPoolExecutor(max_workers=min(len(hosts), self.max_resolves))
+        futures = {executor.submit(self.resolve, host): host for host in hosts}
+        done, not_done = wait(futures, timeout=self.timeout)
+        executor.shutdown(wait=False)
+        for future in not_done:
+            future.cancel()
+            logger.warning('Timed out resolving seed {}'.format(futures[future]))
+        resolved = {}
+        for future in done:
+            host = futures[future]
+            try:
+                resolved[host] = future.result()
+            except Exception:
+                logger.warning('Failed to resolve seed {}'.format(host))
+        return resolved
+
+    def _load_cache(self):
+        with self._lock:
+            if self._cache is None:
+                try:
+                    with open(self.cache_file, 'r') as f:
+                        self._cache = json.load(f)
+                except FileNotFoundError:
+                    self._cache = {}
+                except Exception:
+                    logger.exception('Failed to load seed cache {}'.format(self.cache_file))
+                    self._cache = {}
+            return self._cache
+
+    def _save_cache(self):
+        with self._lock:
+            data = dict(self._cache)
+        try:
+            create_data_dir()
+            tmp_file = Path(str(self.cache_file) + '.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception:
+            logger.exception('Failed to save seed cache {}'.format(self.cache_file))
+
+
+def resolve_addresses(host):
+    """Get all of the IPv4 and IPv6 addresses of a host."""
+    ips = []
+    for family, _, _, _, sockaddr in socket.getaddrinfo(host, None, type=socket.SOCK_STREAM):
+        if family in (socket.AF_INET, socket.AF_INET6) and sockaddr[0] not in ips:
+            ips.append(sockaddr[0])
+    return ips
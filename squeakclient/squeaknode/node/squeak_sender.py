@@ -0,0 +1,123 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from squeak.messages import msg_notfound
+from squeak.messages import msg_squeak
+from squeak.net import CInv
+
+
+MAX_FRAME_CACHE_BYTES = 16 * 1048576
+GETDATA_CHUNK_BYTES = 262144
+GETDATA_LOOKUP_LEN = 100
+MSG_SQUEAK = 1
+
+
+logger = logging.getLogger(__name__)
+
+
+class SqueakFrameCache(object):
+    """An LRU cache of serialized squeak messages, keyed by squeak hash.
+
+    A squeak that is requested by many peers is only serialized once.
+    The cache holds at most `max_bytes` bytes of messages.
+    """
+
+    def __init__(self, max_bytes=MAX_FRAME_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def lookup(self, squeak_hash):
+        """Get the cached squeak message for the hash, or None."""
+        with self._lock:
+            data = self._frames.get(squeak_hash)
+            if data is None:
+                self.misses += 1
+                return None
+            self._frames.move_to_end(squeak_hash)
+            self.hits += 1
+            return data
+
+    def add_frame(self, squeak_hash, squeak):
+        """Serialize the squeak message, cache it, and return it."""
+        data = msg_squeak(squeak=squeak).to_bytes()
+        with self._lock:
+            if squeak_hash not in self._frames:
+                self._frames[squeak_hash] = data
+                self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._frames.popitem(last=False)
+                self._size -= len(evicted)
+        return data
+
+
+class SqueakSender(object):
+    """Sends the squeaks requested by a getdata message to a peer.
+
+    The squeaks are looked up and queued in chunks of about
+    `GETDATA_CHUNK_BYTES`. Their messages are taken from the frame cache,
+    and only the squeaks that are not cached are read from the store.
+    After each chunk, the next one is only queued once the peer send
+    queue has drained, so a large request does not fill the send queue.
+    Each chunk is compressed if the peer supports it. The hashes that
+    are not found are sent in one `notfound` message at the end, if
+    there are any.
+    """
+
+    def __init__(self, peer, squeaks_access, frame_cache, squeak_hashes):
+        self.peer = peer
+        self.squeaks_access = squeaks_access
+        self.frame_cache = frame_cache
+        self.squeak_hashes = squeak_hashes
+        self.not_found = []
+        self._next = 0
+
+    def send(self):
+        """Send chunks until the send queue is full or all of the squeaks
+        have been sent.
+        """
+        while self._send_chunk():
+            if self.peer.call_when_send_queue_drained(self.send):
+                return
+
+    def _send_chunk(self):
+        """Queue the next chunk of squeaks, and return True if there are
+        more to send.
+        """
+        if self.peer.stopped.is_set():
+            return False
+        chunk_bytes = 0
+        chunk = []
+        while chunk_bytes < GETDATA_CHUNK_BYTES and self._next < len(self.squeak_hashes):
+            lookup_hashes = self.squeak_hashes[self._next:self._next + GETDATA_LOOKUP_LEN]
+            self._next += len(lookup_hashes)
+            frames = {squeak_hash: self.frame_cache.lookup(squeak_hash)
+                      for squeak_hash in lookup_hashes}
+            missing_hashes = [squeak_hash for squeak_hash, data in frames.items() if data is None]
+            squeaks = self.squeaks_access.get_squeaks_by_hashes(missing_hashes) if missing_hashes else {}
+            for squeak_hash in lookup_hashes:
+                data = frames[squeak_hash]
+                if data is None:
+                    squeak = squeaks.get(squeak_hash)
+                    if squeak is None:
+                        self.not_found.append(squeak_hash)
+                        continue
+                    data = self.frame_cache.add_frame(squeak_hash, squeak)
+                chunk.append(data)
+                chunk_bytes += len(data)
+        self.peer.send_msgs_data(chunk)
+        if self._next < len(self.squeak_hashes):
+            return True
+        if self.not_found:
+            invs = [CInv(type=MSG_SQUEAK, hash=squeak_hash)
+                    for squeak_hash in self.not_found]
+            self.peer.send_msg(msg_notfound(inv=invs))
+        return False
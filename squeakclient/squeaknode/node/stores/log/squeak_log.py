@@ -0,0 +1,374 @@
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from collections.abc import Mapping
+from collections.abc import MutableMapping
+from pathlib import Path
+
+from squeak.core import CSqueak
+from squeak.core import HASH_LENGTH
+from squeak.core.signing import CSqueakAddress
+
+from squeakclient.squeaknode.core.data.data_dir import DATA_DIR
+
+
+SQUEAK_LOG_DIR = Path(DATA_DIR) / 'squeaks'
+SEGMENT_MAX_BYTES = 64 * 1048576
+MIN_COMPACT_BYTES = 16 * 1048576
+COMPACT_DEAD_RATIO = 0.5
+CHECKPOINT_INTERVAL = 100000
+SEGMENT_FILE_FORMAT = 'segment-{:08d}.log'
+CHECKPOINT_FILE = 'index.checkpoint'
+CHECKPOINT_MAGIC = b'SQKIDX01'
+
+RECORD_ADD = 1
+RECORD_REMOVE = 2
+
+# Record type, CRC32 of the meta and data, and data length.
+RECORD_PREFIX = struct.Struct('<BII')
+# Squeak hash, block height, reply hash, address version, address and
+# length of the serialized header at the start of the data.
+RECORD_META = struct.Struct('<32si32sB20sH')
+RECORD_HEADER_LEN = RECORD_PREFIX.size + RECORD_META.size
+# Active segment id, end offset in the active segment, and entry count.
+CHECKPOINT_HEADER = struct.Struct('<8sIQQ')
+# Squeak hash, segment id, record offset and data length.
+CHECKPOINT_ENTRY = struct.Struct('<32sIQI')
+
+
+logger = logging.getLogger(__name__)
+
+
+class Segment(object):
+    """A segment file of the log, and its read-only memory map."""
+
+    def __init__(self, path, size=0):
+        self.path = path
+        self.size = size
+        self.dead_bytes = 0
+        self.mmap = None
+
+    def view(self, start, length):
+        """Get a memoryview of `length` bytes of the file at `start`.
+
+        The file is mapped again if it has grown past the current map.
+        The view must be released before the segment is closed.
+        """
+        if self.mmap is None or start + length > len(self.mmap):
+            self.close()
+            with open(self.path, 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self.mmap)[start:start + length]
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+
+
+class SqueakLogHeaders(Mapping):
+    """A read-only mapping of squeak hashes to the serialized headers of
+    the squeaks in a log. Headers are read from the log when they are
+    looked up, and are not held in memory.
+    """
+
+    def __init__(self, squeak_log):
+        self.squeak_log = squeak_log
+
+    def __getitem__(self, squeak_hash):
+        return self.squeak_log.get_header_data(squeak_hash)
+
+    def __contains__(self, squeak_hash):
+        return squeak_hash in self.squeak_log
+
+    def __iter__(self):
+        return iter(self.squeak_log)
+
+    def __len__(self):
+        return len(self.squeak_log)
+
+
+class SqueakLog(MutableMapping):
+    """A mapping of squeak hashes to squeaks, stored in an append-only log.
+
+    Every added or removed squeak appends a record to the active segment
+    file, so writes are sequential. Squeaks are read through a memory
+    map of their segment, and deserialized from a memoryview of the
+    record. Only the location of each record is held in memory.
+
+    The index of record locations is saved in a checkpoint file, and at
+    startup it is loaded from the checkpoint and updated from the records
+    written after it. Once removed squeaks make up `COMPACT_DEAD_RATIO`
+    of the sealed segments, the live records are copied to the active
+    segment and the sealed segments are deleted.
+    """
+
+    def __init__(
+            self,
+            log_dir=SQUEAK_LOG_DIR,
+            segment_max_bytes=SEGMENT_MAX_BYTES,
+            min_compact_bytes=MIN_COMPACT_BYTES,
+    ):
+        self.log_dir = Path(log_dir)
+        self.segment_max_bytes = segment_max_bytes
+        self.min_compact_bytes = min_compact_bytes
+        self._index = {}
+        self._segments = {}
+        self._active_id = None
+        self._active_file = None
+        self._records_since_checkpoint = 0
+        self._lock = threading.RLock()
+        self._open()
+
+    def __getitem__(self, squeak_hash):
+        with self._lock:
+            segment_id, offset, length = self._index[squeak_hash]
+            with self._segments[segment_id].view(offset + RECORD_HEADER_LEN, length) as data:
+                return CSqueak.deserialize(data)
+
+    def __setitem__(self, squeak_hash, squeak):
+        address = squeak.GetAddress()
+        meta = RECORD_META.pack(
+            squeak_hash,
+            squeak.nBlockHeight,
+            squeak.hashReplySqk,
+            address.nVersion,
+            bytes(address),
+            len(squeak.get_header().serialize()),
+        )
+        data = squeak.serialize()
+        with self._lock:
+            if squeak_hash in self._index:
+                self._forget(squeak_hash)
+            self._index[squeak_hash] = self._append(RECORD_ADD, meta, data)
+
+    def __delitem__(self, squeak_hash):
+        with self._lock:
+            if squeak_hash not in self._index:
+                raise KeyError(squeak_hash)
+            self._forget(squeak_hash)
+            meta = RECORD_META.pack(squeak_hash, 0, b'', 0, b'', 0)
+            segment_id, _, _ = self._append(RECORD_REMOVE, meta, b'')
+            self._segments[segment_id].dead_bytes += RECORD_HEADER_LEN
+            self._maybe_compact()
+
+    def __contains__(self, squeak_hash):
+        return squeak_hash in self._index
+
+    def __iter__(self):
+        return iter(list(self._index))
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_header_data(self, squeak_hash):
+        """Get the serialized header of a squeak, read from the start of
+        its record data.
+        """
+        with self._lock:
+            segment_id, offset, _ = self._index[squeak_hash]
+            header_len = self._read_meta(segment_id, offset)[-1]
+            with self._segments[segment_id].view(offset + RECORD_HEADER_LEN, header_len) as header:
+                return bytes(header)
+
+    def squeak_infos(self):
+        """Generate `(hash, address, block height, reply hash)` for every
+        squeak, read from the record headers.
+        """
+        with self._lock:
+            for squeak_hash, (segment_id, offset, _) in list(self._index.items()):
+                meta = self._read_meta(segment_id, offset)
+                _, block_height, reply_hash, address_version, address, _ = meta
+                yield (
+                    squeak_hash,
+                    CSqueakAddress.from_bytes(address, address_version),
+                    block_height,
+                    reply_hash,
+                )
+
+    def checkpoint(self):
+        """Save the index, so the next startup only reads the records
+        written after this.
+        """
+        with self._lock:
+            self._active_file.flush()
+            os.fsync(self._active_file.fileno())
+            tmp_path = self.log_dir / (CHECKPOINT_FILE + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(CHECKPOINT_HEADER.pack(
+                    CHECKPOINT_MAGIC,
+                    self._active_id,
+                    self._segments[self._active_id].size,
+                    len(self._index),
+                ))
+                f.write(b''.join(
+                    CHECKPOINT_ENTRY.pack(squeak_hash, segment_id, offset, length)
+                    for squeak_hash, (segment_id, offset, length) in self._index.items()
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.log_dir / CHECKPOINT_FILE)
+            self._records_since_checkpoint = 0
+
+    def compact(self):
+        """Copy the live records of the sealed segments to the active
+        segment, and delete the sealed segments.
+        """
+        with self._lock:
+            sealed_ids = [segment_id for segment_id in self._segments
+                          if segment_id != self._active_id]
+            if not sealed_ids:
+                return
+            sealed = set(sealed_ids)
+            for squeak_hash, (segment_id, offset, length) in list(self._index.items()):
+                if segment_id not in sealed:
+                    continue
+                segment = self._segments[segment_id]
+                with segment.view(offset, RECORD_HEADER_LEN + length) as record:
+                    self._index[squeak_hash] = self._append_record(bytes(record), length)
+            self.checkpoint()
+            for segment_id in sealed_ids:
+                segment = self._segments.pop(segment_id)
+                segment.close()
+                os.remove(segment.path)
+            logger.info('Compacted {} squeak log segments'.format(len(sealed_ids)))
+
+    def close(self):
+        with self._lock:
+            self.checkpoint()
+            self._active_file.close()
+            for segment in self._segments.values():
+                segment.close()
+
+    def _open(self):
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        segment_ids = sorted(
+            int(path.name[len('segment-'):-len('.log')])
+            for path in self.log_dir.glob('segment-*.log')
+        )
+        for segment_id in segment_ids:
+            path = self._segment_path(segment_id)
+            self._segments[segment_id] = Segment(path, path.stat().st_size)
+        start_id, start_offset = self._load_checkpoint()
+        for segment_id in segment_ids:
+            if segment_id == start_id:
+                self._replay(segment_id, start_offset)
+            elif segment_id > start_id:
+                self._replay(segment_id, 0)
+        for segment_id, offset, length in self._index.values():
+            self._segments[segment_id].dead_bytes -= RECORD_HEADER_LEN + length
+        for segment in self._segments.values():
+            segment.dead_bytes += segment.size
+        self._open_active(segment_ids[-1] if segment_ids else 1)
+
+    def _load_checkpoint(self):
+        """Load the index from the checkpoint, and return the segment id
+        and offset of the first record after it.
+        """
+        path = self.log_dir / CHECKPOINT_FILE
+        if not path.exists():
+            return 0, 0
+        data = path.read_bytes()
+        try:
+            magic, segment_id, offset, count = CHECKPOINT_HEADER.unpack_from(data)
+            if magic != CHECKPOINT_MAGIC:
+                raise ValueError('Invalid magic')
+            entries_data = memoryview(data)[CHECKPOINT_HEADER.size:]
+            if len(entries_data) != count * CHECKPOINT_ENTRY.size:
+                raise ValueError('Invalid length')
+            if segment_id not in self._segments or offset > self._segments[segment_id].size:
+                raise ValueError('Invalid resume point {} {}'.format(segment_id, offset))
+            index = {}
+            for squeak_hash, entry_segment_id, entry_offset, length in CHECKPOINT_ENTRY.iter_unpack(entries_data):
+                if entry_segment_id not in self._segments:
+                    raise ValueError('Missing segment {}'.format(entry_segment_id))
+                end = entry_offset + RECORD_HEADER_LEN + length
+                if entry_segment_id > segment_id or end > self._segments[entry_segment_id].size:
+                    raise ValueError('Record past the end of segment {}'.format(entry_segment_id))
+                index[squeak_hash] = (entry_segment_id, entry_offset, length)
+        except (struct.error, ValueError):
+            logger.exception('Failed to load squeak log checkpoint, reading the full log')
+            return 0, 0
+        self._index = index
+        return segment_id, offset
+
+    def _replay(self, segment_id, start):
+        """Update the index from the records of a segment, starting at
+        offset `start`. A partly written record at the end of the segment
+        is truncated.
+        """
+        segment = self._segments[segment_id]
+        offset = start
+        while offset + RECORD_HEADER_LEN <= segment.size:
+            with segment.view(offset, RECORD_HEADER_LEN) as header:
+                record_type, crc, length = RECORD_PREFIX.unpack_from(header)
+                squeak_hash = bytes(header[RECORD_PREFIX.size:RECORD_PREFIX.size + HASH_LENGTH])
+            end = offset + RECORD_HEADER_LEN + length
+            if record_type not in (RECORD_ADD, RECORD_REMOVE) or end > segment.size:
+                break
+            with segment.view(offset + RECORD_PREFIX.size, RECORD_META.size + length) as checked:
+                if zlib.crc32(checked) != crc:
+                    break
+            if record_type == RECORD_ADD:
+                self._index[squeak_hash] = (segment_id, offset, length)
+            else:
+                self._index.pop(squeak_hash, None)
+            offset = end
+        if offset < segment.size:
+            logger.warning('Truncating squeak log segment {} at offset {}'.format(segment.path, offset))
+            segment.close()
+            os.truncate(segment.path, offset)
+            segment.size = offset
+
+    def _read_meta(self, segment_id, offset):
+        with self._segments[segment_id].view(offset + RECORD_PREFIX.size, RECORD_META.size) as meta:
+            return RECORD_META.unpack(meta)
+
+    def _forget(self, squeak_hash):
+        segment_id, _, length = self._index.pop(squeak_hash)
+        self._segments[segment_id].dead_bytes += RECORD_HEADER_LEN + length
+
+    def _append(self, record_type, meta, data):
+        crc = zlib.crc32(data, zlib.crc32(meta))
+        record = RECORD_PREFIX.pack(record_type, crc, len(data)) + meta + data
+        location = self._append_record(record, len(data))
+        self._records_since_checkpoint += 1
+        if self._records_since_checkpoint >= CHECKPOINT_INTERVAL:
+            self.checkpoint()
+        return location
+
+    def _append_record(self, record, length):
+        """Write a record to the end of the active segment, and return its
+        location.
+        """
+        active = self._segments[self._active_id]
+        if active.size and active.size + len(record) > self.segment_max_bytes:
+            self._active_file.close()
+            self._open_active(self._active_id + 1)
+            active = self._segments[self._active_id]
+        offset = active.size
+        self._active_file.write(record)
+        self._active_file.flush()
+        active.size += len(record)
+        return self._active_id, offset, length
+
+    def _open_active(self, segment_id):
+        path = self._segment_path(segment_id)
+        if segment_id not in self._segments:
+            self._segments[segment_id] = Segment(path)
+        self._active_id = segment_id
+        self._active_file = open(path, 'ab')
+
+    def _maybe_compact(self):
+        sealed = [segment for segment_id, segment in self._segments.items()
+                  if segment_id != self._active_id]
+        dead_bytes = sum(segment.dead_bytes for segment in sealed)
+        total_bytes = sum(segment.size for segment in sealed)
+        if dead_bytes >= self.min_compact_bytes and dead_bytes >= total_bytes * COMPACT_DEAD_RATIO:
+            self.compact()
+
+    def _segment_path(self, segment_id):
+        return self.log_dir / SEGMENT_FILE_FORMAT.format(segment_id)
@@ -0,0 +1,35 @@
+from squeak.core import CSqueak
+
+from squeakclient.squeaknode.node.stores.log.squeak_log import SQUEAK_LOG_DIR
+from squeakclient.squeaknode.node.stores.log.squeak_log import SqueakLog
+from squeakclient.squeaknode.node.stores.log.squeak_log import SqueakLogHeaders
+from squeakclient.squeaknode.node.stores.memory.squeak_store import MemorySqueakStore
+
+
+class LogSqueakStore(MemorySqueakStore):
+    """Keeps the squeaks in an append-only log on disk.
+
+    The author and reply indexes of the memory store are kept in memory,
+    and rebuilt at startup from the record headers of the log. Squeak
+    headers and full squeaks are only read from the log when they are
+    requested.
+    """
+
+    def __init__(self, log_dir=SQUEAK_LOG_DIR):
+        super().__init__()
+        self.squeak_log = SqueakLog(log_dir)
+        self.squeak_headers = SqueakLogHeaders(self.squeak_log)
+        self._build_indexes(self.squeak_log.squeak_infos())
+
+    def close(self):
+        self.squeak_log.close()
+
+    def _load_squeak(self, squeak_hash: bytes) -> CSqueak:
+        return self.squeak_log.get(squeak_hash)
+
+    def _save_squeak(self, squeak_hash: bytes, squeak: CSqueak) -> None:
+        self.squeak_log[squeak_hash] = squeak
+
+    def _remove_squeak_data(self, squeak_hash: bytes) -> None:
+        if squeak_hash in self.squeak_log:
+            del self.squeak_log[squeak_hash]
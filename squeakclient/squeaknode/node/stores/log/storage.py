@@ -0,0 +1,36 @@
+from pathlib import Path
+
+from squeakclient.squeaknode.core.data.data_dir import DATA_DIR
+from squeakclient.squeaknode.core.stores.follow_store import FollowStore
+from squeakclient.squeaknode.core.stores.key_store import KeyStore
+from squeakclient.squeaknode.core.stores.squeak_store import SqueakStore
+from squeakclient.squeaknode.core.stores.storage import Storage
+from squeakclient.squeaknode.node.stores.log.squeak_store import LogSqueakStore
+from squeakclient.squeaknode.node.stores.sqlite.database import SqliteDatabase
+from squeakclient.squeaknode.node.stores.sqlite.follow_store import SqliteFollowStore
+from squeakclient.squeaknode.node.stores.sqlite.key_store import SqliteKeyStore
+
+
+class LogStorage(Storage):
+    """Stores squeaks in an append-only log, and the signing key and
+    follows in a SQLite database, both under `data_dir`.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.squeak_store = LogSqueakStore(Path(data_dir) / 'squeaks')
+        self.database = SqliteDatabase(Path(data_dir) / 'squeaknode.db')
+        self.key_store = SqliteKeyStore(self.database)
+        self.follow_store = SqliteFollowStore(self.database)
+
+    def get_squeak_store(self) -> SqueakStore:
+        return self.squeak_store
+
+    def get_key_store(self) -> KeyStore:
+        return self.key_store
+
+    def get_follow_store(self) -> FollowStore:
+        return self.follow_store
+
+    def close(self):
+        self.squeak_store.close()
+        self.database.close()
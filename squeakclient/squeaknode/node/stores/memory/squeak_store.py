@@ -1,40 +1,193 @@
+from bisect import bisect_left
+from bisect import bisect_right
+from bisect import insort
+from typing import Dict
+from typing import Iterator
 from typing import List
 from typing import Mapping
+from typing import Tuple
 
 from squeak.core import CSqueak
 from squeak.core import CSqueakHeader
+from squeak.core import HASH_LENGTH
+from squeak.core.signing import CSqueakAddress
+from squeak.net import CInterested
 from squeak.net import CSqueakLocator
 
 from squeakclient.squeaknode.core.stores.squeak_store import SqueakStore
 
 
+EMPTY_HASH = b'\x00'*HASH_LENGTH
+MAX_HASH = b'\xff'*HASH_LENGTH
+
+
 class MemorySqueakStore(SqueakStore):
+    """Holds the squeaks in two dicts keyed by hash.
+
+    The serialized squeak headers are kept in `squeak_headers`, and the
+    rest of each serialized squeak, with the encrypted content and the
+    signature, in `squeak_contents`. Header queries only read the first
+    dict, and squeaks are only deserialized when they are requested.
+
+    Locator queries use two indexes of `(block height, hash)` entries:
+    one sorted list per author address, and one per replied-to squeak
+    hash. A block height range of an author is found by bisection, and
+    the hashes of the results are taken from the index entries.
+    """
 
     def __init__(self):
-        self.squeaks: Mapping[bytes, CSqueak] = {}
+        self.squeak_headers: Mapping[bytes, bytes] = {}
+        self.squeak_contents: Dict[bytes, bytes] = {}
+        self._author_index: Dict[bytes, List[Tuple[int, bytes]]] = {}
+        self._reply_index: Dict[bytes, List[Tuple[int, bytes]]] = {}
 
     def get_hashes(self) -> List[bytes]:
-        return list(self.squeaks.keys())
+        return list(self.squeak_headers.keys())
 
     def get_squeaks(self) -> List[CSqueak]:
-        return list(self.squeaks.values())
+        squeaks = [self._load_squeak(squeak_hash)
+                   for squeak_hash in list(self.squeak_headers)]
+        return [squeak for squeak in squeaks if squeak is not None]
 
     def get_squeak(self, squeak_hash: bytes) -> CSqueak:
-        return self.squeaks.get(squeak_hash)
+        return self._load_squeak(squeak_hash)
+
+    def get_squeaks_by_hashes(self, squeak_hashes: List[bytes]) -> Dict[bytes, CSqueak]:
+        squeaks = {squeak_hash: self._load_squeak(squeak_hash)
+                   for squeak_hash in squeak_hashes
+                   if squeak_hash in self.squeak_headers}
+        return {squeak_hash: squeak
+                for squeak_hash, squeak in squeaks.items()
+                if squeak is not None}
+
+    def has_squeak(self, squeak_hash: bytes) -> bool:
+        return squeak_hash in self.squeak_headers
+
+    def filter_missing(self, squeak_hashes: List[bytes]) -> List[bytes]:
+        return [squeak_hash for squeak_hash
+                in dict.fromkeys(squeak_hashes)
+                if squeak_hash not in self.squeak_headers]
 
     def add_squeak(self, squeak: CSqueak) -> None:
         key = squeak.GetHash()
-        self.squeaks[key] = squeak
+        if key in self.squeak_headers:
+            return
+        self._save_squeak(key, squeak)
+        entry = (squeak.nBlockHeight, key)
+        insort(self._author_index.setdefault(squeak.GetAddress(), []), entry)
+        if squeak.hashReplySqk != EMPTY_HASH:
+            insort(self._reply_index.setdefault(squeak.hashReplySqk, []), entry)
+
+    def _build_indexes(self, squeak_infos: Iterator[Tuple[bytes, CSqueakAddress, int, bytes]]) -> None:
+        """Build the indexes from `(hash, address, block height, reply
+        hash)` tuples, without loading the squeaks.
+        """
+        for squeak_hash, address, block_height, reply_hash in squeak_infos:
+            entry = (block_height, squeak_hash)
+            self._author_index.setdefault(address, []).append(entry)
+            if reply_hash != EMPTY_HASH:
+                self._reply_index.setdefault(reply_hash, []).append(entry)
+        for entries in self._author_index.values():
+            entries.sort()
+        for entries in self._reply_index.values():
+            entries.sort()
 
     def remove_squeak(self, squeak_hash: bytes) -> None:
-        del self.squeaks[squeak_hash]
+        header = self._load_header(squeak_hash)
+        if header is None:
+            raise KeyError(squeak_hash)
+        self._remove_squeak_data(squeak_hash)
+        entry = (header.nBlockHeight, squeak_hash)
+        _remove_entry(self._author_index, header.GetAddress(), entry)
+        if header.hashReplySqk != EMPTY_HASH:
+            _remove_entry(self._reply_index, header.hashReplySqk, entry)
+
+    def get_squeak_headers_created_by(
+            self,
+            created_by: CSqueakAddress,
+            min_block_height: int = -1,
+            limit: int = None,
+    ) -> List[CSqueakHeader]:
+        entries = self._author_index.get(created_by)
+        if not entries or (limit is not None and limit <= 0):
+            return []
+        start = bisect_left(entries, (min_block_height, EMPTY_HASH))
+        end = len(entries)
+        if limit is not None and start + limit < end:
+            last_height = entries[start + limit - 1][0]
+            end = bisect_right(entries, (last_height, MAX_HASH), start + limit)
+        headers = []
+        for _, squeak_hash in entries[start:end]:
+            header = self._load_header(squeak_hash)
+            if header is not None:
+                headers.append(header)
+        return headers
+
+    def get_squeak_hashes_by_locator(self, locator: CSqueakLocator) -> Iterator[Tuple[int, bytes]]:
+        seen_hashes = set()
+        for interested in locator.vInterested:
+            for entry in self._get_interested_entries(interested):
+                squeak_hash = entry[1]
+                if squeak_hash in seen_hashes or squeak_hash not in self.squeak_headers:
+                    continue
+                seen_hashes.add(squeak_hash)
+                yield entry
+
+    def get_squeak_headers_by_locator(self, locator: CSqueakLocator) -> Iterator[CSqueakHeader]:
+        for _, squeak_hash in self.get_squeak_hashes_by_locator(locator):
+            header = self._load_header(squeak_hash)
+            if header is not None:
+                yield header
+
+    def _get_interested_entries(self, interested: CInterested) -> List[Tuple[int, bytes]]:
+        """Get a copy of the index entries of the squeaks that match the
+        interest, in block height order.
+        """
+        if interested.hashReplySqk != EMPTY_HASH:
+            entries = self._reply_index.get(interested.hashReplySqk, [])[:]
+            return [entry for entry in entries
+                    if self._entry_in_interested(entry, interested)]
+        entries = self._author_index.get(interested.address)
+        if not entries:
+            return []
+        start = 0
+        end = len(entries)
+        if interested.nMinBlockHeight != -1:
+            start = bisect_left(entries, (interested.nMinBlockHeight, EMPTY_HASH))
+        if interested.nMaxBlockHeight != -1:
+            end = bisect_right(entries, (interested.nMaxBlockHeight, MAX_HASH))
+        return entries[start:end]
+
+    def _entry_in_interested(self, entry: Tuple[int, bytes], interested: CInterested) -> bool:
+        header = self._load_header(entry[1])
+        return header is not None and self._squeak_in_interested(header, interested)
+
+    def _load_header(self, squeak_hash: bytes) -> CSqueakHeader:
+        header_data = self.squeak_headers.get(squeak_hash)
+        if header_data is None:
+            return None
+        return CSqueakHeader.deserialize(header_data)
+
+    def _load_squeak(self, squeak_hash: bytes) -> CSqueak:
+        header_data = self.squeak_headers.get(squeak_hash)
+        content_data = self.squeak_contents.get(squeak_hash)
+        if header_data is None or content_data is None:
+            return None
+        return CSqueak.deserialize(header_data + content_data)
+
+    def _save_squeak(self, squeak_hash: bytes, squeak: CSqueak) -> None:
+        """Save the serialized header, and the part of the squeak after it."""
+        header_data = squeak.get_header().serialize()
+        self.squeak_contents[squeak_hash] = squeak.serialize()[len(header_data):]
+        self.squeak_headers[squeak_hash] = header_data
+
+    def _remove_squeak_data(self, squeak_hash: bytes) -> None:
+        self.squeak_headers.pop(squeak_hash, None)
+        self.squeak_contents.pop(squeak_hash, None)
 
-    def get_squeak_headers_created_by(self, created_by: bytes) -> List[CSqueakHeader]:
-        return [saved_squeak for saved_squeak
-                in self.squeaks
-                if saved_squeak.squeak.vchPubkey == created_by]
 
-    def get_squeaks_by_locator(self, locator: CSqueakLocator) -> List[CSqueak]:
-        return [squeak for hash, squeak
-                in self.squeaks.items()
-                if self._squeak_in_locator(squeak, locator)]
+def _remove_entry(index, key, entry):
+    entries = index[key]
+    del entries[bisect_left(entries, entry)]
+    if not entries:
+        del index[key]
@@ -0,0 +1,112 @@
+import sqlite3
+import threading
+import weakref
+from pathlib import Path
+
+from squeakclient.squeaknode.core.data.data_dir import DATA_DIR
+
+
+SQLITE_DB_FILE = Path(DATA_DIR) / 'squeaknode.db'
+SQLITE_TIMEOUT = 10
+
+SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS squeak (
+        hash BLOB PRIMARY KEY,
+        author_address TEXT NOT NULL,
+        block_height INTEGER NOT NULL,
+        reply_hash BLOB NOT NULL,
+        time INTEGER NOT NULL,
+        header BLOB NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    'CREATE INDEX IF NOT EXISTS squeak_author_height ON squeak (author_address, block_height)',
+    'CREATE INDEX IF NOT EXISTS squeak_height ON squeak (block_height)',
+    'CREATE INDEX IF NOT EXISTS squeak_reply_hash ON squeak (reply_hash)',
+    'CREATE INDEX IF NOT EXISTS squeak_time ON squeak (time)',
+    # The rest of each serialized squeak after its header. The content is
+    # kept out of the squeak table, so header queries and index lookups
+    # only read the small rows.
+    '''
+    CREATE TABLE IF NOT EXISTS squeak_content (
+        hash BLOB PRIMARY KEY,
+        content BLOB NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS signing_key (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        signing_key TEXT NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS follow (
+        address TEXT PRIMARY KEY
+    )
+    ''',
+]
+
+
+class ThreadConnection(object):
+    """Holds the connection of a thread in its thread-local storage."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+
+class SqliteDatabase(object):
+    """A SQLite database file, with one connection for each thread.
+
+    The database is opened in WAL mode, so readers on other threads are
+    not blocked while a thread writes. Statements are written with
+    parameters, so each connection prepares them once and reuses them
+    from its statement cache.
+
+    A connection is closed when its thread exits and the thread-local
+    storage that holds it is freed, so short-lived peer and RPC threads
+    do not leave open connections behind.
+    """
+
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        self.db_file = db_file
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        with self.connection as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    @property
+    def connection(self):
+        """Get the connection of the current thread."""
+        holder = getattr(self._local, 'holder', None)
+        if holder is None:
+            conn = self._connect()
+            holder = ThreadConnection(conn)
+            weakref.finalize(holder, self._release, conn)
+            self._local.holder = holder
+        return holder.connection
+
+    def _connect(self):
+        Path(self.db_file).parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_file), timeout=SQLITE_TIMEOUT, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _release(self, conn):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Close the connections of every thread."""
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
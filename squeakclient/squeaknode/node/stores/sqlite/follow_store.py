@@ -0,0 +1,23 @@
+from typing import List
+
+from squeak.core.signing import CSqueakAddress
+
+from squeakclient.squeaknode.core.stores.follow_store import FollowStore
+
+
+class SqliteFollowStore(FollowStore):
+
+    def __init__(self, database):
+        self.database = database
+
+    def get_follows(self) -> List[CSqueakAddress]:
+        rows = self.database.connection.execute('SELECT address FROM follow')
+        return [CSqueakAddress(row[0]) for row in rows]
+
+    def add_follow(self, follow: CSqueakAddress) -> None:
+        with self.database.connection as conn:
+            conn.execute('INSERT OR IGNORE INTO follow VALUES (?)', (str(follow),))
+
+    def remove_follow(self, follow: CSqueakAddress) -> None:
+        with self.database.connection as conn:
+            conn.execute('DELETE FROM follow WHERE address = ?', (str(follow),))
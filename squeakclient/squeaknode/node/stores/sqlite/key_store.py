@@ -0,0 +1,28 @@
+from typing import Optional
+
+from squeak.core.signing import CSigningKey
+
+from squeakclient.squeaknode.core.stores.key_store import KeyStore
+
+
+class SqliteKeyStore(KeyStore):
+
+    def __init__(self, database):
+        self.database = database
+
+    def get_signing_key(self) -> Optional[CSigningKey]:
+        row = self.database.connection.execute(
+            'SELECT signing_key FROM signing_key WHERE id = 0',
+        ).fetchone()
+        return CSigningKey(row[0]) if row else None
+
+    def set_signing_key(self, signing_key: CSigningKey) -> None:
+        with self.database.connection as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO signing_key VALUES (0, ?)',
+                (str(signing_key),),
+            )
+
+    def remove_signing_key(self) -> None:
+        with self.database.connection as conn:
+            conn.execute('DELETE FROM signing_key')
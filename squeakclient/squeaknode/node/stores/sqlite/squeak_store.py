@@ -0,0 +1,161 @@
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Tuple
+
+from squeak.core import CSqueak
+from squeak.core import CSqueakHeader
+from squeak.core import HASH_LENGTH
+from squeak.core.signing import CSqueakAddress
+from squeak.net import CInterested
+from squeak.net import CSqueakLocator
+
+from squeakclient.squeaknode.core.stores.squeak_store import SqueakStore
+
+
+# Lower than the default SQLITE_MAX_VARIABLE_NUMBER of old SQLite versions.
+MAX_QUERY_PARAMS = 500
+
+
+class SqliteSqueakStore(SqueakStore):
+
+    def __init__(self, database):
+        self.database = database
+
+    def get_hashes(self) -> List[bytes]:
+        rows = self.database.connection.execute('SELECT hash FROM squeak')
+        return [row[0] for row in rows]
+
+    def get_squeaks(self) -> List[CSqueak]:
+        rows = self.database.connection.execute(
+            'SELECT header, content FROM squeak JOIN squeak_content USING (hash)')
+        return [CSqueak.deserialize(header + content) for header, content in rows]
+
+    def get_squeak(self, squeak_hash: bytes) -> CSqueak:
+        row = self.database.connection.execute(
+            'SELECT header, content FROM squeak JOIN squeak_content USING (hash) '
+            'WHERE hash = ?',
+            (squeak_hash,),
+        ).fetchone()
+        return CSqueak.deserialize(row[0] + row[1]) if row else None
+
+    def get_squeaks_by_hashes(self, squeak_hashes: List[bytes]) -> Dict[bytes, CSqueak]:
+        return {
+            squeak_hash: CSqueak.deserialize(header + content)
+            for squeak_hash, header, content
+            in self._select_by_hashes(
+                'hash, header, content',
+                squeak_hashes,
+                'squeak JOIN squeak_content USING (hash)',
+            )
+        }
+
+    def has_squeak(self, squeak_hash: bytes) -> bool:
+        row = self.database.connection.execute(
+            'SELECT 1 FROM squeak WHERE hash = ?',
+            (squeak_hash,),
+        ).fetchone()
+        return row is not None
+
+    def filter_missing(self, squeak_hashes: List[bytes]) -> List[bytes]:
+        saved_hashes = {row[0] for row in self._select_by_hashes('hash', squeak_hashes)}
+        return [squeak_hash for squeak_hash
+                in dict.fromkeys(squeak_hashes)
+                if squeak_hash not in saved_hashes]
+
+    def add_squeak(self, squeak: CSqueak) -> None:
+        squeak_hash = squeak.GetHash()
+        header = squeak.get_header().serialize()
+        with self.database.connection as conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO squeak VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    squeak_hash,
+                    str(squeak.GetAddress()),
+                    squeak.nBlockHeight,
+                    squeak.hashReplySqk,
+                    squeak.nTime,
+                    header,
+                ),
+            )
+            if cursor.rowcount:
+                conn.execute(
+                    'INSERT OR REPLACE INTO squeak_content VALUES (?, ?)',
+                    (squeak_hash, squeak.serialize()[len(header):]),
+                )
+
+    def remove_squeak(self, squeak_hash: bytes) -> None:
+        with self.database.connection as conn:
+            conn.execute('DELETE FROM squeak WHERE hash = ?', (squeak_hash,))
+            conn.execute('DELETE FROM squeak_content WHERE hash = ?', (squeak_hash,))
+
+    def get_squeak_headers_created_by(
+            self,
+            created_by: CSqueakAddress,
+            min_block_height: int = -1,
+            limit: int = None,
+    ) -> List[CSqueakHeader]:
+        if limit is not None and limit <= 0:
+            return []
+        conn = self.database.connection
+        address = str(created_by)
+        rows = conn.execute(
+            'SELECT block_height, hash, header FROM squeak '
+            'WHERE author_address = ? AND block_height >= ? '
+            'ORDER BY block_height, hash LIMIT ?',
+            (address, min_block_height, -1 if limit is None else limit),
+        ).fetchall()
+        if rows and len(rows) == limit:
+            last_height, last_hash, _ = rows[-1]
+            rows += conn.execute(
+                'SELECT block_height, hash, header FROM squeak '
+                'WHERE author_address = ? AND block_height = ? AND hash > ? '
+                'ORDER BY hash',
+                (address, last_height, last_hash),
+            ).fetchall()
+        return [CSqueakHeader.deserialize(header) for _, _, header in rows]
+
+    def get_squeak_hashes_by_locator(self, locator: CSqueakLocator) -> Iterator[Tuple[int, bytes]]:
+        for squeak_hash, block_height in self._select_by_locator('hash, block_height', locator):
+            yield block_height, squeak_hash
+
+    def get_squeak_headers_by_locator(self, locator: CSqueakLocator) -> Iterator[CSqueakHeader]:
+        for _, header in self._select_by_locator('hash, header', locator):
+            yield CSqueakHeader.deserialize(header)
+
+    def _select_by_locator(self, columns, locator: CSqueakLocator):
+        """Generate the rows of the squeaks that match the locator. The
+        first column must be the hash.
+        """
+        seen_hashes = set()
+        for interested in locator.vInterested:
+            query, params = self._interested_query(columns, interested)
+            for row in self.database.connection.execute(query, params):
+                if row[0] in seen_hashes:
+                    continue
+                seen_hashes.add(row[0])
+                yield row
+
+    def _interested_query(self, columns, interested: CInterested):
+        conditions = ['author_address = ?']
+        params = [str(interested.address)]
+        if interested.nMinBlockHeight != -1:
+            conditions.append('block_height >= ?')
+            params.append(interested.nMinBlockHeight)
+        if interested.nMaxBlockHeight != -1:
+            conditions.append('block_height <= ?')
+            params.append(interested.nMaxBlockHeight)
+        if interested.hashReplySqk != b'\x00'*HASH_LENGTH:
+            conditions.append('reply_hash = ?')
+            params.append(interested.hashReplySqk)
+        query = 'SELECT {} FROM squeak WHERE {} ORDER BY block_height'.format(
+            columns, ' AND '.join(conditions))
+        return query, params
+
+    def _select_by_hashes(self, columns, squeak_hashes, tables='squeak'):
+        conn = self.database.connection
+        for i in range(0, len(squeak_hashes), MAX_QUERY_PARAMS):
+            chunk = squeak_hashes[i:i + MAX_QUERY_PARAMS]
+            query = 'SELECT {} FROM {} WHERE hash IN ({})'.format(
+                columns, tables, ', '.join('?' * len(chunk)))
+            yield from conn.execute(query, chunk)
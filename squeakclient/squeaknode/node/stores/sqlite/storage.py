@@ -0,0 +1,30 @@
+from squeakclient.squeaknode.core.stores.follow_store import FollowStore
+from squeakclient.squeaknode.core.stores.key_store import KeyStore
+from squeakclient.squeaknode.core.stores.squeak_store import SqueakStore
+from squeakclient.squeaknode.core.stores.storage import Storage
+from squeakclient.squeaknode.node.stores.sqlite.database import SQLITE_DB_FILE
+from squeakclient.squeaknode.node.stores.sqlite.database import SqliteDatabase
+from squeakclient.squeaknode.node.stores.sqlite.follow_store import SqliteFollowStore
+from squeakclient.squeaknode.node.stores.sqlite.key_store import SqliteKeyStore
+from squeakclient.squeaknode.node.stores.sqlite.squeak_store import SqliteSqueakStore
+
+
+class SqliteStorage(Storage):
+
+    def __init__(self, db_file=SQLITE_DB_FILE):
+        self.database = SqliteDatabase(db_file)
+        self.squeak_store = SqliteSqueakStore(self.database)
+        self.key_store = SqliteKeyStore(self.database)
+        self.follow_store = SqliteFollowStore(self.database)
+
+    def get_squeak_store(self) -> SqueakStore:
+        return self.squeak_store
+
+    def get_key_store(self) -> KeyStore:
+        return self.key_store
+
+    def get_follow_store(self) -> FollowStore:
+        return self.follow_store
+
+    def close(self):
+        self.database.close()
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+
+TICK_INTERVAL = 1.0
+WHEEL_SIZE = 512
+
+
+logger = logging.getLogger(__name__)
+
+
+class Timer(object):
+    """A callback scheduled on a `TimerWheel`."""
+
+    def __init__(self, callback, args, rounds):
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel(object):
+    """Runs scheduled callbacks from a single thread.
+
+    Timers are kept in a hashed wheel of `wheel_size` slots, each one
+    `tick` seconds long. Scheduling and cancelling a timer take constant
+    time, and every tick only visits the timers in the current slot, so
+    the wheel stays cheap with thousands of peers. Timers fire up to one
+    tick late.
+    """
+
+    def __init__(self, tick=TICK_INTERVAL, wheel_size=WHEEL_SIZE):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self._slots = [[] for _ in range(wheel_size)]
+        self._current_slot = 0
+        self._lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def schedule(self, delay, callback, *args):
+        """Call `callback(*args)` after `delay` seconds, and return the
+        `Timer`.
+        """
+        ticks = max(int(delay / self.tick + 0.5), 1)
+        rounds, offset = divmod(ticks, self.wheel_size)
+        if offset == 0:
+            rounds, offset = rounds - 1, self.wheel_size
+        timer = Timer(callback, args, rounds)
+        with self._lock:
+            slot = (self._current_slot + offset) % self.wheel_size
+            self._slots[slot].append(timer)
+        return timer
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        next_tick = time.monotonic() + self.tick
+        while not self.stopped.wait(max(next_tick - time.monotonic(), 0)):
+            next_tick += self.tick
+            self.advance()
+
+    def advance(self):
+        """Move the wheel forward by one tick, and run the expired timers."""
+        with self._lock:
+            self._current_slot = (self._current_slot + 1) % self.wheel_size
+            slot = self._slots[self._current_slot]
+            expired = [timer for timer in slot if not timer.cancelled and timer.rounds == 0]
+            pending = [timer for timer in slot if not timer.cancelled and timer.rounds > 0]
+            for timer in pending:
+                timer.rounds -= 1
+            self._slots[self._current_slot] = pending
+        for timer in expired:
+            try:
+                timer.callback(*timer.args)
+            except Exception:
+                logger.exception('Error in timer callback {}'.format(timer.callback))
@@ -138,6 +138,19 @@ class RouteGuideServicer(route_guide_pb2_grpc.RouteGuideServicer):
                     host=peer.address[0],
                     port=peer.address[1],
                 ),
+                bytes_sent=peer.bytes_sent,
+                bytes_recv=peer.bytes_recv,
+                inbound=not peer.outgoing,
+                ping_time=int((peer.ping_time or 0) * 1000000),
+                handshake_time=int((peer.handshake_time or 0) * 1000000),
+                send_queue_msgs=peer.send_queue_len,
+                send_queue_bytes=peer.send_queue_bytes,
+                recv_queue_msgs=peer.recv_queue_len,
+                recv_queue_bytes=peer.recv_queue_bytes,
+                recv_queue_high_water_msgs=peer.recv_queue_high_water_msgs,
+                recv_queue_high_water_bytes=peer.recv_queue_high_water_bytes,
+                known_inv_duplicates_saved=peer.known_inventory.duplicates_saved,
+                command_traffic=command_traffic_msgs(peer.bandwidth.traffic.get_stats()),
             )
             for peer in peers
         ]
@@ -165,6 +178,48 @@ class RouteGuideServicer(route_guide_pb2_grpc.RouteGuideServicer):
             address=str(address),
         )
 
+    def GetMessageStats(self, request, context):
+        message_stats = self.node.get_message_stats()
+        command_stats_msgs = [
+            route_guide_pb2.CommandStats(
+                command=command.decode('ascii'),
+                count=stats.count,
+                total_time=stats.total_time,
+            )
+            for command, stats in message_stats.items()
+        ]
+        return route_guide_pb2.GetMessageStatsResponse(
+            command_stats=command_stats_msgs,
+        )
+
+    def GetDownloadStats(self, request, context):
+        download_stats = self.node.get_download_stats()
+        return route_guide_pb2.GetDownloadStatsResponse(
+            requested=download_stats.requested,
+            received=download_stats.received,
+            duplicates=download_stats.duplicates,
+            timeouts=download_stats.timeouts,
+            bytes_downloaded=download_stats.bytes_downloaded,
+            bytes_useful=download_stats.bytes_useful,
+        )
+
+    def GetTrafficStats(self, request, context):
+        traffic_stats = self.node.get_traffic_stats()
+        return route_guide_pb2.GetTrafficStatsResponse(
+            command_traffic=command_traffic_msgs(traffic_stats),
+        )
+
+    def GetDialStats(self, request, context):
+        dial_stats = self.node.get_dial_stats()
+        return route_guide_pb2.GetDialStatsResponse(
+            attempts=dial_stats.attempts,
+            successes=dial_stats.successes,
+            failures=dial_stats.failures,
+            average_latency=dial_stats.average_latency,
+            in_flight=dial_stats.in_flight,
+            backing_off=dial_stats.backing_off,
+        )
+
     def serve(self):
         server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
         route_guide_pb2_grpc.add_RouteGuideServicer_to_server(
@@ -172,3 +227,17 @@ class RouteGuideServicer(route_guide_pb2_grpc.RouteGuideServicer):
         server.add_insecure_port('0.0.0.0:50051')
         server.start()
         server.wait_for_termination()
+
+
+def command_traffic_msgs(traffic_stats):
+    return [
+        route_guide_pb2.CommandTraffic(
+            command=command.decode('ascii'),
+            msgs_sent=traffic.msgs_sent,
+            bytes_sent=traffic.bytes_sent,
+            msgs_recv=traffic.msgs_recv,
+            bytes_recv=traffic.bytes_recv,
+            msgs_dropped=traffic.msgs_dropped,
+        )
+        for command, traffic in traffic_stats.items()
+    ]
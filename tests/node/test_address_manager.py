@@ -0,0 +1,55 @@
+from squeakclient.squeaknode.node.address_manager import AddressManager
+from squeakclient.squeaknode.node.address_manager import MAX_ADDRESSES_PER_SOURCE
+
+
+ADDRESS = ('10.1.2.3', 8555)
+SOURCE = '192.168.0.1'
+
+
+class TestAddressManager(object):
+
+    def test_add_addresses(self, tmp_path):
+        address_manager = AddressManager(tmp_path / 'peers.json')
+
+        assert address_manager.add_addresses([ADDRESS], SOURCE) == 1
+        assert address_manager.add_addresses([ADDRESS], SOURCE) == 0
+        assert address_manager.get_addresses() == [ADDRESS]
+        assert address_manager.num_new == 1
+
+    def test_limit_addresses_per_source(self, tmp_path):
+        address_manager = AddressManager(tmp_path / 'peers.json')
+        addresses = [('10.{}.0.1'.format(i), 8555) for i in range(MAX_ADDRESSES_PER_SOURCE + 10)]
+
+        address_manager.add_addresses(addresses, SOURCE)
+
+        assert len(address_manager) == MAX_ADDRESSES_PER_SOURCE
+
+    def test_mark_good(self, tmp_path):
+        address_manager = AddressManager(tmp_path / 'peers.json')
+        address_manager.add_addresses([ADDRESS], SOURCE)
+
+        address_manager.mark_good(ADDRESS)
+
+        assert address_manager.num_new == 0
+        assert address_manager.num_tried == 1
+
+    def test_select(self, tmp_path):
+        address_manager = AddressManager(tmp_path / 'peers.json')
+        other_address = ('10.5.6.7', 8555)
+        address_manager.add_addresses([ADDRESS, other_address], SOURCE)
+
+        assert address_manager.select(2, exclude=[ADDRESS]) == [other_address]
+
+    def test_save_and_load(self, tmp_path):
+        peers_file = tmp_path / 'peers.json'
+        address_manager = AddressManager(peers_file)
+        address_manager.add_addresses([ADDRESS], SOURCE)
+        address_manager.mark_good(ADDRESS)
+        address_manager.add_addresses([('10.5.6.7', 8555)], SOURCE)
+        address_manager.save()
+
+        loaded = AddressManager(peers_file)
+        loaded.load()
+
+        assert loaded.num_tried == 1
+        assert loaded.num_new == 1
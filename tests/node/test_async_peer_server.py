@@ -0,0 +1,78 @@
+import socket
+import time
+
+import pytest
+from squeak.messages import msg_ping
+
+from squeakclient.squeaknode.node.clientsqueaknode import ClientSqueakNode
+from squeakclient.squeaknode.node.stores.memory.storage import MemoryStorage
+
+
+TIMEOUT = 5
+
+
+class MockPeerHandler(object):
+
+    def __init__(self, node):
+        self.node = node
+
+
+@pytest.fixture
+def nodes():
+    nodes = [
+        ClientSqueakNode(MemoryStorage(), None, None, peer_transport='asyncio', port=free_port())
+        for _ in range(2)
+    ]
+    for node in nodes:
+        node.timer_wheel.start()
+        node.peer_server.start(MockPeerHandler(node))
+    yield nodes
+    for node in nodes:
+        node.peer_server.stop()
+        node.timer_wheel.stop()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.01)
+
+
+def send_ping(peer, nonce):
+    peer.set_last_sent_ping(nonce)
+    peer.send_msg(msg_ping(nonce=nonce))
+
+
+class TestAsyncPeerServer(object):
+
+    def test_loopback_connection(self, nodes):
+        node_a, node_b = nodes
+        wait_for(lambda: node_b.peer_server.server is not None)
+
+        node_a.peer_server.connect_address(('127.0.0.1', node_b.peer_server.port))
+        wait_for(lambda: node_a.connection_manager.peers and node_b.connection_manager.peers)
+        peer_a = node_a.connection_manager.peers[0]
+        peer_b = node_b.connection_manager.peers[0]
+
+        assert peer_a.is_handshake_complete and peer_a.outgoing
+        assert peer_b.is_handshake_complete and not peer_b.outgoing
+
+        send_ping(peer_a, 1)
+        send_ping(peer_b, 2)
+        wait_for(lambda: not peer_a.ping_pending and not peer_b.ping_pending)
+
+        assert peer_a.ping_time is not None
+        assert peer_b.ping_time is not None
+
+        peer_a.stop()
+        wait_for(lambda: peer_b.stopped.is_set() and not node_b.connection_manager.has_connection(peer_b.address))
+
+        wait_for(lambda: not node_a.connection_manager.has_connection(peer_a.address))
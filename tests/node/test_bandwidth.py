@@ -0,0 +1,41 @@
+from squeakclient.squeaknode.node.bandwidth import BandwidthManager
+from squeakclient.squeaknode.node.bandwidth import PEER_RECV_BYTES_PER_SEC
+from squeakclient.squeaknode.node.bandwidth import TokenBucket
+
+
+class TestTokenBucket(object):
+
+    def test_consume(self):
+        bucket = TokenBucket(rate=0.001, capacity=2)
+
+        assert bucket.consume()
+        assert bucket.consume()
+        assert not bucket.consume()
+
+    def test_reserve(self):
+        bucket = TokenBucket(rate=100, capacity=100)
+
+        assert bucket.reserve(100) == 0
+        assert 0.4 < bucket.reserve(50) <= 0.5
+
+
+class TestPeerBandwidth(object):
+
+    def test_count_traffic(self):
+        manager = BandwidthManager()
+        peer_bandwidth = manager.new_peer_bandwidth()
+
+        peer_bandwidth.recv_delay(b'ping', 32)
+        peer_bandwidth.traffic.record_sent(b'pong', 32)
+
+        assert peer_bandwidth.traffic.bytes_recv == 32
+        assert peer_bandwidth.traffic.bytes_sent == 32
+        stats = manager.traffic.get_stats()
+        assert stats[b'ping'].msgs_recv == 1
+        assert stats[b'pong'].bytes_sent == 32
+
+    def test_delay_over_recv_limit(self):
+        peer_bandwidth = BandwidthManager().new_peer_bandwidth()
+
+        assert peer_bandwidth.recv_delay(b'squeak', PEER_RECV_BYTES_PER_SEC) == 0
+        assert peer_bandwidth.recv_delay(b'squeak', PEER_RECV_BYTES_PER_SEC * 2) > 0.9
@@ -0,0 +1,45 @@
+import zlib
+
+import pytest
+from squeak.messages import msg_ping
+
+from squeakclient.squeaknode.node.compression import CODEC_ZLIB
+from squeakclient.squeaknode.node.compression import CODEC_ZSTD
+from squeakclient.squeaknode.node.compression import compress_batch
+from squeakclient.squeaknode.node.compression import CompressionError
+from squeakclient.squeaknode.node.compression import decompress_batch
+from squeakclient.squeaknode.node.compression import MAX_ZBATCH_DATA_LEN
+from squeakclient.squeaknode.node.compression import negotiate_codec
+from squeakclient.squeaknode.node.compression import NODE_ZBATCH
+from squeakclient.squeaknode.node.compression import NODE_ZBATCH_ZSTD
+from squeakclient.squeaknode.node.peer import MSG_HEADER_LEN
+
+
+NODE_NETWORK = 1
+
+
+class TestCompression(object):
+
+    def test_negotiate_codec(self):
+        assert negotiate_codec(NODE_NETWORK | NODE_ZBATCH, NODE_NETWORK) is None
+        assert negotiate_codec(NODE_ZBATCH, NODE_ZBATCH | NODE_ZBATCH_ZSTD) == CODEC_ZLIB
+        assert negotiate_codec(NODE_ZBATCH | NODE_ZBATCH_ZSTD, NODE_ZBATCH | NODE_ZBATCH_ZSTD) == CODEC_ZSTD
+
+    def test_compress_round_trip(self):
+        msgs_data = [msg_ping(nonce=nonce).to_bytes() for nonce in range(10)]
+
+        data = compress_batch(msgs_data, CODEC_ZLIB)
+
+        assert decompress_batch(data[MSG_HEADER_LEN:]) == b''.join(msgs_data)
+
+    def test_reject_oversized_payload(self):
+        payload = bytes([CODEC_ZLIB]) + zlib.compress(bytes(MAX_ZBATCH_DATA_LEN + 1))
+
+        with pytest.raises(CompressionError):
+            decompress_batch(payload)
+
+    def test_reject_invalid_payload(self):
+        with pytest.raises(CompressionError):
+            decompress_batch(bytes([CODEC_ZLIB]) + b'not compressed')
+        with pytest.raises(CompressionError):
+            decompress_batch(bytes([7]) + zlib.compress(b'data'))
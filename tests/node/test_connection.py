@@ -0,0 +1,142 @@
+import threading
+from unittest import mock
+
+import pytest
+from squeak.messages import msg_verack
+from squeak.messages import msg_version
+
+from squeakclient.squeaknode.node.connection import Connection
+from squeakclient.squeaknode.node.connection import HANDSHAKE_TIMEOUT
+from squeakclient.squeaknode.node.connection_manager import ConnectionManager
+from squeakclient.squeaknode.node.connection_manager import DuplicatePeerError
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
+
+
+class MockFrame(object):
+
+    def __init__(self, msg):
+        self.command = msg.command
+        self.msg = msg
+
+    def deserialize(self):
+        return self.msg
+
+
+class MockPeer(object):
+
+    def __init__(self, address, outgoing):
+        self.address = address
+        self.outgoing = outgoing
+        self.local_version = None
+        self.remote_version = None
+        self.handshake_time = None
+        self.handshake_complete = threading.Event()
+        self.stopped = threading.Event()
+        self.sent_msgs = []
+
+    @property
+    def is_handshake_complete(self):
+        return self.handshake_complete.is_set()
+
+    def set_handshake_time(self, handshake_time):
+        self.handshake_time = handshake_time
+
+    def send_msg(self, msg):
+        self.sent_msgs.append(msg)
+
+    def stop(self):
+        self.stopped.set()
+
+
+@pytest.fixture
+def node():
+    node = mock.Mock()
+    node.address = ('127.0.0.1', 18555)
+    node.connection_manager = ConnectionManager()
+    node.timer_wheel = TimerWheel(tick=1, wheel_size=8)
+    return node
+
+
+def make_version(nonce):
+    msg = msg_version()
+    msg.nNonce = nonce
+    return msg
+
+
+class TestConnection(object):
+
+    def test_peer_added_after_handshake(self, node):
+        peer = MockPeer(('127.0.0.2', 18555), outgoing=False)
+        connection = Connection(peer, node)
+        connection.open()
+        connection.start_handshake()
+
+        assert node.connection_manager.has_connection(peer.address)
+        assert node.connection_manager.peers == []
+
+        connection.handle_handshake_msg(MockFrame(make_version(1)))
+        connection.handle_handshake_msg(MockFrame(msg_verack()))
+
+        assert peer.is_handshake_complete
+        assert peer.handshake_time is not None
+        assert node.connection_manager.peers == [peer]
+        assert node.connection_manager.pending_peers == []
+
+        connection.close()
+        assert not node.connection_manager.has_connection(peer.address)
+
+    def test_handshake_timeout(self, node):
+        peer = MockPeer(('127.0.0.2', 18555), outgoing=True)
+        connection = Connection(peer, node)
+        connection.open()
+        connection.start_handshake()
+
+        for _ in range(HANDSHAKE_TIMEOUT):
+            node.timer_wheel.advance()
+
+        assert peer.stopped.is_set()
+        connection.close()
+        assert node.connection_manager.pending_peers == []
+
+    def test_no_timeout_after_handshake(self, node):
+        peer = MockPeer(('127.0.0.2', 18555), outgoing=True)
+        connection = Connection(peer, node)
+        connection.open()
+        connection.start_handshake()
+        connection.handle_handshake_msg(MockFrame(msg_verack()))
+        connection.handle_handshake_msg(MockFrame(make_version(1)))
+
+        for _ in range(HANDSHAKE_TIMEOUT):
+            node.timer_wheel.advance()
+
+        assert peer.is_handshake_complete
+        assert not peer.stopped.is_set()
+
+    def test_reject_self_connection(self, node):
+        outgoing_peer = MockPeer(('127.0.0.1', 18555), outgoing=True)
+        outgoing_connection = Connection(outgoing_peer, node)
+        outgoing_connection.open()
+        outgoing_connection.start_handshake()
+        local_nonce = outgoing_peer.local_version.nNonce
+
+        incoming_peer = MockPeer(('127.0.0.1', 40000), outgoing=False)
+        incoming_connection = Connection(incoming_peer, node)
+        incoming_connection.open()
+        incoming_connection.start_handshake()
+
+        with pytest.raises(Exception):
+            incoming_connection.handle_handshake_msg(MockFrame(make_version(local_nonce)))
+
+        outgoing_connection.close()
+        assert not node.connection_manager.is_local_nonce(local_nonce)
+
+
+class TestConnectionManager(object):
+
+    def test_duplicate_pending_peer(self):
+        connection_manager = ConnectionManager()
+        peer = MockPeer(('127.0.0.2', 18555), outgoing=True)
+        connection_manager.add_pending_peer(peer)
+
+        with pytest.raises(DuplicatePeerError):
+            connection_manager.add_pending_peer(MockPeer(peer.address, outgoing=False))
@@ -0,0 +1,80 @@
+import socket
+import threading
+
+from squeakclient.squeaknode.node.dialer import DialTracker
+from squeakclient.squeaknode.node.dialer import Dialer
+
+
+ADDRESS = ('127.0.0.1', 5678)
+
+
+class TestDialTracker(object):
+
+    def test_skip_in_flight_dial(self):
+        tracker = DialTracker()
+
+        assert tracker.start_dial(ADDRESS)
+        assert not tracker.start_dial(ADDRESS)
+
+        tracker.finish_dial(ADDRESS, True, 0.1)
+
+        assert tracker.start_dial(ADDRESS)
+
+    def test_back_off_after_failure(self):
+        tracker = DialTracker()
+        tracker.start_dial(ADDRESS)
+        tracker.finish_dial(ADDRESS, False, 0.1)
+
+        assert not tracker.start_dial(ADDRESS)
+        assert tracker.start_dial(('127.0.0.1', 5679))
+
+    def test_stats(self):
+        tracker = DialTracker()
+        tracker.start_dial(ADDRESS)
+        tracker.finish_dial(ADDRESS, True, 0.2)
+        tracker.start_dial(('127.0.0.1', 5679))
+        tracker.finish_dial(('127.0.0.1', 5679), False, 1.0)
+
+        stats = tracker.get_stats()
+
+        assert stats.attempts == 2
+        assert stats.successes == 1
+        assert stats.failures == 1
+        assert stats.average_latency == 0.2
+        assert stats.in_flight == 0
+        assert stats.backing_off == 1
+
+
+class TestDialer(object):
+
+    def test_dial(self):
+        listen_socket = socket.socket()
+        listen_socket.bind(('127.0.0.1', 0))
+        listen_socket.listen()
+        address = listen_socket.getsockname()
+        connected = []
+        dialer = Dialer()
+
+        dialer.dial(address, lambda peer_socket, address: connected.append(address))
+        dialer.executor.shutdown(wait=True)
+        listen_socket.close()
+
+        assert connected == [address]
+        assert dialer.get_stats().successes == 1
+
+    def test_skip_dial_when_busy(self):
+        listen_socket = socket.socket()
+        listen_socket.bind(('127.0.0.1', 0))
+        listen_socket.listen()
+        address = listen_socket.getsockname()
+        release = threading.Event()
+        dialer = Dialer(max_dials=1)
+
+        assert dialer.dial(address, lambda peer_socket, address: release.wait(5))
+        assert not dialer.dial(('127.0.0.1', 5679), lambda peer_socket, address: None)
+        release.set()
+        dialer.executor.shutdown(wait=True)
+        listen_socket.close()
+
+        assert dialer.get_stats().attempts == 1
+        assert dialer._pending == 0
@@ -0,0 +1,135 @@
+import threading
+
+from squeakclient.squeaknode.node.download_scheduler import DownloadScheduler
+from squeakclient.squeaknode.node.download_scheduler import GETDATA_TIMEOUT
+from squeakclient.squeaknode.node.download_scheduler import MAX_PEER_IN_FLIGHT
+from squeakclient.squeaknode.node.download_scheduler import MIN_PEER_IN_FLIGHT
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
+
+
+HASH_A = b'a' * 32
+HASH_B = b'b' * 32
+
+
+class MockPeer(object):
+
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.sent_msgs = []
+
+    def send_msg(self, msg):
+        self.sent_msgs.append(msg)
+
+
+def requested_hashes(peer):
+    return [inv.hash for msg in peer.sent_msgs for inv in msg.inv]
+
+
+class TestDownloadScheduler(object):
+
+    def test_request_from_one_peer(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer_1, peer_2 = MockPeer(), MockPeer()
+
+        scheduler.add_announcements(peer_1, [HASH_A])
+        scheduler.add_announcements(peer_2, [HASH_A, HASH_B])
+
+        assert requested_hashes(peer_1) == [HASH_A]
+        assert requested_hashes(peer_2) == [HASH_B]
+
+    def test_reassign_on_notfound(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer_1, peer_2 = MockPeer(), MockPeer()
+        scheduler.add_announcements(peer_1, [HASH_A])
+        scheduler.add_announcements(peer_2, [HASH_A])
+
+        scheduler.not_found(peer_1, [HASH_A])
+
+        assert requested_hashes(peer_2) == [HASH_A]
+
+    def test_reassign_on_disconnect(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer_1, peer_2 = MockPeer(), MockPeer()
+        scheduler.add_announcements(peer_1, [HASH_A])
+        scheduler.add_announcements(peer_2, [HASH_A])
+
+        peer_1.stopped.set()
+        scheduler.remove_peer(peer_1)
+
+        assert requested_hashes(peer_2) == [HASH_A]
+
+    def test_remove_peer_announcements(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer_1, peer_2 = MockPeer(), MockPeer()
+        scheduler.add_announcements(peer_1, [HASH_A, HASH_B])
+        scheduler.add_announcements(peer_2, [HASH_B])
+
+        peer_1.stopped.set()
+        scheduler.remove_peer(peer_1)
+
+        assert requested_hashes(peer_2) == [HASH_B]
+        assert HASH_A not in scheduler._announcers
+        assert peer_1 not in scheduler._peer_announced
+        assert scheduler._peer_announced[peer_2] == {HASH_B}
+
+    def test_reassign_on_timeout(self):
+        timer_wheel = TimerWheel(tick=1)
+        scheduler = DownloadScheduler(timer_wheel)
+        peer_1, peer_2 = MockPeer(), MockPeer()
+        scheduler.add_announcements(peer_1, [HASH_A])
+        scheduler.add_announcements(peer_2, [HASH_A])
+
+        for _ in range(GETDATA_TIMEOUT):
+            timer_wheel.advance()
+
+        assert requested_hashes(peer_2) == [HASH_A]
+        assert scheduler.get_stats().timeouts == 1
+
+    def test_limit_in_flight_per_peer(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer = MockPeer()
+        squeak_hashes = [i.to_bytes(32, 'little') for i in range(MAX_PEER_IN_FLIGHT + 1)]
+
+        scheduler.add_announcements(peer, squeak_hashes)
+        assert requested_hashes(peer) == squeak_hashes[:-1]
+
+        scheduler.squeak_received(peer, squeak_hashes[0], 100, True)
+        assert requested_hashes(peer) == squeak_hashes[:-1]
+
+        for squeak_hash in squeak_hashes[1:MAX_PEER_IN_FLIGHT - MIN_PEER_IN_FLIGHT]:
+            scheduler.squeak_received(peer, squeak_hash, 100, True)
+        assert requested_hashes(peer) == squeak_hashes
+
+    def test_stats(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer_1, peer_2 = MockPeer(), MockPeer()
+        scheduler.add_announcements(peer_1, [HASH_A])
+
+        scheduler.squeak_received(peer_1, HASH_A, 100, True)
+        scheduler.squeak_received(peer_2, HASH_A, 100, False)
+        stats = scheduler.get_stats()
+
+        assert stats.requested == 1
+        assert stats.received == 2
+        assert stats.duplicates == 1
+        assert stats.bytes_downloaded == 200
+        assert stats.bytes_useful == 100
+
+    def test_sync_many_squeaks(self):
+        scheduler = DownloadScheduler(TimerWheel())
+        peer_1, peer_2 = MockPeer(), MockPeer()
+        squeak_hashes = [i.to_bytes(32, 'little') for i in range(20 * MAX_PEER_IN_FLIGHT)]
+        scheduler.add_announcements(peer_1, squeak_hashes)
+        scheduler.add_announcements(peer_2, squeak_hashes[::2])
+
+        received = set()
+        while len(received) < len(squeak_hashes):
+            for peer in [peer_1, peer_2]:
+                for squeak_hash in requested_hashes(peer):
+                    if squeak_hash not in received:
+                        received.add(squeak_hash)
+                        scheduler.squeak_received(peer, squeak_hash, 100, True)
+
+        requested = requested_hashes(peer_1) + requested_hashes(peer_2)
+        assert sorted(requested) == sorted(squeak_hashes)
+        assert requested_hashes(peer_2)
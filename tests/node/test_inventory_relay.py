@@ -0,0 +1,79 @@
+import threading
+
+from squeakclient.squeaknode.node.inventory_relay import InventoryRelay
+from squeakclient.squeaknode.node.inventory_relay import MAX_INV_ENTRIES
+from squeakclient.squeaknode.node.known_inventory import KnownInventory
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
+
+
+class MockPeer(object):
+
+    def __init__(self):
+        self.stopped = threading.Event()
+        self.known_inventory = KnownInventory()
+        self.sent_msgs = []
+
+    def send_msg(self, msg):
+        self.sent_msgs.append(msg)
+
+
+def sent_hashes(peer):
+    return [inv.hash for msg in peer.sent_msgs for inv in msg.inv]
+
+
+class TestInventoryRelay(object):
+
+    def test_relay_to_other_peers(self):
+        relay = InventoryRelay(TimerWheel())
+        source_peer = MockPeer()
+        other_peer = MockPeer()
+        relay.add_peer(source_peer)
+        relay.add_peer(other_peer)
+
+        relay.relay_squeak(b'a' * 32, source_peer)
+        relay.relay_squeak(b'b' * 32)
+        relay.trickle(source_peer)
+        relay.trickle(other_peer)
+
+        assert sent_hashes(source_peer) == [b'b' * 32]
+        assert sent_hashes(other_peer) == [b'a' * 32, b'b' * 32]
+
+    def test_batch_inv_entries(self):
+        relay = InventoryRelay(TimerWheel())
+        peer = MockPeer()
+        relay.add_peer(peer)
+
+        squeak_hashes = [i.to_bytes(32, 'little') for i in range(MAX_INV_ENTRIES + 1)]
+        for squeak_hash in squeak_hashes:
+            relay.relay_squeak(squeak_hash)
+        relay.trickle(peer)
+        relay.trickle(peer)
+
+        assert [len(msg.inv) for msg in peer.sent_msgs] == [MAX_INV_ENTRIES, 1]
+        assert sent_hashes(peer) == squeak_hashes
+
+    def test_skip_known_hashes(self):
+        relay = InventoryRelay(TimerWheel())
+        peer = MockPeer()
+        relay.add_peer(peer)
+        peer.known_inventory.add(b'a' * 32)
+
+        relay.relay_squeak(b'a' * 32)
+        relay.relay_squeak(b'b' * 32)
+        relay.trickle(peer)
+        relay.relay_squeak(b'b' * 32)
+        relay.trickle(peer)
+
+        assert sent_hashes(peer) == [b'b' * 32]
+        assert peer.known_inventory.duplicates_saved == 2
+
+    def test_remove_peer(self):
+        relay = InventoryRelay(TimerWheel())
+        peer = MockPeer()
+        relay.add_peer(peer)
+
+        relay.remove_peer(peer)
+        relay.relay_squeak(b'a' * 32)
+        relay.trickle(peer)
+
+        assert peer.sent_msgs == []
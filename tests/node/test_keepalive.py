@@ -0,0 +1,101 @@
+import threading
+import time
+
+from squeakclient.squeaknode.node.keepalive import Keepalive
+from squeakclient.squeaknode.node.peer import LAST_MESSAGE_TIMEOUT
+from squeakclient.squeaknode.node.peer import PING_INTERVAL
+from squeakclient.squeaknode.node.peer import PING_TIMEOUT
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
+
+
+class TestTimerWheel(object):
+
+    def test_fire_after_delay(self):
+        timer_wheel = TimerWheel(tick=1, wheel_size=4)
+        fired = []
+        timer_wheel.schedule(3, fired.append, 'a')
+        timer_wheel.schedule(6, fired.append, 'b')
+
+        for _ in range(2):
+            timer_wheel.advance()
+        assert fired == []
+
+        timer_wheel.advance()
+        assert fired == ['a']
+
+        for _ in range(3):
+            timer_wheel.advance()
+        assert fired == ['a', 'b']
+
+    def test_cancel(self):
+        timer_wheel = TimerWheel(tick=1, wheel_size=4)
+        fired = []
+        timer = timer_wheel.schedule(1, fired.append, 'a')
+
+        timer.cancel()
+        timer_wheel.advance()
+
+        assert fired == []
+
+
+class MockPeer(object):
+
+    def __init__(self, now):
+        self.connect_time = now
+        self.last_msg_revc_time = now
+        self.last_sent_ping_time = None
+        self.ping_pending = False
+        self.stopped = threading.Event()
+        self.sent_msgs = []
+
+    def set_last_sent_ping(self, nonce, timestamp=None):
+        self.ping_pending = True
+        self.last_sent_ping_time = timestamp or time.time()
+
+    def send_msg(self, msg):
+        self.sent_msgs.append(msg)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class TestKeepalive(object):
+
+    def test_send_ping(self):
+        keepalive = Keepalive(TimerWheel())
+        peer = MockPeer(time.time())
+        peer.last_sent_ping_time = time.time() - PING_INTERVAL
+
+        keepalive.check_peer(peer)
+
+        assert [msg.command for msg in peer.sent_msgs] == [b'ping']
+        assert peer.ping_pending
+        assert not peer.stopped.is_set()
+
+    def test_evict_on_ping_timeout(self):
+        keepalive = Keepalive(TimerWheel())
+        peer = MockPeer(time.time())
+        peer.set_last_sent_ping(1, timestamp=time.time() - PING_TIMEOUT)
+
+        keepalive.check_peer(peer)
+
+        assert peer.stopped.is_set()
+
+    def test_evict_idle_peer(self):
+        keepalive = Keepalive(TimerWheel())
+        peer = MockPeer(time.time() - LAST_MESSAGE_TIMEOUT)
+
+        keepalive.check_peer(peer)
+
+        assert peer.stopped.is_set()
+
+    def test_removed_peer_not_rescheduled(self):
+        keepalive = Keepalive(TimerWheel())
+        peer = MockPeer(time.time())
+        peer.last_sent_ping_time = time.time() - PING_INTERVAL
+        keepalive.add_peer(peer)
+        keepalive.remove_peer(peer)
+
+        keepalive.check_peer(peer)
+
+        assert peer not in keepalive._timers
@@ -0,0 +1,23 @@
+from squeakclient.squeaknode.node.known_inventory import KnownInventory
+
+
+class TestKnownInventory(object):
+
+    def test_filter_new(self):
+        known_inventory = KnownInventory()
+        known_inventory.add(b'a')
+
+        assert known_inventory.filter_new([b'a', b'b']) == [b'b']
+        assert known_inventory.filter_new([b'b', b'c']) == [b'c']
+        assert known_inventory.duplicates_saved == 2
+
+    def test_evict_least_recently_seen(self):
+        known_inventory = KnownInventory(max_size=2)
+        known_inventory.add_all([b'a', b'b'])
+        known_inventory.filter_new([b'a'])
+
+        known_inventory.add(b'c')
+
+        assert len(known_inventory) == 2
+        assert b'a' in known_inventory
+        assert b'b' not in known_inventory
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+from squeak.core.signing import CSigningKey
+from squeak.net import CInterested
+from squeak.net import CSqueakLocator
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.stores.memory.squeak_store import MemorySqueakStore
+
+
+@pytest.fixture
+def squeak():
+    squeak_maker = SqueakMaker(CSigningKey.generate(), MockBlockchain())
+    return squeak_maker.make_squeak('Hello world!')
+
+
+class TestMemorySqueakStore(object):
+
+    def test_has_squeak(self, squeak):
+        store = MemorySqueakStore()
+        store.add_squeak(squeak)
+
+        assert store.has_squeak(squeak.GetHash())
+        assert not store.has_squeak(os.urandom(32))
+
+    def test_get_squeak(self, squeak):
+        store = MemorySqueakStore()
+        store.add_squeak(squeak)
+
+        saved_squeak = store.get_squeak(squeak.GetHash())
+
+        assert saved_squeak.GetHash() == squeak.GetHash()
+        assert saved_squeak.GetDecryptedContentStr() == 'Hello world!'
+        assert store.get_squeak(os.urandom(32)) is None
+        assert list(store.get_squeaks_by_hashes([squeak.GetHash()])) == [squeak.GetHash()]
+
+    def test_filter_missing(self, squeak):
+        store = MemorySqueakStore()
+        store.add_squeak(squeak)
+        missing_hash = os.urandom(32)
+
+        missing = store.filter_missing([squeak.GetHash(), missing_hash, missing_hash])
+
+        assert missing == [missing_hash]
+
+    def test_get_squeak_headers_by_locator(self):
+        blockchain = MockBlockchain()
+        squeak_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+        other_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+        store = MemorySqueakStore()
+        squeaks = []
+        for block_height in [5, 1, 3, 2, 4]:
+            blockchain.block_height = block_height
+            squeak = squeak_maker.make_squeak('Hello world!')
+            store.add_squeak(squeak)
+            store.add_squeak(other_maker.make_squeak('Hello world!'))
+            squeaks.append(squeak)
+        address = squeaks[0].GetAddress()
+
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=address, nMinBlockHeight=2, nMaxBlockHeight=4),
+            CInterested(address=address),
+        ])
+        found = list(store.get_squeak_headers_by_locator(locator))
+        found_hashes = list(store.get_squeak_hashes_by_locator(locator))
+        assert [header.nBlockHeight for header in found] == [2, 3, 4, 1, 5]
+        assert found_hashes == [(header.nBlockHeight, header.GetHash()) for header in found]
+
+        store.remove_squeak(squeaks[2].GetHash())
+        found = list(store.get_squeak_headers_by_locator(locator))
+        assert [header.nBlockHeight for header in found] == [2, 4, 1, 5]
+
+    def test_get_squeak_headers_created_by(self):
+        blockchain = MockBlockchain()
+        squeak_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+        store = MemorySqueakStore()
+        for block_height in [3, 1, 2, 2]:
+            blockchain.block_height = block_height
+            store.add_squeak(squeak_maker.make_squeak('Hello world!'))
+        store.add_squeak(SqueakMaker(CSigningKey.generate(), blockchain).make_squeak('Hello world!'))
+        address = squeak_maker.make_squeak('Hello world!').GetAddress()
+
+        first_page = store.get_squeak_headers_created_by(address, limit=2)
+        next_page = store.get_squeak_headers_created_by(address, first_page[-1].nBlockHeight + 1, limit=2)
+
+        assert [header.nBlockHeight for header in first_page] == [1, 2, 2]
+        assert [header.nBlockHeight for header in next_page] == [3]
+        assert store.get_squeak_headers_created_by(address, limit=0) == []
+
+    def test_get_replies_by_locator(self, squeak):
+        blockchain = MockBlockchain()
+        squeak_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+        store = MemorySqueakStore()
+        store.add_squeak(squeak)
+        reply = squeak_maker.make_squeak('Reply', reply_to=squeak.GetHash())
+        store.add_squeak(reply)
+        store.add_squeak(squeak_maker.make_squeak('Not a reply'))
+
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=reply.GetAddress(), hashReplySqk=squeak.GetHash()),
+        ])
+        found = list(store.get_squeak_headers_by_locator(locator))
+
+        assert [header.GetHash() for header in found] == [reply.GetHash()]
+
+
+class MockBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 1
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
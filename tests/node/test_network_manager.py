@@ -0,0 +1,99 @@
+import time
+
+import squeak.params
+
+from squeakclient.squeaknode.node.network_manager import get_seed_peer_addresses
+from squeakclient.squeaknode.node.seed_resolver import SeedResolver
+
+
+RESOLVE_DELAY = 0.2
+
+
+class StubResolver(object):
+    """Resolves hostnames from a table after a delay."""
+
+    def __init__(self, records, delays=None):
+        self.records = records
+        self.delays = delays or {}
+        self.calls = []
+
+    def __call__(self, host):
+        self.calls.append(host)
+        time.sleep(self.delays.get(host, RESOLVE_DELAY))
+        if host not in self.records:
+            raise OSError('Unknown host {}'.format(host))
+        return self.records[host]
+
+
+RECORDS = {
+    'seed1.example.com': ['10.0.0.1', '10.0.0.2'],
+    'seed2.example.com': ['10.0.1.1', 'fd00::1'],
+    'seed3.example.com': ['10.0.2.1'],
+}
+
+
+class TestSeedResolver(object):
+
+    def test_resolve_concurrently(self, tmp_path):
+        resolve = StubResolver(RECORDS)
+        seed_resolver = SeedResolver(resolve, tmp_path / 'seeds.json')
+
+        start_time = time.perf_counter()
+        ips = seed_resolver.get_ips(list(RECORDS))
+        elapsed = time.perf_counter() - start_time
+
+        assert ips == ['10.0.0.1', '10.0.0.2', '10.0.1.1', 'fd00::1', '10.0.2.1']
+        assert elapsed < RESOLVE_DELAY * len(RECORDS)
+
+    def test_skip_slow_seed(self, tmp_path):
+        resolve = StubResolver(RECORDS, delays={'seed2.example.com': 2})
+        seed_resolver = SeedResolver(resolve, tmp_path / 'seeds.json', timeout=0.5)
+
+        start_time = time.perf_counter()
+        ips = seed_resolver.get_ips(list(RECORDS))
+        elapsed = time.perf_counter() - start_time
+
+        assert ips == ['10.0.0.1', '10.0.0.2', '10.0.2.1']
+        assert elapsed < 1
+
+    def test_skip_failed_seed(self, tmp_path):
+        resolve = StubResolver(RECORDS)
+        seed_resolver = SeedResolver(resolve, tmp_path / 'seeds.json')
+
+        assert seed_resolver.get_ips(['seed3.example.com', 'missing.example.com']) == ['10.0.2.1']
+
+    def test_cache(self, tmp_path):
+        cache_file = tmp_path / 'seeds.json'
+        SeedResolver(StubResolver(RECORDS), cache_file).get_ips(list(RECORDS))
+        resolve = StubResolver(RECORDS)
+        seed_resolver = SeedResolver(resolve, cache_file)
+
+        ips = seed_resolver.get_ips(list(RECORDS))
+
+        assert len(ips) == 5
+        assert resolve.calls == []
+
+    def test_use_expired_cache_on_failure(self, tmp_path):
+        cache_file = tmp_path / 'seeds.json'
+        SeedResolver(StubResolver(RECORDS), cache_file, ttl=0).get_ips(['seed1.example.com'])
+        resolve = StubResolver({})
+        seed_resolver = SeedResolver(resolve, cache_file, ttl=0)
+
+        ips = seed_resolver.get_ips(['seed1.example.com'])
+
+        assert ips == ['10.0.0.1', '10.0.0.2']
+        assert resolve.calls == ['seed1.example.com']
+
+
+def test_get_seed_peer_addresses(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        squeak.params.params,
+        'DNS_SEEDS',
+        (('seed1', 'seed1.example.com'), ('seed3', 'seed3.example.com')),
+    )
+    port = squeak.params.params.DEFAULT_PORT
+    seed_resolver = SeedResolver(StubResolver(RECORDS), tmp_path / 'seeds.json')
+
+    addresses = get_seed_peer_addresses(seed_resolver)
+
+    assert addresses == [('10.0.0.1', port), ('10.0.0.2', port), ('10.0.2.1', port)]
@@ -1,9 +1,23 @@
-from collections import deque
+import queue
+import threading
 
 import pytest
+from squeak.messages import msg_inv
+from squeak.messages import msg_ping
+from squeak.messages import msg_verack
 from squeak.messages import msg_version
+from squeak.net import CInv
 
+from squeakclient.squeaknode.node.compression import CODEC_ZLIB
+from squeakclient.squeaknode.node.compression import ZBATCH_COMMAND
+from squeakclient.squeaknode.node.peer import MAX_MESSAGE_LEN
+from squeakclient.squeaknode.node.peer import MAX_SEND_QUEUE_BYTES
+from squeakclient.squeaknode.node.peer import MessageDecoder
+from squeakclient.squeaknode.node.peer import MessageQueue
+from squeakclient.squeaknode.node.peer import MSG_HEADER_LEN
 from squeakclient.squeaknode.node.peer import Peer
+from squeakclient.squeaknode.node.peer import SEND_QUEUE_LOW_WATER
+from squeakclient.squeaknode.node.peer import SOCKET_READ_LEN
 
 
 HANDSHAKE_VERSION = 70002
@@ -22,12 +36,86 @@ def peer_socket():
 class TestPeer(object):
 
     def test_send_version(self, address, peer_socket):
+        with Peer(peer_socket, address) as peer:
+            version = self.version_pkt(peer)
+            peer.send_msg(version)
+            data = peer_socket.receive()
+
+        assert data == version.to_bytes()
+
+    def test_send_queue_coalesced(self, address, peer_socket):
         peer = Peer(peer_socket, address)
-        version = self.version_pkt(peer)
-        peer.send_msg(version)
-        data = peer_socket.receive()
+        for nonce in range(10):
+            peer.send_msg(msg_ping(nonce=nonce))
+
+        assert peer.send_queue_len == 10
 
-        assert data is not None
+        with peer:
+            data = peer_socket.receive()
+
+        assert data == b''.join(msg_ping(nonce=nonce).to_bytes()
+                                for nonce in range(10))
+        assert peer.send_queue_len == 0
+
+    def test_send_compressed_batch(self, address, peer_socket):
+        peer = Peer(peer_socket, address)
+        peer.compression_codec = CODEC_ZLIB
+        msgs_data = [msg_ping(nonce=nonce).to_bytes() for nonce in range(100)]
+        peer.send_msgs_data(msgs_data)
+
+        with peer:
+            data = peer_socket.receive()
+
+        assert len(data) < len(b''.join(msgs_data))
+        decoder = MessageDecoder(expect_handshake=False)
+        frames = list(decoder.process_recv_data(data))
+        assert [frame.command for frame in frames] == [ZBATCH_COMMAND]
+        inner_frames = peer.unpack_batch(frames[0])
+        assert [frame.deserialize().nonce for frame in inner_frames] == list(range(100))
+
+    def test_call_when_send_queue_drained(self, address, peer_socket):
+        peer = Peer(peer_socket, address)
+        drained = threading.Event()
+
+        assert not peer.call_when_send_queue_drained(drained.set)
+
+        peer.send_msg_data(bytes(SEND_QUEUE_LOW_WATER + 1))
+        assert peer.call_when_send_queue_drained(drained.set)
+        assert not drained.is_set()
+
+        with peer:
+            assert drained.wait(5)
+
+    def test_stop_on_send_error(self, address):
+        peer_socket = FailingPeerSocket()
+
+        with Peer(peer_socket, address) as peer:
+            peer.send_msg(msg_ping(nonce=1))
+
+            assert peer_socket.closed.wait(5)
+            assert peer.recv_msg() is None
+            assert peer.stopped.is_set()
+
+    def test_count_only_queued_bytes(self, address, peer_socket):
+        peer = Peer(peer_socket, address)
+        peer.send_msg(msg_ping(nonce=1))
+
+        peer.send_msg_data(bytes(MAX_SEND_QUEUE_BYTES))
+
+        assert peer.bytes_sent == len(msg_ping(nonce=1).to_bytes())
+        assert peer.stopped.is_set()
+
+    def test_pong_response(self, address, peer_socket):
+        peer = Peer(peer_socket, address)
+        peer.set_last_sent_ping(123, timestamp=1000.0)
+
+        peer.set_pong_response(456, timestamp=1000.5)
+        assert peer.ping_pending
+        assert peer.ping_time is None
+
+        peer.set_pong_response(123, timestamp=1000.25)
+        assert not peer.ping_pending
+        assert peer.ping_time == 0.25
 
     def version_pkt(self, peer):
         msg = msg_version()
@@ -40,13 +128,168 @@ class TestPeer(object):
         return msg
 
 
+class TestMessageDecoder(object):
+
+    def test_decode_split_messages(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        invs = [CInv(type=1, hash=bytes([i])*32) for i in range(100)]
+        data = msg_inv(inv=invs).to_bytes() + msg_ping(nonce=123).to_bytes()
+
+        msgs = []
+        for i in range(0, len(data), 7):
+            msgs.extend(decoder.process_recv_data(data[i:i+7]))
+
+        assert [msg.command for msg in msgs] == [b'inv', b'ping']
+        assert [inv.hash for inv in msgs[0].deserialize().inv] == [inv.hash for inv in invs]
+        assert msgs[1].deserialize().nonce == 123
+        assert decoder.buffered_len == 0
+
+    def test_decode_incomplete_message(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        data = msg_ping(nonce=123).to_bytes()
+
+        msgs = list(decoder.process_recv_data(data[:-1]))
+
+        assert msgs == []
+        assert decoder.buffered_len == len(data) - 1
+
+    def test_decode_read_buffer(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        invs = [CInv(type=1, hash=i.to_bytes(32, 'little')) for i in range(1000)]
+        data = msg_inv(inv=invs).to_bytes()
+
+        msgs = []
+        offset = 0
+        while offset < len(data):
+            read_len = decoder.next_read_size()
+            with decoder.get_read_buffer(read_len) as read_buffer:
+                chunk = data[offset:offset+read_len]
+                read_buffer[:len(chunk)] = chunk
+            msgs.extend(decoder.buffer_updated(len(chunk)))
+            offset += len(chunk)
+
+        assert decoder.next_read_size() == SOCKET_READ_LEN
+        assert len(msgs) == 1
+        assert len(msgs[0].deserialize().inv) == 1000
+
+    def test_next_read_size_grows_for_pending_message(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        invs = [CInv(type=1, hash=i.to_bytes(32, 'little')) for i in range(1000)]
+        data = msg_inv(inv=invs).to_bytes()
+
+        list(decoder.process_recv_data(data[:SOCKET_READ_LEN]))
+
+        assert decoder.next_read_size() == len(data) - SOCKET_READ_LEN
+
+    def test_decode_message_too_large(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        invs = [CInv(type=1, hash=b'\x00'*32)
+                for _ in range(MAX_MESSAGE_LEN // 36 + 1)]
+        data = msg_inv(inv=invs).to_bytes()
+
+        with pytest.raises(Exception):
+            list(decoder.process_recv_data(data[:1024]))
+
+    def test_decode_handshake(self, address):
+        decoder = MessageDecoder()
+        version = msg_version()
+        data = version.to_bytes() + msg_verack().to_bytes() + msg_ping(nonce=123).to_bytes()
+
+        msgs = list(decoder.process_recv_data(data))
+
+        assert [msg.command for msg in msgs] == [b'version', b'verack', b'ping']
+        assert msgs[0].deserialize().nNonce == version.nNonce
+
+    def test_reject_before_handshake(self):
+        decoder = MessageDecoder()
+        invs = [CInv(type=1, hash=b'\x00'*32) for _ in range(1000)]
+        data = msg_inv(inv=invs).to_bytes()
+
+        with pytest.raises(Exception):
+            list(decoder.process_recv_data(data[:MSG_HEADER_LEN]))
+
+    def test_reject_bad_checksum(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        data = bytearray(msg_ping(nonce=123).to_bytes())
+        data[-1] ^= 0xff
+
+        with pytest.raises(Exception):
+            list(decoder.process_recv_data(bytes(data)))
+
+    def test_skip_unknown_command(self):
+        decoder = MessageDecoder(expect_handshake=False)
+        unknown = bytearray(msg_ping(nonce=1).to_bytes())
+        unknown[4:16] = b'unknown'.ljust(12, b'\x00')
+        data = bytes(unknown) + msg_ping(nonce=2).to_bytes()
+
+        msgs = list(decoder.process_recv_data(data))
+
+        assert len(msgs) == 1
+        assert msgs[0].deserialize().nonce == 2
+
+
+class TestMessageQueue(object):
+
+    def test_put_blocks_when_full(self):
+        msg_queue = MessageQueue(max_msgs=2, max_bytes=1000)
+        msg_queue.put('a', 10)
+        msg_queue.put('b', 10)
+        put_thread = threading.Thread(target=msg_queue.put, args=('c', 10))
+        put_thread.start()
+        put_thread.join(0.1)
+
+        assert put_thread.is_alive()
+        assert msg_queue.get() == 'a'
+
+        put_thread.join(5)
+
+        assert not put_thread.is_alive()
+        assert msg_queue.queue_len == 2
+        assert msg_queue.high_water_msgs == 2
+
+    def test_byte_limit(self):
+        msg_queue = MessageQueue(max_msgs=100, max_bytes=100)
+        msg_queue.put('a', 60)
+        put_thread = threading.Thread(target=msg_queue.put, args=('b', 60))
+        put_thread.start()
+        put_thread.join(0.1)
+
+        assert put_thread.is_alive()
+        assert msg_queue.high_water_bytes == 60
+
+        msg_queue.close()
+        put_thread.join(5)
+
+        assert not put_thread.is_alive()
+        assert msg_queue.get() is None
+
+
 class MockPeerSocket(object):
 
     def __init__(self):
-        self.sent_data = deque()
+        self.sent_data = queue.Queue()
+        self.closed = threading.Event()
+
+    def sendmsg(self, buffers):
+        data = b''.join(buffers)
+        self.sent_data.put(data)
+        return len(data)
+
+    def recv_into(self, buffer, nbytes=0):
+        self.closed.wait()
+        return 0
 
-    def send(self, data):
-        self.sent_data.append(data)
+    def shutdown(self, how):
+        self.closed.set()
+
+    def close(self):
+        self.closed.set()
 
     def receive(self) -> bytes:
-        return self.sent_data.popleft()
+        return self.sent_data.get(timeout=5)
+
+
+class FailingPeerSocket(MockPeerSocket):
+
+    def sendmsg(self, buffers):
+        raise OSError('Connection reset')
@@ -0,0 +1,196 @@
+import threading
+
+import pytest
+from squeak.core.signing import CSigningKey
+from squeak.messages import msg_getdata
+from squeak.messages import msg_getsqueaks
+from squeak.messages import msg_inv
+from squeak.messages import msg_ping
+from squeak.messages import msg_pong
+from squeak.messages import msg_verack
+from squeak.net import CInterested
+from squeak.net import CInv
+from squeak.net import CSqueakLocator
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node import peer_message_handler
+from squeakclient.squeaknode.node.access import SqueaksAccess
+from squeakclient.squeaknode.node.bandwidth import COMMAND_RATE_LIMITS
+from squeakclient.squeaknode.node.bandwidth import PeerBandwidth
+from squeakclient.squeaknode.node.download_scheduler import DownloadScheduler
+from squeakclient.squeaknode.node.known_inventory import KnownInventory
+from squeakclient.squeaknode.node.message_stats import MessageStats
+from squeakclient.squeaknode.node.peer import MessageFrame
+from squeakclient.squeaknode.node.peer import MSG_HEADER_LEN
+from squeakclient.squeaknode.node.peer_message_handler import PeerMessageHandler
+from squeakclient.squeaknode.node.stores.memory.storage import MemoryStorage
+from squeakclient.squeaknode.node.timer_wheel import TimerWheel
+
+
+@pytest.fixture
+def peer():
+    return MockPeer()
+
+
+@pytest.fixture
+def node():
+    return MockNode()
+
+
+class TestPeerMessageHandler(object):
+
+    def test_handle_ping(self, peer, node):
+        handler = PeerMessageHandler(peer, node)
+        handler.handle_peer_message(make_frame(msg_ping(nonce=123)))
+
+        assert len(peer.sent_msgs) == 1
+        assert isinstance(peer.sent_msgs[0], msg_pong)
+        assert peer.sent_msgs[0].nonce == 123
+
+    def test_record_message_stats(self, peer, node):
+        handler = PeerMessageHandler(peer, node)
+        handler.handle_peer_message(make_frame(msg_ping(nonce=1)))
+        handler.handle_peer_message(make_frame(msg_ping(nonce=2)))
+        handler.handle_peer_message(make_frame(msg_verack()))
+
+        stats = node.message_stats.get_stats()
+
+        assert stats[b'ping'].count == 2
+        assert stats[b'ping'].total_time > 0
+        assert stats[b'verack'].count == 1
+
+    def test_request_announced_hash_once(self, peer, node):
+        handler = PeerMessageHandler(peer, node)
+        inv_msg = msg_inv(inv=[CInv(type=1, hash=b'a' * 32)])
+
+        handler.handle_peer_message(make_frame(inv_msg))
+        handler.handle_peer_message(make_frame(inv_msg))
+
+        assert len(peer.sent_msgs) == 1
+        assert isinstance(peer.sent_msgs[0], msg_getdata)
+        assert peer.known_inventory.duplicates_saved == 1
+
+    def test_getsqueaks_paged(self, peer, node, monkeypatch):
+        monkeypatch.setattr(peer_message_handler, 'MAX_GETSQUEAKS_RESULTS', 3)
+        monkeypatch.setattr(peer_message_handler, 'MAX_INV_ENTRIES', 2)
+        signing_key = CSigningKey.generate()
+        blockchain = MockBlockchain()
+        squeak_maker = SqueakMaker(signing_key, blockchain)
+        squeaks = []
+        for block_height in [1, 2, 3, 3, 4]:
+            blockchain.block_height = block_height
+            squeak = squeak_maker.make_squeak('Hello world!')
+            node.squeaks_access.add_squeak(squeak)
+            squeaks.append(squeak)
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=squeaks[0].GetAddress()),
+        ])
+        handler = PeerMessageHandler(peer, node)
+
+        handler.handle_peer_message(make_frame(msg_getsqueaks(locator=locator)))
+
+        assert [len(msg.inv) for msg in peer.sent_msgs] == [2, 2]
+        sent_hashes = [inv.hash for msg in peer.sent_msgs for inv in msg.inv]
+        assert sent_hashes[:2] == [squeaks[0].GetHash(), squeaks[1].GetHash()]
+        assert set(sent_hashes[2:]) == {squeaks[2].GetHash(), squeaks[3].GetHash()}
+
+    def test_getsqueaks_paged_by_interest(self, peer, node, monkeypatch):
+        monkeypatch.setattr(peer_message_handler, 'MAX_GETSQUEAKS_RESULTS', 2)
+        blockchain = MockBlockchain()
+        squeak_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+        other_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+        squeaks = []
+        other_squeaks = []
+        for block_height in [1, 2, 2, 3]:
+            blockchain.block_height = block_height
+            squeaks.append(squeak_maker.make_squeak('Hello world!'))
+            other_squeaks.append(other_maker.make_squeak('Hello world!'))
+        for squeak in squeaks + other_squeaks:
+            node.squeaks_access.add_squeak(squeak)
+        address = squeaks[0].GetAddress()
+        other_address = other_squeaks[0].GetAddress()
+        handler = PeerMessageHandler(peer, node)
+
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=address),
+            CInterested(address=other_address),
+        ])
+        handler.handle_peer_message(make_frame(msg_getsqueaks(locator=locator)))
+        first_page = {inv.hash for msg in peer.sent_msgs for inv in msg.inv}
+
+        assert first_page == {squeak.GetHash() for squeak in squeaks[:3]}
+
+        peer.sent_msgs = []
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=address, nMinBlockHeight=3),
+            CInterested(address=other_address),
+        ])
+        handler.handle_peer_message(make_frame(msg_getsqueaks(locator=locator)))
+        next_page = {inv.hash for msg in peer.sent_msgs for inv in msg.inv}
+
+        assert next_page == {squeaks[3].GetHash()} | {squeak.GetHash() for squeak in other_squeaks[:1]}
+
+    def test_drop_over_rate_limit(self, peer, node):
+        handler = PeerMessageHandler(peer, node)
+        getsqueaks_msg = msg_getsqueaks(locator=CSqueakLocator(vInterested=[]))
+        _, burst = COMMAND_RATE_LIMITS[b'getsqueaks']
+
+        for _ in range(burst + 1):
+            handler.handle_peer_message(make_frame(getsqueaks_msg))
+
+        assert len(peer.sent_msgs) == burst
+        assert peer.bandwidth.traffic.get_stats()[b'getsqueaks'].msgs_dropped == 1
+
+    def test_reject_before_handshake(self, peer, node):
+        peer.is_handshake_complete = False
+        handler = PeerMessageHandler(peer, node)
+
+        with pytest.raises(Exception):
+            handler.handle_peer_message(make_frame(msg_ping(nonce=1)))
+
+        assert node.message_stats.get_stats() == {}
+
+
+def make_frame(msg):
+    data = msg.to_bytes()
+    return MessageFrame(msg.command, data[MSG_HEADER_LEN:])
+
+
+class MockPeer(object):
+
+    def __init__(self):
+        self.is_handshake_complete = True
+        self.known_inventory = KnownInventory()
+        self.bandwidth = PeerBandwidth()
+        self.stopped = threading.Event()
+        self.sent_msgs = []
+
+    def send_msg(self, msg):
+        self.sent_msgs.append(msg)
+
+    def set_last_recv_ping(self):
+        pass
+
+    def set_last_msg_revc_time(self):
+        pass
+
+
+class MockNode(object):
+
+    def __init__(self):
+        self.message_stats = MessageStats()
+        self.squeaks_access = SqueaksAccess(MemoryStorage())
+        self.download_scheduler = DownloadScheduler(TimerWheel())
+
+
+class MockBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 0
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
@@ -0,0 +1,169 @@
+import os
+import threading
+
+import pytest
+from squeak.core.signing import CSigningKey
+from squeak.core.signing import CSqueakAddress
+from squeak.net import CInterested
+from squeak.net import CSqueakLocator
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.stores.sqlite.database import SqliteDatabase
+from squeakclient.squeaknode.node.stores.sqlite.storage import SqliteStorage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SqliteStorage(tmp_path / 'squeaknode.db')
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def signing_key():
+    return CSigningKey.generate()
+
+
+@pytest.fixture
+def squeaks(signing_key):
+    blockchain = MockBlockchain()
+    squeak_maker = SqueakMaker(signing_key, blockchain)
+    squeaks = []
+    for block_height in [3, 1, 2]:
+        blockchain.block_height = block_height
+        squeaks.append(squeak_maker.make_squeak('Hello world!'))
+    return squeaks
+
+
+class TestSqliteSqueakStore(object):
+
+    def test_add_and_get_squeak(self, storage, squeaks):
+        store = storage.get_squeak_store()
+        store.add_squeak(squeaks[0])
+        store.add_squeak(squeaks[0])
+
+        squeak = store.get_squeak(squeaks[0].GetHash())
+
+        assert squeak.GetHash() == squeaks[0].GetHash()
+        assert squeak.GetDecryptedContentStr() == 'Hello world!'
+        assert store.get_hashes() == [squeaks[0].GetHash()]
+        assert store.get_squeak(os.urandom(32)) is None
+
+    def test_filter_missing(self, storage, squeaks):
+        store = storage.get_squeak_store()
+        store.add_squeak(squeaks[0])
+        missing_hash = os.urandom(32)
+
+        missing = store.filter_missing([squeaks[0].GetHash(), missing_hash, missing_hash])
+
+        assert missing == [missing_hash]
+        assert store.has_squeak(squeaks[0].GetHash())
+        assert not store.has_squeak(missing_hash)
+
+    def test_get_squeaks_by_hashes(self, storage, squeaks):
+        store = storage.get_squeak_store()
+        for squeak in squeaks:
+            store.add_squeak(squeak)
+        squeak_hashes = [squeak.GetHash() for squeak in squeaks[:2]] + [os.urandom(32)]
+
+        found = store.get_squeaks_by_hashes(squeak_hashes)
+
+        assert set(found) == set(squeak_hashes[:2])
+
+    def test_get_squeak_headers_by_locator(self, storage, squeaks):
+        store = storage.get_squeak_store()
+        for squeak in squeaks:
+            store.add_squeak(squeak)
+        address = squeaks[0].GetAddress()
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=address, nMinBlockHeight=2),
+            CInterested(address=address),
+        ])
+
+        found = list(store.get_squeak_headers_by_locator(locator))
+        found_hashes = list(store.get_squeak_hashes_by_locator(locator))
+
+        assert [header.nBlockHeight for header in found] == [2, 3, 1]
+        assert found_hashes == [(header.nBlockHeight, header.GetHash()) for header in found]
+
+    def test_get_squeak_headers_created_by(self, storage, squeaks, signing_key):
+        store = storage.get_squeak_store()
+        for squeak in squeaks:
+            store.add_squeak(squeak)
+        address = CSqueakAddress.from_verifying_key(signing_key.get_verifying_key())
+
+        first_page = store.get_squeak_headers_created_by(address, limit=2)
+        next_page = store.get_squeak_headers_created_by(address, first_page[-1].nBlockHeight + 1, limit=2)
+
+        assert [header.nBlockHeight for header in first_page] == [1, 2]
+        assert [header.nBlockHeight for header in next_page] == [3]
+        assert store.get_squeak_headers_created_by(address, limit=0) == []
+
+    def test_remove_squeak(self, storage, squeaks):
+        store = storage.get_squeak_store()
+        store.add_squeak(squeaks[0])
+
+        store.remove_squeak(squeaks[0].GetHash())
+
+        assert not store.has_squeak(squeaks[0].GetHash())
+
+
+class TestSqliteKeyAndFollowStore(object):
+
+    def test_signing_key(self, storage, signing_key):
+        key_store = storage.get_key_store()
+        assert key_store.get_signing_key() is None
+
+        key_store.set_signing_key(signing_key)
+        assert key_store.get_signing_key() == signing_key
+
+        key_store.remove_signing_key()
+        assert key_store.get_signing_key() is None
+
+    def test_follows(self, storage, signing_key):
+        follow_store = storage.get_follow_store()
+        address = CSqueakAddress.from_verifying_key(signing_key.get_verifying_key())
+
+        follow_store.add_follow(address)
+        assert follow_store.get_follows() == [address]
+
+        follow_store.remove_follow(address)
+        assert follow_store.get_follows() == []
+
+    def test_persist_after_reopen(self, tmp_path, squeaks, signing_key):
+        storage = SqliteStorage(tmp_path / 'squeaknode.db')
+        storage.get_squeak_store().add_squeak(squeaks[0])
+        storage.get_key_store().set_signing_key(signing_key)
+        storage.close()
+
+        storage = SqliteStorage(tmp_path / 'squeaknode.db')
+        assert storage.get_squeak_store().has_squeak(squeaks[0].GetHash())
+        assert storage.get_key_store().get_signing_key() == signing_key
+        storage.close()
+
+
+class TestSqliteDatabase(object):
+
+    def test_close_connections_of_exited_threads(self, tmp_path):
+        database = SqliteDatabase(tmp_path / 'squeaknode.db')
+
+        for _ in range(200):
+            thread = threading.Thread(target=lambda: database.connection.execute('SELECT 1'))
+            thread.start()
+            thread.join()
+
+        assert len(database._connections) <= 2
+        database.close()
+
+
+class MockBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 0
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
@@ -0,0 +1,158 @@
+import os
+
+import pytest
+from squeak.core.signing import CSigningKey
+from squeak.net import CInterested
+from squeak.net import CSqueakLocator
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node.stores.log.squeak_log import CHECKPOINT_FILE
+from squeakclient.squeaknode.node.stores.log.squeak_log import SqueakLog
+from squeakclient.squeaknode.node.stores.log.squeak_store import LogSqueakStore
+
+
+@pytest.fixture
+def squeaks():
+    blockchain = MockBlockchain()
+    squeak_maker = SqueakMaker(CSigningKey.generate(), blockchain)
+    squeaks = []
+    for block_height in [3, 1, 2, 5, 4]:
+        blockchain.block_height = block_height
+        squeaks.append(squeak_maker.make_squeak('Hello world!'))
+    return squeaks
+
+
+def segment_files(log_dir):
+    return sorted(log_dir.glob('segment-*.log'))
+
+
+class TestSqueakLog(object):
+
+    def test_add_and_get(self, tmp_path, squeaks):
+        log = SqueakLog(tmp_path)
+        for squeak in squeaks:
+            log[squeak.GetHash()] = squeak
+
+        squeak = log[squeaks[1].GetHash()]
+
+        assert squeak.GetHash() == squeaks[1].GetHash()
+        assert squeak.GetDecryptedContentStr() == 'Hello world!'
+        assert len(log) == len(squeaks)
+        assert log.get(os.urandom(32)) is None
+        log.close()
+
+    def test_reopen_from_checkpoint(self, tmp_path, squeaks):
+        log = SqueakLog(tmp_path)
+        for squeak in squeaks[:3]:
+            log[squeak.GetHash()] = squeak
+        log.checkpoint()
+        for squeak in squeaks[3:]:
+            log[squeak.GetHash()] = squeak
+        del log[squeaks[0].GetHash()]
+        log._active_file.flush()
+
+        reopened = SqueakLog(tmp_path)
+
+        assert set(reopened) == {squeak.GetHash() for squeak in squeaks[1:]}
+        assert reopened[squeaks[4].GetHash()].GetHash() == squeaks[4].GetHash()
+        reopened.close()
+
+    def test_reopen_without_checkpoint(self, tmp_path, squeaks):
+        log = SqueakLog(tmp_path)
+        for squeak in squeaks:
+            log[squeak.GetHash()] = squeak
+        del log[squeaks[0].GetHash()]
+        log.close()
+        os.remove(tmp_path / CHECKPOINT_FILE)
+
+        reopened = SqueakLog(tmp_path)
+
+        assert set(reopened) == {squeak.GetHash() for squeak in squeaks[1:]}
+        reopened.close()
+
+    def test_ignore_stale_checkpoint(self, tmp_path, squeaks):
+        log = SqueakLog(tmp_path)
+        for squeak in squeaks:
+            log[squeak.GetHash()] = squeak
+        log.close()
+        segment_path = segment_files(tmp_path)[0]
+        with open(segment_path, 'r+b') as f:
+            f.truncate(segment_path.stat().st_size - 10)
+
+        reopened = SqueakLog(tmp_path)
+
+        assert set(reopened) == {squeak.GetHash() for squeak in squeaks[:-1]}
+        assert reopened[squeaks[3].GetHash()].GetHash() == squeaks[3].GetHash()
+        reopened.close()
+
+    def test_truncate_partial_record(self, tmp_path, squeaks):
+        log = SqueakLog(tmp_path)
+        for squeak in squeaks[:2]:
+            log[squeak.GetHash()] = squeak
+        log._active_file.flush()
+        segment_path = segment_files(tmp_path)[0]
+        valid_size = segment_path.stat().st_size
+        with open(segment_path, 'ab') as f:
+            f.write(b'\x01partial record')
+
+        reopened = SqueakLog(tmp_path)
+
+        assert set(reopened) == {squeak.GetHash() for squeak in squeaks[:2]}
+        assert segment_path.stat().st_size == valid_size
+        reopened.close()
+
+    def test_compact(self, tmp_path, squeaks):
+        record_size = 2500
+        log = SqueakLog(tmp_path, segment_max_bytes=2 * record_size, min_compact_bytes=record_size)
+        for squeak in squeaks:
+            log[squeak.GetHash()] = squeak
+        assert len(segment_files(tmp_path)) == 3
+
+        for squeak in squeaks[:3]:
+            del log[squeak.GetHash()]
+
+        assert len(segment_files(tmp_path)) < 3
+        assert set(log) == {squeak.GetHash() for squeak in squeaks[3:]}
+        assert log[squeaks[3].GetHash()].GetHash() == squeaks[3].GetHash()
+        log.close()
+
+        reopened = SqueakLog(tmp_path)
+        assert set(reopened) == {squeak.GetHash() for squeak in squeaks[3:]}
+        reopened.close()
+
+
+class TestLogSqueakStore(object):
+
+    def test_locator_after_reopen(self, tmp_path, squeaks):
+        store = LogSqueakStore(tmp_path)
+        for squeak in squeaks:
+            store.add_squeak(squeak)
+        store.remove_squeak(squeaks[0].GetHash())
+        store.close()
+
+        store = LogSqueakStore(tmp_path)
+        locator = CSqueakLocator(vInterested=[
+            CInterested(address=squeaks[0].GetAddress(), nMinBlockHeight=2),
+        ])
+        found = list(store.get_squeak_headers_by_locator(locator))
+        found_hashes = list(store.get_squeak_hashes_by_locator(locator))
+
+        assert [header.nBlockHeight for header in found] == [2, 4, 5]
+        assert found_hashes == [(header.nBlockHeight, header.GetHash()) for header in found]
+        assert store.get_squeak(squeaks[1].GetHash()).GetDecryptedContentStr() == 'Hello world!'
+        headers = store.get_squeak_headers_created_by(squeaks[0].GetAddress())
+        assert [header.nBlockHeight for header in headers] == [1, 2, 4, 5]
+        store.close()
+
+
+class MockBlockchain(Blockchain):
+
+    def __init__(self):
+        self.block_height = 0
+
+    def get_block_count(self) -> int:
+        return self.block_height
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)
@@ -0,0 +1,148 @@
+import os
+import threading
+
+import pytest
+from squeak.core.signing import CSigningKey
+from squeak.messages import msg_notfound
+from squeak.messages import msg_squeak
+
+from squeakclient.squeaknode.core.blockchain import Blockchain
+from squeakclient.squeaknode.core.squeak_maker import SqueakMaker
+from squeakclient.squeaknode.node import squeak_sender
+from squeakclient.squeaknode.node.access import SqueaksAccess
+from squeakclient.squeaknode.node.squeak_sender import SqueakFrameCache
+from squeakclient.squeaknode.node.squeak_sender import SqueakSender
+from squeakclient.squeaknode.node.stores.memory.storage import MemoryStorage
+
+
+@pytest.fixture
+def squeaks():
+    squeak_maker = SqueakMaker(CSigningKey.generate(), MockBlockchain())
+    return [squeak_maker.make_squeak('squeak {}'.format(i)) for i in range(5)]
+
+
+@pytest.fixture
+def squeaks_access(squeaks):
+    squeaks_access = SqueaksAccess(MemoryStorage())
+    for squeak in squeaks:
+        squeaks_access.add_squeak(squeak)
+    return squeaks_access
+
+
+class TestSqueakFrameCache(object):
+
+    def test_serialize_once(self, squeaks):
+        frame_cache = SqueakFrameCache()
+        squeak = squeaks[0]
+
+        assert frame_cache.lookup(squeak.GetHash()) is None
+        data = frame_cache.add_frame(squeak.GetHash(), squeak)
+
+        assert data == msg_squeak(squeak=squeak).to_bytes()
+        assert frame_cache.lookup(squeak.GetHash()) is data
+        assert (frame_cache.hits, frame_cache.misses) == (1, 1)
+
+    def test_evict_over_max_bytes(self, squeaks):
+        frame_size = len(msg_squeak(squeak=squeaks[0]).to_bytes())
+        frame_cache = SqueakFrameCache(max_bytes=frame_size * 2)
+
+        for squeak in squeaks:
+            frame_cache.add_frame(squeak.GetHash(), squeak)
+
+        assert frame_cache.size <= frame_size * 2
+
+
+class TestSqueakSender(object):
+
+    def test_send_squeaks(self, squeaks, squeaks_access):
+        peer = MockPeer()
+        squeak_hashes = [squeak.GetHash() for squeak in squeaks]
+
+        SqueakSender(peer, squeaks_access, SqueakFrameCache(), squeak_hashes).send()
+
+        assert peer.sent_data == [msg_squeak(squeak=squeak).to_bytes() for squeak in squeaks]
+        assert peer.sent_msgs == []
+
+    def test_send_notfound(self, squeaks, squeaks_access):
+        peer = MockPeer()
+        missing_hash = os.urandom(32)
+
+        SqueakSender(peer, squeaks_access, SqueakFrameCache(), [squeaks[0].GetHash(), missing_hash]).send()
+
+        assert len(peer.sent_data) == 1
+        assert len(peer.sent_msgs) == 1
+        assert isinstance(peer.sent_msgs[0], msg_notfound)
+        assert [inv.hash for inv in peer.sent_msgs[0].inv] == [missing_hash]
+
+    def test_cache_hit_skips_store(self, squeaks, squeaks_access):
+        frame_cache = SqueakFrameCache()
+        squeak_hashes = [squeak.GetHash() for squeak in squeaks]
+        SqueakSender(MockPeer(), squeaks_access, frame_cache, squeak_hashes).send()
+        peer = MockPeer()
+        store_lookups = []
+        get_squeaks_by_hashes = squeaks_access.get_squeaks_by_hashes
+        squeaks_access.get_squeaks_by_hashes = lambda hashes: (
+            store_lookups.append(hashes) or get_squeaks_by_hashes(hashes))
+
+        missing_hash = os.urandom(32)
+
+        SqueakSender(peer, squeaks_access, frame_cache, squeak_hashes[:3] + [missing_hash]).send()
+
+        assert peer.sent_data == [msg_squeak(squeak=squeak).to_bytes() for squeak in squeaks[:3]]
+        assert store_lookups == [[missing_hash]]
+
+    def test_wait_for_send_queue(self, squeaks, squeaks_access, monkeypatch):
+        monkeypatch.setattr(squeak_sender, 'GETDATA_CHUNK_BYTES', 1)
+        monkeypatch.setattr(squeak_sender, 'GETDATA_LOOKUP_LEN', 2)
+        peer = MockPeer(send_queue_full=True)
+        squeak_hashes = [squeak.GetHash() for squeak in squeaks]
+
+        SqueakSender(peer, squeaks_access, SqueakFrameCache(), squeak_hashes).send()
+        assert len(peer.sent_data) == 2
+
+        peer.drain_send_queue()
+        assert len(peer.sent_data) == 4
+
+        peer.drain_send_queue()
+        assert len(peer.sent_data) == 5
+        assert peer.drained_callbacks == []
+
+
+class MockPeer(object):
+
+    def __init__(self, send_queue_full=False):
+        self.send_queue_full = send_queue_full
+        self.stopped = threading.Event()
+        self.sent_data = []
+        self.sent_msgs = []
+        self.drained_callbacks = []
+
+    def send_msg(self, msg):
+        self.sent_msgs.append(msg)
+
+    def send_msg_data(self, data):
+        self.sent_data.append(data)
+
+    def send_msgs_data(self, msgs_data):
+        self.sent_data.extend(msgs_data)
+
+    def call_when_send_queue_drained(self, callback):
+        if not self.send_queue_full:
+            return False
+        self.drained_callbacks.append(callback)
+        return True
+
+    def drain_send_queue(self):
+        callbacks = self.drained_callbacks
+        self.drained_callbacks = []
+        for callback in callbacks:
+            callback()
+
+
+class MockBlockchain(Blockchain):
+
+    def get_block_count(self) -> int:
+        return 1
+
+    def get_block_hash(self, block_height: int) -> bytes:
+        return bytes(32)